@@ -1,3 +1,5 @@
+import random
+
 import mysql.connector
 
 # ---------------- DB CONNECTION ----------------
@@ -33,6 +35,7 @@ CREATE TABLE IF NOT EXISTS sessions (
 """)
 
 # Questions (AGE-SPECIFIC)
+# random_key is uniform in [0, 1): get_question seeks to a random point in the index instead of ORDER BY RAND()
 cursor.execute("""
 CREATE TABLE IF NOT EXISTS questions (
     question_id INT AUTO_INCREMENT PRIMARY KEY,
@@ -41,10 +44,25 @@ CREATE TABLE IF NOT EXISTS questions (
     age_group VARCHAR(10),
     question_text TEXT,
     correct_option VARCHAR(255),
-    options JSON
+    options JSON,
+    random_key DOUBLE NOT NULL DEFAULT (RAND()),
+    INDEX idx_questions_age_cell_key (age_group, domain, difficulty, random_key)
 )
 """)
 
+# Tables created before random_key: add the column (filled per row) and the index
+cursor.execute("""
+SELECT COUNT(*) FROM information_schema.columns
+WHERE table_schema = DATABASE() AND table_name = 'questions' AND column_name = 'random_key'
+""")
+if cursor.fetchone()[0] == 0:
+    cursor.execute("ALTER TABLE questions ADD COLUMN random_key DOUBLE NOT NULL DEFAULT (RAND())")
+    cursor.execute("UPDATE questions SET random_key = RAND()")
+    cursor.execute("""
+    CREATE INDEX idx_questions_age_cell_key
+    ON questions (age_group, domain, difficulty, random_key)
+    """)
+
 # Responses
 cursor.execute("""
 CREATE TABLE IF NOT EXISTS user_responses (
@@ -122,14 +140,27 @@ def end_session(session_id):
 
 
 def get_question(domain, difficulty, age_group):
+    # First question at or after a random key (an index range scan),
+    # wrapping around to the smallest key if there is none
+    start = random.random()
     cursor.execute("""
         SELECT question_id, question_text, options
         FROM questions
-        WHERE domain=%s AND difficulty=%s AND age_group=%s
-        ORDER BY RAND()
+        WHERE age_group=%s AND domain=%s AND difficulty=%s AND random_key >= %s
+        ORDER BY random_key
         LIMIT 1
-    """, (domain, difficulty, age_group))
-    return cursor.fetchone()
+    """, (age_group, domain, difficulty, start))
+    question = cursor.fetchone()
+    if question is None:
+        cursor.execute("""
+            SELECT question_id, question_text, options
+            FROM questions
+            WHERE age_group=%s AND domain=%s AND difficulty=%s
+            ORDER BY random_key
+            LIMIT 1
+        """, (age_group, domain, difficulty))
+        question = cursor.fetchone()
+    return question
 
 
 def store_response(session_id, user_id, question_id,
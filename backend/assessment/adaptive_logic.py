@@ -2,7 +2,18 @@
 Adaptive question delivery logic.
 Rule-based fallback when ML-based AQA is not ready.
 """
+import logging
+import random
+from functools import lru_cache
+from typing import Any, Optional, Tuple
+
+from django.db.models import Exists, IntegerField, OuterRef, Value
+
+from .ml import load_question_model
 from .models import Question, UserResponse
+from .question_bank import get_question_bank
+
+logger = logging.getLogger(__name__)
 
 
 def get_next_difficulty(current_difficulty: str, correct: bool, response_time_ms: int) -> str:
@@ -59,7 +70,9 @@ def get_adaptive_question(
     session_id: str,
     last_question_id: str = None,
     correct: bool = None,
-    response_time_ms: int = None
+    response_time_ms: int = None,
+    total_responses: int = None,
+    age_group: str = ''
 ) -> Question:
     """
     Get the next adaptive question based on user performance.
@@ -70,32 +83,41 @@ def get_adaptive_question(
         last_question_id: ID of the last question answered
         correct: Whether the last answer was correct
         response_time_ms: Response time in milliseconds
+        total_responses: Number of responses in the session, if known (lets
+            the question bank reuse its answered set without a query)
+        age_group: The user's age group; its questions are preferred over
+            those for every age
     
     Returns:
         Next Question object or None if no questions available
     """
-    # Get answered question IDs for this session
-    answered_ids = UserResponse.objects.filter(
-        session_id=session_id
-    ).values_list('question_id', flat=True)
+    bank = get_question_bank()
     
     # Try ML model first
-    try:
-        from .ml_utils import get_next_question_ml
-        next_domain, next_difficulty = get_next_question_ml(
-            session_id,
-            last_question_id,
-            correct,
-            response_time_ms
-        )
-    except Exception as e:
-        # Fallback to rule-based logic
-        print(f"⚠️  ML question generation failed, using rule-based: {e}")
-        
-        # Determine difficulty for next question
+    prediction = None
+    if load_question_model() is not None:
+        try:
+            from .ml_utils import get_next_question_ml
+            prediction = get_next_question_ml(
+                session_id,
+                last_question_id,
+                correct,
+                response_time_ms
+            )
+        except Exception:
+            logger.exception("ML question generation failed, using rule-based")
+    else:
+        logger.debug("No question model, using rule-based question selection")
+    
+    if prediction is not None:
+        next_domain, next_difficulty = prediction
+    else:
+        # Fallback to rule-based logic: difficulty from the last answer
         if last_question_id and correct is not None and response_time_ms is not None:
             try:
-                last_question = Question.objects.get(question_id=last_question_id)
+                last_question = bank.get(last_question_id) if bank is not None else None
+                if last_question is None:
+                    last_question = Question.objects.get(question_id=last_question_id)
                 next_difficulty = get_next_difficulty(
                     last_question.difficulty,
                     correct,
@@ -110,26 +132,89 @@ def get_adaptive_question(
         # Get next domain
         next_domain = get_next_domain(session_id, None)
     
-    # Try to find a question matching criteria
-    question = Question.objects.filter(
-        domain=next_domain,
-        difficulty=next_difficulty
-    ).exclude(question_id__in=answered_ids).first()
-    
-    # Fallback: try any difficulty in the domain
-    if not question:
-        question = Question.objects.filter(
-            domain=next_domain
-        ).exclude(question_id__in=answered_ids).first()
-    
-    # Fallback: try any domain with target difficulty
-    if not question:
-        question = Question.objects.filter(
-            difficulty=next_difficulty
-        ).exclude(question_id__in=answered_ids).first()
-    
-    # Final fallback: any unanswered question
-    if not question:
-        question = Question.objects.exclude(question_id__in=answered_ids).first()
-    
-    return question
+    if bank is not None:
+        # In-memory: same fallback order as the query below
+        return bank.pick(bank.answered(session_id, total_responses), next_domain, next_difficulty, age_group)
+    
+    return pick_unanswered_question(session_id, next_domain, next_difficulty, age_group)
+
+
+# Stand-ins used to compile the ranked query once. Each compiled parameter is
+# mapped back to its name, and the real values are bound by name per call.
+_STAND_INS = {
+    'session_id': '<session_id>',
+    'domain': '<domain>',
+    'difficulty': '<difficulty>',
+    'age_group': '<age_group>',
+    'start_key': -1.0,  # random_key values are in [0, 1)
+}
+_SESSION, _DOMAIN, _DIFFICULTY, _AGE_GROUP, _START_KEY = _STAND_INS.values()
+
+
+@lru_cache(maxsize=None)
+def _ranked_query(with_age_group: bool) -> Tuple[str, Tuple[Tuple[Optional[str], Any], ...]]:
+    """
+    SQL and parameters of pick_unanswered_question.
+    
+    Returns:
+        (sql, bindings) - one (name, None) per parameter taken from the call
+        (see _STAND_INS), or (None, value) for a constant of the query
+    """
+    answered = UserResponse.objects.filter(session_id=_SESSION, question_id=OuterRef('pk'))
+    unanswered = Question.objects.filter(~Exists(answered))
+    
+    # Random pick within a cell: first key at or after a random point, else
+    # wrap around to the smallest key. Both are a range scan of questions_age_cell_key.
+    tiers = []
+    for age_group in (_AGE_GROUP, '') if with_age_group else ('',):
+        cell = unanswered.filter(age_group=age_group, domain=_DOMAIN, difficulty=_DIFFICULTY)
+        tiers += [cell.filter(random_key__gte=_START_KEY).order_by('random_key'), cell.order_by('random_key')]
+    tiers += [
+        unanswered.filter(domain=_DOMAIN).order_by('pk'),
+        unanswered.filter(difficulty=_DIFFICULTY).order_by('pk'),
+        unanswered.order_by('pk'),
+    ]
+    
+    # SQLite doesn't allow LIMIT in compound members, so each tier is wrapped in a derived table
+    parts, params = [], []
+    for preference, tier in enumerate(tiers):
+        sql, tier_params = tier.annotate(
+            preference=Value(preference, output_field=IntegerField())
+        )[:1].query.sql_with_params()
+        parts.append(f"SELECT * FROM ({sql}) AS tier_{preference}")
+        params.extend(tier_params)
+    
+    names = {value: name for name, value in _STAND_INS.items()}
+    bindings = tuple(
+        (names[param], None) if isinstance(param, (str, float)) and param in names else (None, param)
+        for param in params
+    )
+    return ' UNION ALL '.join(parts) + ' ORDER BY preference LIMIT 1', bindings
+
+
+def pick_unanswered_question(session_id: str, domain: str, difficulty: str, age_group: str = '') -> Question:
+    """
+    Random question the session hasn't answered, preferring in order: the
+    age group's questions for the domain and difficulty, questions for every
+    age for the domain and difficulty, same domain, same difficulty, anything.
+    
+    One query: each tier is a LIMIT 1 subquery that excludes answered
+    questions with NOT EXISTS and carries its preference rank; the tiers are
+    combined with UNION ALL and the best-ranked row is taken. Each tier stops
+    at its first unanswered row, which a single CASE-ranked ORDER BY over the
+    whole table cannot do. The domain/difficulty tiers are random through
+    Question.random_key; the wider ones take the lowest id.
+    
+    Returns:
+        Question object or None if every question has been answered
+    """
+    sql, bindings = _ranked_query(bool(age_group))
+    values = {
+        'session_id': session_id,
+        'domain': domain,
+        'difficulty': difficulty,
+        'age_group': age_group,
+        'start_key': random.random(),
+    }
+    ranked = Question.objects.raw(sql, [values[name] if name else constant for name, constant in bindings])
+    return next(iter(ranked), None)
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import User, Session, Question, UserResponse, MistakePattern, FinalPrediction
+from .models import (User, Session, SessionStats, SessionFeatureVector, Question, GeneratedQuestion, ItemParameter,
+                     UserResponse, MistakePattern, FinalPrediction)
 
 
 @admin.register(User)
@@ -18,14 +19,27 @@ class SessionAdmin(admin.ModelAdmin):
 
 @admin.register(Question)
 class QuestionAdmin(admin.ModelAdmin):
-    list_display = ('question_id', 'domain', 'difficulty', 'question_text')
-    list_filter = ('domain', 'difficulty')
+    list_display = ('question_id', 'domain', 'difficulty', 'age_group', 'question_text')
+    list_filter = ('domain', 'difficulty', 'age_group')
     search_fields = ('question_id', 'question_text')
 
 
+@admin.register(GeneratedQuestion)
+class GeneratedQuestionAdmin(admin.ModelAdmin):
+    list_display = ('seed', 'template_id', 'catalog_version')
+    list_filter = ('template_id',)
+
+
+@admin.register(ItemParameter)
+class ItemParameterAdmin(admin.ModelAdmin):
+    list_display = ('item_id', 'domain', 'difficulty', 'discrimination', 'location', 'responses', 'calibrated_at')
+    list_filter = ('domain', 'difficulty')
+    search_fields = ('item_id',)
+
+
 @admin.register(UserResponse)
 class UserResponseAdmin(admin.ModelAdmin):
-    list_display = ('response_id', 'session', 'user', 'question', 'correct', 'response_time_ms')
+    list_display = ('response_id', 'session', 'user', 'answered_question_id', 'correct', 'response_time_ms')
     list_filter = ('correct', 'domain', 'difficulty')
     search_fields = ('session__session_id',)
 
@@ -41,3 +55,17 @@ class FinalPredictionAdmin(admin.ModelAdmin):
     list_display = ('prediction_id', 'session', 'final_label', 'confidence_level', 'predicted_at')
     list_filter = ('final_label', 'confidence_level')
     search_fields = ('session__session_id',)
+
+
+@admin.register(SessionStats)
+class SessionStatsAdmin(admin.ModelAdmin):
+    list_display = ('session', 'total', 'correct', 'last_domain', 'last_difficulty', 'updated_at')
+    search_fields = ('session__session_id',)
+
+
+@admin.register(SessionFeatureVector)
+class SessionFeatureVectorAdmin(admin.ModelAdmin):
+    list_display = ('session', 'user', 'schema_version', 'total', 'reading_acc', 'math_acc', 'focus_acc',
+                    'computed_at')
+    list_filter = ('schema_version',)
+    search_fields = ('session__session_id',)
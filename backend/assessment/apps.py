@@ -1,6 +1,30 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class AssessmentConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'assessment'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+        from .models import Question
+        from .question_bank import invalidate_question_bank
+
+        # The in-process question bank is rebuilt whenever a question changes
+        post_save.connect(invalidate_question_bank, sender=Question, dispatch_uid='question_bank_save')
+        post_delete.connect(invalidate_question_bank, sender=Question, dispatch_uid='question_bank_delete')
+
+
+def warm_up_models() -> None:
+    """
+    Load the ML models now so the first request doesn't pay the unpickle cost.
+
+    Called by the server entry points (ld_screening/wsgi.py and asgi.py: gunicorn, once in
+    the master with preload_app, and runserver) rather than from ready(), so migrate, check
+    and the rescore_sessions worker processes don't load models they never use.
+    Skipped when ASSESSMENT_PRELOAD_MODELS is off.
+    """
+    if getattr(settings, 'ASSESSMENT_PRELOAD_MODELS', True):
+        from .ml_utils import registry
+        registry.warm_up()
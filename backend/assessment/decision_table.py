@@ -0,0 +1,230 @@
+"""
+Compiled decision table for QuestionGeneratorModel.predict.
+
+The question model sees 7 features:
+    [last_correct, last_response_time, diff_easy, diff_medium, diff_hard,
+     session_accuracy, current_domain]
+
+A random forest only ever compares a feature against its split thresholds,
+so every input that falls between the same pair of thresholds (on every
+feature) gets the same answer. The table collects those thresholds from
+domain_classifier and difficulty_classifier, evaluates the forest once per
+cell of the resulting grid, and afterwards answers with one searchsorted per
+feature plus an array index.
+
+Five features are discrete and last_response_time keeps all of its cells.
+session_accuracy is only materialised for the values a session can reach
+(k/n for n up to the session length); inputs that land in any cell that was
+not materialised are answered by the forest itself, so the table is exact
+for every input.
+"""
+import hashlib
+
+import numpy as np
+
+from .flat_forest import tree_splits
+
+# Feature layout used by GetNextQuestionView / ml_utils.extract_question_features
+DISCRETE_FEATURES = (0, 2, 3, 4, 6)
+TIME_FEATURE = 1
+ACCURACY_FEATURE = 5
+N_FEATURES = 7
+
+# Discrete rows the serving path can produce: last_correct x difficulty one-hot x domain
+SERVING_DISCRETE_ROWS = [
+    (correct, *one_hot, domain)
+    for correct in (0, 1)
+    for one_hot in ((1, 0, 0), (0, 1, 0), (0, 0, 1))
+    for domain in (0, 1, 2)
+]
+
+
+def session_accuracy_values(max_items):
+    """Every session_accuracy a session of up to max_items answers can produce."""
+    values = {1.0}  # first-question default
+    for n in range(1, max_items + 1):
+        for k in range(n + 1):
+            values.add(k / n)
+    return np.array(sorted(values))
+
+
+def _forest_thresholds(model, feature):
+    thresholds = [
+        tree_threshold[tree_feature == feature]
+        for classifier in (model.domain_classifier, model.difficulty_classifier)
+        for tree_feature, tree_threshold in tree_splits(classifier)
+    ]
+    return np.unique(np.concatenate(thresholds))
+
+
+def model_fingerprint(model):
+    """Hash of every split in both forests, used to detect a stale table."""
+    digest = hashlib.sha1()
+    for classifier in (model.domain_classifier, model.difficulty_classifier):
+        for tree_feature, tree_threshold in tree_splits(classifier):
+            digest.update(tree_feature.tobytes())
+            digest.update(tree_threshold.tobytes())
+    return digest.hexdigest()
+
+
+def _cell_index(edges, values):
+    # sklearn casts X to float32 and sends x <= threshold left, so cell i holds
+    # edges[i-1] < float32(x) <= edges[i]
+    return np.searchsorted(edges, np.asarray(values, dtype=np.float32).astype(np.float64), side='left')
+
+
+def _cell_representatives(edges):
+    """One float32-exact input value inside each cell."""
+    reps = edges.astype(np.float32)
+    # Round down where float32 rounding pushed the value above its threshold
+    over = reps.astype(np.float64) > edges
+    reps[over] = np.nextafter(reps[over], np.float32(-np.inf))
+    last = np.nextafter(np.float32(edges[-1]), np.float32(np.inf)) if len(edges) else np.float32(0)
+    return np.append(reps, last).astype(np.float64)
+
+
+def boundary_values(edges):
+    """The float32 inputs just below/at and just above every threshold in edges."""
+    below = _cell_representatives(edges)[:-1].astype(np.float32)
+    above = np.nextafter(below, np.float32(np.inf))
+    return np.concatenate([below, above]).astype(np.float64)
+
+
+class DecisionTable:
+    """
+    Lookup-table replacement for QuestionGeneratorModel.predict.
+
+    Use DecisionTable.build(model) to compile, save()/load() to persist as .npz.
+    """
+
+    def __init__(self, edges, discrete_positions, time_positions, accuracy_positions,
+                 table, domain_classes, difficulty_classes, fingerprint):
+        self.edges = edges                              # list of 7 sorted threshold arrays
+        self.discrete_positions = discrete_positions    # mixed-radix discrete cell code -> table row (-1: not built)
+        self.time_positions = time_positions            # time cell -> table column
+        self.accuracy_positions = accuracy_positions    # accuracy cell -> table slice (-1: not built)
+        self.table = table                              # (rows, time cols, accuracy slices, 2) class indices
+        self.domain_classes = domain_classes
+        self.difficulty_classes = difficulty_classes
+        self.fingerprint = fingerprint
+
+        self._radix = np.array([len(edges[f]) + 1 for f in DISCRETE_FEATURES])
+        self._strides = np.concatenate([np.cumprod(self._radix[::-1])[::-1][1:], [1]])
+
+    # ------------------------------------------------------------------ build
+
+    @classmethod
+    def build(cls, model, max_items=15, discrete_rows=SERVING_DISCRETE_ROWS, chunk_size=200000):
+        edges = [_forest_thresholds(model, f) for f in range(N_FEATURES)]
+
+        radix = np.array([len(edges[f]) + 1 for f in DISCRETE_FEATURES])
+        strides = np.concatenate([np.cumprod(radix[::-1])[::-1][1:], [1]])
+
+        # Discrete rows -> their cell codes (duplicates collapse onto one row)
+        discrete_rows = np.asarray(discrete_rows, dtype=np.float64)
+        row_cells = np.column_stack([
+            _cell_index(edges[f], discrete_rows[:, i]) for i, f in enumerate(DISCRETE_FEATURES)
+        ])
+        codes, first = np.unique(row_cells @ strides, return_index=True)
+        discrete_inputs = discrete_rows[first]
+        discrete_positions = np.full(int(np.prod(radix)), -1, dtype=np.int32)
+        discrete_positions[codes] = np.arange(len(codes))
+
+        # Every time cell, and the accuracy cells reachable within max_items answers
+        time_inputs = _cell_representatives(edges[TIME_FEATURE])
+        accuracy_cells = np.unique(_cell_index(edges[ACCURACY_FEATURE], session_accuracy_values(max_items)))
+        accuracy_inputs = _cell_representatives(edges[ACCURACY_FEATURE])[accuracy_cells]
+
+        # Evaluate the forest once per grid cell
+        n_rows, n_time, n_acc = len(discrete_inputs), len(time_inputs), len(accuracy_inputs)
+        d_idx, t_idx, a_idx = np.meshgrid(np.arange(n_rows), np.arange(n_time), np.arange(n_acc), indexing='ij')
+        d_idx, t_idx, a_idx = d_idx.ravel(), t_idx.ravel(), a_idx.ravel()
+
+        domain_classes = model.domain_classifier.classes_
+        difficulty_classes = model.difficulty_classifier.classes_
+        flat = np.empty((len(d_idx), 2), dtype=np.int8)
+        for start in range(0, len(d_idx), chunk_size):
+            sl = slice(start, start + chunk_size)
+            X = np.empty((len(d_idx[sl]), N_FEATURES))
+            X[:, DISCRETE_FEATURES] = discrete_inputs[d_idx[sl]]
+            X[:, TIME_FEATURE] = time_inputs[t_idx[sl]]
+            X[:, ACCURACY_FEATURE] = accuracy_inputs[a_idx[sl]]
+            prediction = model.predict(X)
+            flat[sl, 0] = np.searchsorted(domain_classes, prediction[:, 0])
+            flat[sl, 1] = np.searchsorted(difficulty_classes, prediction[:, 1])
+        table = flat.reshape(n_rows, n_time, n_acc, 2)
+
+        # Time cells with identical outcomes share one column
+        columns, time_positions = np.unique(table.transpose(1, 0, 2, 3).reshape(n_time, -1), axis=0, return_inverse=True)
+        table = np.ascontiguousarray(columns.reshape(len(columns), n_rows, n_acc, 2).transpose(1, 0, 2, 3))
+
+        accuracy_positions = np.full(len(edges[ACCURACY_FEATURE]) + 1, -1, dtype=np.int32)
+        accuracy_positions[accuracy_cells] = np.arange(n_acc)
+
+        return cls(edges, discrete_positions, time_positions.astype(np.int32).ravel(), accuracy_positions,
+                   table, domain_classes, difficulty_classes, model_fingerprint(model))
+
+    # ----------------------------------------------------------------- lookup
+
+    def lookup(self, X):
+        """
+        Answer from the table.
+
+        Returns (prediction, covered): prediction rows are only valid where
+        covered is True; the rest fell into cells that were not materialised.
+        """
+        X = np.atleast_2d(X)
+        code = np.zeros(len(X), dtype=np.int64)
+        for i, f in enumerate(DISCRETE_FEATURES):
+            code += _cell_index(self.edges[f], X[:, f]) * self._strides[i]
+        rows = self.discrete_positions[code]
+        cols = self.time_positions[_cell_index(self.edges[TIME_FEATURE], X[:, TIME_FEATURE])]
+        slices = self.accuracy_positions[_cell_index(self.edges[ACCURACY_FEATURE], X[:, ACCURACY_FEATURE])]
+
+        covered = (rows >= 0) & (slices >= 0)
+        cells = self.table[rows.clip(0), cols, slices.clip(0)]
+        prediction = np.column_stack([
+            self.domain_classes[cells[:, 0]],
+            self.difficulty_classes[cells[:, 1]],
+        ])
+        return prediction, covered
+
+    def predict(self, X, fallback=None):
+        """Drop-in for QuestionGeneratorModel.predict; uncovered rows go to fallback(X)."""
+        X = np.atleast_2d(X)
+        prediction, covered = self.lookup(X)
+        if not covered.all():
+            if fallback is None:
+                raise ValueError("Input falls outside the compiled table and no fallback was given")
+            prediction[~covered] = fallback(X[~covered])
+        return prediction
+
+    # ------------------------------------------------------------ persistence
+
+    def save(self, path):
+        arrays = {f'edges_{f}': e for f, e in enumerate(self.edges)}
+        np.savez(
+            path,
+            discrete_positions=self.discrete_positions,
+            time_positions=self.time_positions,
+            accuracy_positions=self.accuracy_positions,
+            table=self.table,
+            domain_classes=self.domain_classes,
+            difficulty_classes=self.difficulty_classes,
+            fingerprint=np.array(self.fingerprint),
+            **arrays,
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(
+                [data[f'edges_{f}'] for f in range(N_FEATURES)],
+                data['discrete_positions'],
+                data['time_positions'],
+                data['accuracy_positions'],
+                data['table'],
+                data['domain_classes'],
+                data['difficulty_classes'],
+                str(data['fingerprint']),
+            )
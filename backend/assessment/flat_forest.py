@@ -0,0 +1,201 @@
+"""
+Random forests flattened into plain NumPy arrays, for serving without scikit-learn.
+
+`manage.py export_flat_models` converts the question and prediction models'
+RandomForestClassifiers into FlatForest objects and saves them as .npz
+files. Every tree's nodes are concatenated into one set of arrays:
+
+    feature, threshold          - the split of each node (leaves: -2, -2)
+    children_left/right         - per-tree child indices (leaves: -1)
+    node_offsets                - first node of each tree (n_trees + 1)
+    leaf_proba                  - normalised class distribution of each node
+
+FlatForest.predict_proba walks all trees of a batch level by level: one
+gather per level moves every (row, tree) pair that is still on a split one
+step down, and pairs drop out as they reach a leaf. Rows are compared as
+float32 against the float64 thresholds and the per-tree probabilities are
+accumulated in tree order, exactly as scikit-learn does, so the output is
+identical.
+
+Loading a FlatForest only needs NumPy; scikit-learn is imported by the
+exporter alone.
+"""
+import hashlib
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+# Bump when the .npz layout changes
+FORMAT_VERSION = 1
+
+_ARRAYS = ('feature', 'threshold', 'children_left', 'children_right', 'node_offsets', 'leaf_proba', 'classes')
+
+
+class FlatForest:
+    """
+    Drop-in for a fitted single-output RandomForestClassifier's predict and
+    predict_proba (and classes_, n_features_in_, feature_names_in_).
+    """
+
+    def __init__(self, feature: np.ndarray, threshold: np.ndarray, children_left: np.ndarray,
+                 children_right: np.ndarray, node_offsets: np.ndarray, leaf_proba: np.ndarray,
+                 classes: np.ndarray, n_features: int, feature_names: Optional[np.ndarray] = None):
+        self.feature = feature
+        self.threshold = threshold
+        self.children_left = children_left
+        self.children_right = children_right
+        self.node_offsets = node_offsets
+        self.leaf_proba = leaf_proba
+        self.classes_ = classes
+        self.n_features_in_ = n_features
+        if feature_names is not None:
+            self.feature_names_in_ = feature_names
+
+        # Traversal arrays: global child indices, leaves pointing to themselves
+        nodes = np.arange(len(feature), dtype=np.int32)
+        tree_start = np.repeat(node_offsets[:-1], np.diff(node_offsets)).astype(np.int32)
+        leaf = children_left < 0
+        self._left = np.where(leaf, nodes, children_left + tree_start)
+        self._right = np.where(leaf, nodes, children_right + tree_start)
+        self._feature = np.where(leaf, 0, feature)
+        self._roots = node_offsets[:-1].astype(np.int32)
+        self._depth = _max_depth(self._left, self._right, self._roots)
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.node_offsets) - 1
+
+    @classmethod
+    def from_sklearn(cls, forest) -> 'FlatForest':
+        """Flatten a fitted single-output RandomForestClassifier."""
+        if getattr(forest, 'n_outputs_', 1) != 1:
+            raise ValueError("Only single-output forests can be flattened")
+
+        trees = [estimator.tree_ for estimator in forest.estimators_]
+        counts = [tree.node_count for tree in trees]
+        leaf_proba = []
+        for tree in trees:
+            # DecisionTreeClassifier.predict_proba's normalisation, applied to every node
+            proba = tree.value[:, 0, :len(forest.classes_)].copy()
+            normalizer = proba.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            proba /= normalizer
+            leaf_proba.append(proba)
+
+        return cls(
+            feature=np.concatenate([tree.feature for tree in trees]).astype(np.int32),
+            threshold=np.concatenate([tree.threshold for tree in trees]),
+            children_left=np.concatenate([tree.children_left for tree in trees]).astype(np.int32),
+            children_right=np.concatenate([tree.children_right for tree in trees]).astype(np.int32),
+            node_offsets=np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+            leaf_proba=np.concatenate(leaf_proba),
+            classes=forest.classes_,
+            n_features=forest.n_features_in_,
+            feature_names=getattr(forest, 'feature_names_in_', None),
+        )
+
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """(n_samples, n_trees) global node index of the leaf each row reaches in each tree."""
+        X = np.asarray(X, dtype=np.float32)
+        n_samples, n_features = X.shape
+        values = X.ravel()
+        # One entry per (row, tree) pair; active holds the pairs not yet at a leaf
+        node = np.tile(self._roots, n_samples)
+        row_start = np.repeat(np.arange(n_samples) * n_features, self.n_trees)
+        active = np.arange(len(node))
+        for _ in range(self._depth):
+            current = node[active]
+            go_left = values[row_start[active] + self._feature[current]] <= self.threshold[current]
+            current = np.where(go_left, self._left[current], self._right[current])
+            node[active] = current
+            active = active[self._left[current] != current]
+            if not len(active):
+                break
+        return node.reshape(n_samples, self.n_trees)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        leaves = self.apply(X)
+        # Sum tree by tree, in estimator order, then average (RandomForestClassifier.predict_proba);
+        # cumsum adds strictly in sequence, unlike sum's pairwise reduction
+        proba = np.cumsum(self.leaf_proba[leaves], axis=1)[:, -1]
+        proba /= self.n_trees
+        return proba
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+    def tree_splits(self) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """(feature, threshold) of each tree, laid out as sklearn's tree_.feature / tree_.threshold."""
+        for start, end in zip(self.node_offsets[:-1], self.node_offsets[1:]):
+            yield self.feature[start:end].astype(np.intp), self.threshold[start:end]
+
+    def arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        """This forest's arrays for np.savez, keyed '<prefix>.<array>'."""
+        arrays = {f'{prefix}.{name}': getattr(self, name) for name in _ARRAYS if name != 'classes'}
+        # String labels are object arrays, which np.load only reads with allow_pickle
+        classes = self.classes_
+        arrays[f'{prefix}.classes'] = np.asarray(classes, dtype=str) if classes.dtype == object else classes
+        arrays[f'{prefix}.n_features'] = np.array(self.n_features_in_)
+        names = getattr(self, 'feature_names_in_', None)
+        if names is not None:
+            arrays[f'{prefix}.feature_names'] = np.asarray(names, dtype=str)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix: str) -> 'FlatForest':
+        names_key = f'{prefix}.feature_names'
+        classes = arrays[f'{prefix}.classes']
+        return cls(
+            **{name: arrays[f'{prefix}.{name}'] for name in _ARRAYS if name != 'classes'},
+            classes=classes.astype(object) if classes.dtype.kind == 'U' else classes,
+            n_features=int(arrays[f'{prefix}.n_features']),
+            feature_names=arrays[names_key].astype(object) if names_key in arrays else None,
+        )
+
+
+def tree_splits(classifier) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """(feature, threshold) of each tree of a fitted RandomForestClassifier or FlatForest."""
+    if isinstance(classifier, FlatForest):
+        yield from classifier.tree_splits()
+    else:
+        for estimator in classifier.estimators_:
+            yield estimator.tree_.feature, estimator.tree_.threshold
+
+
+def file_digest(path: str) -> str:
+    """sha1 of a file, used to tie an export to the pickle it was made from."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def save_forests(path: str, forests: Dict[str, FlatForest], source_digest: str) -> None:
+    """Write named forests to one .npz, tagged with the source pickle's file_digest."""
+    arrays = {'format_version': np.array(FORMAT_VERSION), 'source_digest': np.array(source_digest)}
+    for name, forest in forests.items():
+        arrays.update(forest.arrays(name))
+    np.savez(path, forest_names=np.array(list(forests)), **arrays)
+
+
+def load_forests(path: str) -> Tuple[Dict[str, FlatForest], str]:
+    """(forests by name, source_digest) of a file written by save_forests."""
+    with np.load(path, allow_pickle=False) as data:
+        if int(data['format_version']) != FORMAT_VERSION:
+            raise ValueError(f"{path} has format version {int(data['format_version'])}, expected {FORMAT_VERSION}")
+        arrays = {key: data[key] for key in data.files}
+    forests = {str(name): FlatForest.from_arrays(arrays, str(name)) for name in arrays['forest_names']}
+    return forests, str(arrays['source_digest'])
+
+
+def _max_depth(left: np.ndarray, right: np.ndarray, roots: np.ndarray) -> int:
+    """Number of levels until every root has reached a leaf (leaves point to themselves)."""
+    depth = 0
+    level = roots
+    while True:
+        children = np.concatenate([left[level], right[level]])
+        level = np.unique(children[children != np.concatenate([level, level])])
+        if not len(level):
+            return depth
+        depth += 1
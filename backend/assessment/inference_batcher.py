@@ -0,0 +1,221 @@
+"""
+Micro-batching for single-row model calls.
+
+Each request runs the question model (and, at end of session, the risk model)
+on one row, where sklearn's per-call overhead dominates. With threaded workers
+(gunicorn --threads) an InferenceBatcher collects the rows submitted by
+concurrent requests over a short window, runs the model once on the stacked
+matrix and hands each caller its row of the result.
+
+    batcher = InferenceBatcher('question', lambda model, X: model.predict(X))
+    prediction = batcher.submit(model, features)   # same result as model.predict
+
+If the queue is full or a result does not arrive within the timeout, the
+caller runs the model on its own rows instead, so batching never fails a request.
+
+Configure with settings.ASSESSMENT_INFERENCE_BATCHING (disabled by default).
+"""
+import os
+import queue
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+from django.conf import settings
+
+DEFAULTS = {
+    'ENABLED': False,
+    'WINDOW_MS': 2,      # how long the first request in a batch waits for others
+    'MAX_BATCH': 64,     # rows per model call
+    'MAX_QUEUE': 256,    # pending requests before callers stop queueing
+    'TIMEOUT_MS': 100,   # caller gives up and predicts on its own after this
+}
+
+
+class _Pending:
+    """One submitted request waiting for its slice of a batch result."""
+
+    __slots__ = ('model', 'rows', 'submitted_at', 'done', 'result', 'error', 'cancelled')
+
+    def __init__(self, model, rows):
+        self.model = model
+        self.rows = rows
+        self.submitted_at = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.cancelled = False
+
+
+class InferenceBatcher:
+    """
+    Background thread that batches calls to `call(model, X)`.
+
+    `call` must return one result row per input row (e.g. model.predict or
+    model.predict_proba). Requests for different model instances are batched
+    separately.
+    """
+
+    def __init__(self, name: str, call: Callable[[Any, np.ndarray], np.ndarray],
+                 window_ms: float = 2, max_batch: int = 64, max_queue: int = 256,
+                 timeout_ms: float = 100):
+        self.name = name
+        self.call = call
+        self.pid = os.getpid()
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.timeout = timeout_ms / 1000.0
+        self._queue = queue.Queue(maxsize=max_queue)
+
+        # Metrics
+        self._lock = threading.Lock()
+        self.batch_sizes = Counter()        # rows per model call -> number of calls
+        self.latencies = deque(maxlen=10000)  # per-request seconds, submit to result
+        self.queue_full = 0
+        self.timeouts = 0
+
+        self._thread = threading.Thread(target=self._run, name=f'inference-batcher-{name}', daemon=True)
+        self._thread.start()
+
+    def submit(self, model, X: np.ndarray) -> np.ndarray:
+        """Run `call(model, X)`, batched with concurrent requests when possible."""
+        pending = _Pending(model, np.asarray(X))
+        try:
+            self._queue.put_nowait(pending)
+        except queue.Full:
+            with self._lock:
+                self.queue_full += 1
+            return self._direct(pending)
+
+        if not pending.done.wait(self.timeout):
+            pending.cancelled = True
+            with self._lock:
+                self.timeouts += 1
+            return self._direct(pending)
+
+        if pending.error is not None:
+            raise pending.error
+        self._record_latency(pending)
+        return pending.result
+
+    def _direct(self, pending: _Pending) -> np.ndarray:
+        """Timeout / queue-full fallback: run the model on this request's rows alone."""
+        result = self.call(pending.model, pending.rows)
+        with self._lock:
+            self.batch_sizes[len(pending.rows)] += 1
+        self._record_latency(pending)
+        return result
+
+    def _record_latency(self, pending: _Pending) -> None:
+        with self._lock:
+            self.latencies.append(time.perf_counter() - pending.submitted_at)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            rows = len(batch[0].rows)
+            deadline = batch[0].submitted_at + self.window
+            while rows < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    pending = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(pending)
+                rows += len(pending.rows)
+            self._process(batch)
+
+    def _process(self, batch):
+        # One model call per model instance in the batch (normally just one)
+        groups: Dict[int, list] = {}
+        for pending in batch:
+            if not pending.cancelled:
+                groups.setdefault(id(pending.model), []).append(pending)
+
+        for group in groups.values():
+            X = np.vstack([pending.rows for pending in group])
+            try:
+                result = self.call(group[0].model, X)
+            except Exception as e:
+                for pending in group:
+                    pending.error = e
+                    pending.done.set()
+                continue
+
+            with self._lock:
+                self.batch_sizes[len(X)] += 1
+            start = 0
+            for pending in group:
+                end = start + len(pending.rows)
+                pending.result = result[start:end]
+                start = end
+                pending.done.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """Batch-size distribution and per-request latency percentiles (ms)."""
+        with self._lock:
+            latencies = np.array(self.latencies) * 1000
+            calls = sum(self.batch_sizes.values())
+            rows = sum(size * count for size, count in self.batch_sizes.items())
+            return {
+                'name': self.name,
+                'model_calls': calls,
+                'rows': rows,
+                'mean_batch_size': rows / calls if calls else 0.0,
+                'batch_sizes': dict(sorted(self.batch_sizes.items())),
+                'latency_ms': {
+                    'p50': float(np.percentile(latencies, 50)) if len(latencies) else None,
+                    'p95': float(np.percentile(latencies, 95)) if len(latencies) else None,
+                    'p99': float(np.percentile(latencies, 99)) if len(latencies) else None,
+                },
+                'queue_full': self.queue_full,
+                'timeouts': self.timeouts,
+            }
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.batch_sizes.clear()
+            self.latencies.clear()
+            self.queue_full = 0
+            self.timeouts = 0
+
+
+_batchers: Dict[str, InferenceBatcher] = {}
+_batchers_lock = threading.Lock()
+
+
+def batching_config() -> Dict[str, Any]:
+    return {**DEFAULTS, **getattr(settings, 'ASSESSMENT_INFERENCE_BATCHING', {})}
+
+
+def get_batcher(name: str, call: Callable[[Any, np.ndarray], np.ndarray]) -> Optional[InferenceBatcher]:
+    """Return the process-wide batcher for `name`, or None if batching is disabled."""
+    batcher = _batchers.get(name)
+    # The worker thread does not survive a fork, so each process starts its own
+    if batcher is not None and batcher.pid == os.getpid():
+        return batcher
+
+    config = batching_config()
+    if not config['ENABLED']:
+        return None
+
+    with _batchers_lock:
+        if name not in _batchers or _batchers[name].pid != os.getpid():
+            _batchers[name] = InferenceBatcher(
+                name,
+                call,
+                window_ms=config['WINDOW_MS'],
+                max_batch=config['MAX_BATCH'],
+                max_queue=config['MAX_QUEUE'],
+                timeout_ms=config['TIMEOUT_MS'],
+            )
+    return _batchers[name]
+
+
+def batcher_stats() -> Dict[str, Dict[str, Any]]:
+    """Stats for every batcher started in this process."""
+    return {name: batcher.stats() for name, batcher in _batchers.items()}
@@ -0,0 +1,274 @@
+"""
+Item Response Theory (IRT) engine for next-question selection.
+
+The rule-based fallback and the question model only move between three
+difficulty levels. With settings.ASSESSMENT_IRT enabled, select_next_question
+uses this module instead:
+
+    items      - the catalog templates. Every generated question of a template
+                 is one item. Stored questions are items keyed by question_id.
+    model      - two-parameter logistic (2PL):
+                 P(correct | theta) = 1 / (1 + exp(-a * (theta - b)))
+    parameters - from ItemParameter (written by `manage.py calibrate_irt_items`).
+                 Items without a row use the prior: a = 1, b = -1/0/1 for easy/medium/hard.
+    ability    - one estimate per domain for each session: the expected a
+                 posteriori (EAP) value on a grid, with a standard normal
+                 prior, from the answers kept in SessionStats.irt_responses.
+
+The next item is chosen in one NumPy pass over the whole bank. For every
+item it computes the Fisher information a^2 * P * (1 - P) at the ability
+estimate of the item's domain and weights it by that domain's posterior
+variance. The weighted information is the share of the domain's
+uncertainty the answer is expected to remove. Items the session has already
+answered are skipped.
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from .models import GeneratedQuestion, ItemParameter
+from .question_catalog import get_catalog, parse_generated_question_id
+
+logger = logging.getLogger(__name__)
+
+# Prior item parameters, used until an item is calibrated
+PRIOR_DISCRIMINATION = 1.0
+PRIOR_LOCATION = {'easy': -1.0, 'medium': 0.0, 'hard': 1.0}
+
+# Calibration priors (keep items with few responses near the defaults)
+DISCRIMINATION_PRIOR_SD = 0.5
+LOCATION_PRIOR_SD = 1.0
+DISCRIMINATION_RANGE = (0.2, 4.0)
+
+# Abilities and locations are on [-GRID_RANGE, GRID_RANGE]
+GRID_RANGE = 4.0
+
+DEFAULTS = {
+    'ENABLED': False,
+    'MAX_AGE_S': 300,  # item parameters are reloaded after this
+    'GRID_POINTS': 61,  # quadrature points for ability estimates and calibration
+}
+
+
+def irt_config() -> Dict[str, Any]:
+    return {**DEFAULTS, **getattr(settings, 'ASSESSMENT_IRT', {})}
+
+
+def ability_grid(points: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Quadrature grid and the log standard normal prior on it."""
+    grid = np.linspace(-GRID_RANGE, GRID_RANGE, points)
+    return grid, -0.5 * grid * grid
+
+
+def probability(a, b, theta):
+    """2PL probability of a correct answer (broadcasts over its arguments)."""
+    return 1.0 / (1.0 + np.exp(-a * (theta - b)))
+
+
+def item_information(a, b, theta):
+    """Fisher information of 2PL items at theta."""
+    p = probability(a, b, theta)
+    return a * a * p * (1.0 - p)
+
+
+def estimate_ability(a: np.ndarray, b: np.ndarray, correct: np.ndarray,
+                     grid: np.ndarray, log_prior: np.ndarray) -> Tuple[float, float]:
+    """
+    EAP ability estimate from answered items.
+
+    Args:
+        a, b: Parameters of the answered items
+        correct: Outcome of each answer (bool)
+        grid, log_prior: See ability_grid
+
+    Returns:
+        (theta, standard error) - (0, 1) when nothing has been answered
+    """
+    p = np.clip(probability(a[:, None], b[:, None], grid), 1e-9, 1 - 1e-9)
+    log_posterior = log_prior + np.where(correct[:, None], np.log(p), np.log1p(-p)).sum(axis=0)
+    weights = np.exp(log_posterior - log_posterior.max())
+    weights /= weights.sum()
+    theta = float(weights @ grid)
+    return theta, float(np.sqrt(weights @ (grid - theta) ** 2))
+
+
+class ItemBank:
+    """Item parameters and the servable items (catalog templates) as arrays."""
+
+    def __init__(self, parameters: Dict[str, Tuple[float, float]], grid_points: int = 61):
+        self.parameters = parameters
+        self.built_at = time.monotonic()
+        self.grid, self.log_prior = ability_grid(grid_points)
+
+        templates = list(get_catalog().templates.values())
+        self.item_ids = [template.id for template in templates]
+        self.positions = {item_id: i for i, item_id in enumerate(self.item_ids)}
+        self.domain_names = sorted({template.domain for template in templates})
+        self.domain_index = np.array([self.domain_names.index(template.domain) for template in templates])
+        params = np.array([self.item_parameters(template.id, template.difficulty) for template in templates])
+        self.a = params[:, 0]
+        self.b = params[:, 1]
+
+    @classmethod
+    def load(cls, grid_points: int = 61) -> 'ItemBank':
+        parameters = {
+            item_id: (a, b)
+            for item_id, a, b in ItemParameter.objects.values_list('item_id', 'discrimination', 'location')
+        }
+        return cls(parameters, grid_points=grid_points)
+
+    def __len__(self) -> int:
+        return len(self.item_ids)
+
+    def item_parameters(self, item_id: str, difficulty: str) -> Tuple[float, float]:
+        """(a, b) of an item, or the prior for its difficulty level if it isn't calibrated."""
+        params = self.parameters.get(item_id)
+        if params is None:
+            return PRIOR_DISCRIMINATION, PRIOR_LOCATION.get(difficulty, 0.0)
+        return params
+
+    def abilities(self, irt_responses: Dict[str, List[list]]) -> Dict[str, Tuple[float, float]]:
+        """(theta, standard error) per domain from SessionStats.irt_responses."""
+        abilities = {}
+        for domain in set(self.domain_names) | set(irt_responses):
+            answers = irt_responses.get(domain) or []
+            params = np.array([self.item_parameters(item_id, difficulty) for item_id, difficulty, _ in answers],
+                              dtype=float).reshape(-1, 2)
+            correct = np.array([bool(answer[2]) for answer in answers], dtype=bool)
+            abilities[domain] = estimate_ability(params[:, 0], params[:, 1], correct, self.grid, self.log_prior)
+        return abilities
+
+    def next_item(self, irt_responses: Dict[str, List[list]]) -> Optional[str]:
+        """
+        The unanswered item that is expected to remove the largest share of
+        its domain's ability uncertainty, or None if every item has been answered.
+        """
+        abilities = self.abilities(irt_responses)
+        theta = np.array([abilities[domain][0] for domain in self.domain_names])[self.domain_index]
+        variance = np.array([abilities[domain][1] ** 2 for domain in self.domain_names])[self.domain_index]
+
+        score = item_information(self.a, self.b, theta) * variance
+        for answers in irt_responses.values():
+            for item_id, _, _ in answers:
+                position = self.positions.get(item_id)
+                if position is not None:
+                    score[position] = -np.inf
+
+        best = int(np.argmax(score))
+        return self.item_ids[best] if np.isfinite(score[best]) else None
+
+
+def calibrate(person: np.ndarray, item: np.ndarray, correct: np.ndarray, prior_location: np.ndarray,
+              iterations: int = 50, grid_points: int = 61, tolerance: float = 1e-3) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    2PL item parameters by marginal maximum likelihood (Bock-Aitkin EM) with
+    normal priors on a and b.
+
+    Every person (a session's answers in one domain) has a standard normal
+    ability prior, which fixes the scale. Memory is O(responses); the
+    responses are processed one grid point at a time.
+
+    Args:
+        person, item: Index of the person and the item of each response
+        correct: Outcome of each response (bool)
+        prior_location: Prior mean of b for each item
+        iterations: Maximum EM cycles
+        grid_points: Quadrature points
+        tolerance: Stop once no parameter moves more than this in a cycle
+
+    Returns:
+        (a, b) - one value per item
+    """
+    grid, log_prior = ability_grid(grid_points)
+    n_persons, n_items = int(person.max()) + 1, len(prior_location)
+    outcome = correct.astype(float)
+    a = np.full(n_items, PRIOR_DISCRIMINATION)
+    b = np.asarray(prior_location, dtype=float).copy()
+
+    for _ in range(iterations):
+        previous_a, previous_b = a, b
+
+        # E-step: each person's posterior over the grid
+        log_posterior = np.tile(log_prior, (n_persons, 1))
+        a_r, b_r = a[item], b[item]
+        for q, theta in enumerate(grid):
+            p = np.clip(probability(a_r, b_r, theta), 1e-9, 1 - 1e-9)
+            log_posterior[:, q] += np.bincount(person, np.where(correct, np.log(p), np.log1p(-p)),
+                                               minlength=n_persons)
+        weights = np.exp(log_posterior - log_posterior.max(axis=1, keepdims=True))
+        weights /= weights.sum(axis=1, keepdims=True)
+
+        # Expected responses (n) and correct responses (r) of each item at each grid point
+        n = np.empty((n_items, grid_points))
+        r = np.empty((n_items, grid_points))
+        for q in range(grid_points):
+            person_weight = weights[person, q]
+            n[:, q] = np.bincount(item, person_weight, minlength=n_items)
+            r[:, q] = np.bincount(item, person_weight * outcome, minlength=n_items)
+
+        # M-step: a few Newton steps on every item's expected log-likelihood at once
+        for _ in range(3):
+            p = probability(a[:, None], b[:, None], grid)
+            residual = r - n * p
+            weight = n * p * (1.0 - p)
+            distance = grid - b[:, None]
+            a = a + ((residual * distance).sum(axis=1) - (a - PRIOR_DISCRIMINATION) / DISCRIMINATION_PRIOR_SD ** 2) / (
+                (weight * distance * distance).sum(axis=1) + 1 / DISCRIMINATION_PRIOR_SD ** 2)
+            a = np.clip(a, *DISCRIMINATION_RANGE)
+            b = b + (-a * residual.sum(axis=1) - (b - prior_location) / LOCATION_PRIOR_SD ** 2) / (
+                a * a * weight.sum(axis=1) + 1 / LOCATION_PRIOR_SD ** 2)
+            b = np.clip(b, -GRID_RANGE, GRID_RANGE)
+
+        if max(np.abs(a - previous_a).max(), np.abs(b - previous_b).max()) < tolerance:
+            break
+    return a, b
+
+
+def answer_item_id(question_id: str) -> Optional[str]:
+    """
+    Item of an answered question: its template for a generated question (one
+    primary-key lookup) or the question_id of a stored question.
+    """
+    seed = parse_generated_question_id(question_id)
+    if seed is None:
+        return question_id
+    return GeneratedQuestion.objects.filter(seed=seed).values_list('template_id', flat=True).first()
+
+
+def response_item_id(response) -> Optional[str]:
+    """Item of a stored UserResponse (select_related('generated_question') avoids a query each)."""
+    if response.question_id is not None:
+        return response.question_id
+    if response.generated_question_id is None:
+        return None
+    try:
+        generated = response.generated_question
+    except GeneratedQuestion.DoesNotExist:
+        return None
+    return generated.template_id if generated is not None else None
+
+
+_bank: Optional[ItemBank] = None
+_bank_lock = threading.Lock()
+
+
+def get_item_bank() -> Optional[ItemBank]:
+    """Return the process-wide item bank (loaded on first use), or None if IRT selection is disabled."""
+    global _bank
+    config = irt_config()
+    if not config['ENABLED']:
+        return None
+
+    bank = _bank
+    if bank is not None and time.monotonic() - bank.built_at < config['MAX_AGE_S']:
+        return bank
+
+    with _bank_lock:
+        if _bank is bank:
+            _bank = ItemBank.load(grid_points=config['GRID_POINTS'])
+            logger.debug("IRT item bank loaded: %d items, %d calibrated", len(_bank), len(_bank.parameters))
+        return _bank
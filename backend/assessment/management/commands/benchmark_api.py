@@ -0,0 +1,326 @@
+"""
+End-to-end benchmark of the assessment API.
+
+Run with: python manage.py benchmark_api [--sessions 20] [--db-sizes 0,1000] [--output bench.json]
+
+Creates a throwaway test database, seeds it with --db-sizes completed
+historical sessions (15 responses each), then runs --sessions full synthetic
+sessions through the Django test client:
+
+    start-session, get-next-question, 15 x (submit-answer, get-next-question),
+    end-session, get-dashboard-data, get-user-history
+
+(--flow combined uses answer-and-next instead of the submit/next pair.)
+
+Per endpoint the report gives p50/p95/p99 latency, DB query count and query
+time, and model inference time. It is written as JSON. --compare prints the
+change against an earlier report.
+"""
+import contextlib
+import io
+import json
+import logging
+import platform
+import random
+import time
+
+import django
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+
+from assessment.apps import warm_up_models
+from assessment.inference_batcher import batcher_stats
+from assessment.ml_utils import track_inference_time
+from assessment.models import (
+    FinalPrediction,
+    MistakePattern,
+    Question,
+    Session,
+    SessionStats,
+    User,
+    UserResponse,
+)
+from assessment.question_pool import question_pool_stats
+from assessment.session_state import ASSESSMENT_DOMAINS, apply_response
+
+DIFFICULTIES = ['easy', 'medium', 'hard']
+MISTAKE_TYPES = {
+    'reading': 'letter_reversal',
+    'math': 'calculation_error',
+    'attention': 'sequence_error',
+}
+SEED_BATCH = 1000
+
+
+class Command(BaseCommand):
+    help = "Benchmark full assessment sessions against the API and write a JSON report."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=20, help='Synthetic sessions per database size')
+        parser.add_argument('--db-sizes', default='0,1000',
+                            help='Comma-separated numbers of historical sessions to seed')
+        parser.add_argument('--flow', choices=['separate', 'combined'], default='separate')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the JSON report here (default: stdout)')
+        parser.add_argument('--compare', help='Earlier JSON report to compare against')
+        parser.add_argument('--show-logs', action='store_true',
+                            help="Show the views' output and the assessment app's debug log")
+
+    def handle(self, *args, **options):
+        db_sizes = [int(size) for size in options['db_sizes'].split(',') if size.strip()]
+
+        # Load the models up front, as the WSGI entry point does, so they aren't timed in the first request
+        warm_up_models()
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            runs = []
+            seeded = 0
+            for db_size in sorted(db_sizes):
+                start = time.perf_counter()
+                self._seed(db_size - seeded, random.Random(options['seed'] + db_size))
+                seeded = db_size
+                seed_seconds = time.perf_counter() - start
+
+                samples = self._run_sessions(options['sessions'], options['flow'],
+                                             random.Random(options['seed']), options['show_logs'])
+                runs.append({
+                    'db_size': db_size,
+                    'seed_seconds': round(seed_seconds, 2),
+                    'endpoints': {name: summarize(rows) for name, rows in samples.items()},
+                    'question_pool': self._pool_stats(),
+                    'inference_batchers': batcher_stats(),
+                })
+                self._print_run(runs[-1])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            'meta': {
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'sessions': options['sessions'],
+                'flow': options['flow'],
+                'seed': options['seed'],
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'inference_batching': getattr(settings, 'ASSESSMENT_INFERENCE_BATCHING', {}).get('ENABLED', False),
+                'state_store': getattr(settings, 'ASSESSMENT_STATE_STORE', {}).get('BACKEND'),
+            },
+            'runs': runs,
+        }
+
+        payload = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(payload + '\n')
+            self.stdout.write(self.style.SUCCESS(f"✅ Report written to {options['output']}"))
+        else:
+            self.stdout.write(payload)
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                self._print_comparison(json.load(f), report)
+
+    def _seed(self, count, rng):
+        """Add `count` completed sessions with 15 responses, stats and a prediction each."""
+        if count <= 0:
+            return
+
+        questions = []
+        for domain in ASSESSMENT_DOMAINS:
+            for difficulty in DIFFICULTIES:
+                questions.append(Question(
+                    question_id=f"BENCH_{domain[0].upper()}_{difficulty[0].upper()}",
+                    domain=domain,
+                    difficulty=difficulty,
+                    question_text=f"Benchmark {domain} question ({difficulty})",
+                    options=['a', 'b', 'c', 'd'],
+                    correct_option='a',
+                ))
+        Question.objects.bulk_create(questions, ignore_conflicts=True)
+
+        for offset in range(0, count, SEED_BATCH):
+            batch = min(SEED_BATCH, count - offset)
+
+            # Read ids back instead of relying on bulk_create returning them (MySQL doesn't)
+            last_user = User.objects.aggregate(last=Max('user_id'))['last'] or 0
+            User.objects.bulk_create([User(age_group=rng.choice(['6-8', '9-11', '12-14'])) for _ in range(batch)])
+            users = list(User.objects.filter(user_id__gt=last_user).order_by('user_id'))
+
+            sessions = [Session(session_id=f"S_{user.user_id}_01", user=user, completed=True) for user in users]
+            Session.objects.bulk_create(sessions)
+
+            last_response = UserResponse.objects.aggregate(last=Max('response_id'))['last'] or 0
+            responses, all_stats, predictions = [], [], []
+            for session in sessions:
+                stats = SessionStats(session=session)
+                for _ in range(15):
+                    question = rng.choice(questions)
+                    correct = rng.random() > 0.35
+                    response_time_ms = rng.randint(400, 6000)
+                    responses.append(UserResponse(
+                        session=session,
+                        user=session.user,
+                        question=question,
+                        domain=question.domain,
+                        difficulty=question.difficulty,
+                        correct=correct,
+                        response_time_ms=response_time_ms,
+                        confidence='medium',
+                    ))
+                    apply_response(stats, question.domain, question.difficulty, correct, response_time_ms,
+                                   None if correct else MISTAKE_TYPES[question.domain], question.question_id)
+                all_stats.append(stats)
+                predictions.append(FinalPrediction(
+                    user=session.user,
+                    session=session,
+                    dyslexia_risk_score=0.2,
+                    dyscalculia_risk_score=0.2,
+                    attention_risk_score=0.2,
+                    final_label='low-risk',
+                    key_insights=['Performance within normal range across all domains'],
+                    confidence_level='low',
+                ))
+            UserResponse.objects.bulk_create(responses)
+            SessionStats.objects.bulk_create(all_stats)
+            FinalPrediction.objects.bulk_create(predictions)
+
+            MistakePattern.objects.bulk_create([
+                MistakePattern(response_id=response_id, mistake_type=MISTAKE_TYPES[domain], severity='medium')
+                for response_id, domain in UserResponse.objects.filter(
+                    response_id__gt=last_response, correct=False
+                ).values_list('response_id', 'domain')
+            ])
+
+    def _run_sessions(self, sessions, flow, rng, show_logs):
+        client = Client()
+        samples = {}
+        if show_logs:
+            logger = logging.getLogger('assessment')
+            logger.setLevel(logging.DEBUG)
+            if not logger.handlers:
+                logger.addHandler(logging.StreamHandler())
+
+        def call(endpoint, body):
+            # Django records query times rounded to milliseconds, so time them here
+            query_seconds = [0.0]
+
+            def time_query(execute, sql, params, many, context):
+                start = time.perf_counter()
+                try:
+                    return execute(sql, params, many, context)
+                finally:
+                    query_seconds[0] += time.perf_counter() - start
+
+            logs = contextlib.nullcontext() if show_logs else contextlib.redirect_stdout(io.StringIO())
+            with logs, CaptureQueriesContext(connection) as queries, \
+                    connection.execute_wrapper(time_query), track_inference_time() as inference:
+                start = time.perf_counter()
+                response = client.post(f'/{endpoint}/', body, content_type='application/json')
+                elapsed = time.perf_counter() - start
+            if response.status_code >= 400:
+                raise CommandError(f"{endpoint} returned {response.status_code}: {response.content[:500]!r}")
+            samples.setdefault(endpoint, []).append((
+                elapsed * 1000,
+                len(queries),
+                query_seconds[0] * 1000,
+                inference['seconds'] * 1000,
+            ))
+            return response.json()
+
+        for _ in range(sessions):
+            session = call('start-session', {'age_group': rng.choice(['6-8', '9-11', '12-14'])})
+            ids = {'user_id': session['user_id'], 'session_id': session['session_id']}
+
+            question = call('get-next-question', ids)
+            while not question.get('end_session'):
+                correct = rng.random() > 0.35
+                answer = dict(
+                    ids,
+                    question_id=question['question_id'],
+                    domain=question['domain'],
+                    difficulty=question['difficulty'],
+                    correct=correct,
+                    response_time_ms=rng.randint(400, 6000),
+                    confidence='medium',
+                    mistake_type=None if correct else MISTAKE_TYPES.get(question['domain'], 'substitution'),
+                )
+                if flow == 'combined':
+                    question = call('answer-and-next', answer)['next_question']
+                else:
+                    call('submit-answer', answer)
+                    question = call('get-next-question', dict(
+                        ids,
+                        last_question_id=answer['question_id'],
+                        correct=answer['correct'],
+                        response_time_ms=answer['response_time_ms'],
+                    ))
+
+            call('end-session', ids)
+            call('get-dashboard-data', ids)
+            call('get-user-history', {'user_id': ids['user_id']})
+
+        return samples
+
+    def _pool_stats(self):
+        stats = question_pool_stats()
+        if stats is None:
+            return None
+        return {'hits': stats['hits'], 'misses': stats['misses'], 'hit_rate': round(stats['hit_rate'], 3)}
+
+    def _print_run(self, run):
+        self.stderr.write(f"\nDB size {run['db_size']} (seeded in {run['seed_seconds']}s)")
+        self.stderr.write(f"  {'endpoint':<20}{'n':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+                          f"{'queries':>9}{'query ms':>10}{'model ms':>10}")
+        for name, stats in run['endpoints'].items():
+            latency = stats['latency_ms']
+            self.stderr.write(
+                f"  {name:<20}{stats['requests']:>6}{latency['p50']:>9.2f}{latency['p95']:>9.2f}"
+                f"{latency['p99']:>9.2f}{stats['queries']['mean']:>9.1f}{stats['query_time_ms']['mean']:>10.2f}"
+                f"{stats['inference_ms']['mean']:>10.2f}"
+            )
+
+    def _print_comparison(self, baseline, report):
+        self.stderr.write("\nChange vs baseline (p50 latency, mean queries)")
+        previous = {run['db_size']: run for run in baseline.get('runs', [])}
+        for run in report['runs']:
+            before = previous.get(run['db_size'])
+            if before is None:
+                continue
+            self.stderr.write(f"  DB size {run['db_size']}")
+            for name, stats in run['endpoints'].items():
+                old = before['endpoints'].get(name)
+                if old is None:
+                    continue
+                self.stderr.write(
+                    f"    {name:<20}{old['latency_ms']['p50']:>8.2f} -> {stats['latency_ms']['p50']:>8.2f} ms"
+                    f"{old['queries']['mean']:>8.1f} -> {stats['queries']['mean']:>5.1f} queries"
+                )
+
+
+def summarize(rows):
+    """Percentiles for one endpoint's (latency, queries, query time, inference time) samples."""
+    latency, queries, query_ms, inference_ms = (np.array(column, dtype=float) for column in zip(*rows))
+
+    def percentiles(values):
+        return {
+            'mean': round(float(values.mean()), 3),
+            'p50': round(float(np.percentile(values, 50)), 3),
+            'p95': round(float(np.percentile(values, 95)), 3),
+            'p99': round(float(np.percentile(values, 99)), 3),
+        }
+
+    return {
+        'requests': len(rows),
+        'latency_ms': percentiles(latency),
+        'queries': {'mean': round(float(queries.mean()), 2), 'max': int(queries.max())},
+        'query_time_ms': percentiles(query_ms),
+        'inference_ms': percentiles(inference_ms),
+    }
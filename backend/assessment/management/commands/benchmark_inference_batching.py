@@ -0,0 +1,119 @@
+"""
+Compare per-request model calls with micro-batched ones under concurrency.
+
+Run with: python manage.py benchmark_inference_batching [--threads 16] [--requests 2000]
+
+Each of --threads threads issues single-row calls (question model predict and
+risk model predict_proba) first directly, then through an InferenceBatcher
+using settings.ASSESSMENT_INFERENCE_BATCHING. Prints throughput, per-request
+latency and the batch-size distribution, and checks the outputs are identical.
+"""
+import threading
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from assessment.decision_table import SERVING_DISCRETE_ROWS, session_accuracy_values
+from assessment.inference_batcher import InferenceBatcher, batching_config
+from assessment.ml_utils import (
+    _predict_rows,
+    _risk_proba_rows,
+    load_question_model,
+    load_risk_scorer,
+)
+
+
+class Command(BaseCommand):
+    help = "Benchmark micro-batched model inference against one call per request."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--requests', type=int, default=2000, help='Single-row calls per model')
+        parser.add_argument('--window-ms', type=float, help='Override WINDOW_MS')
+
+    def handle(self, *args, **options):
+        config = batching_config()
+        if options['window_ms'] is not None:
+            config['WINDOW_MS'] = options['window_ms']
+
+        question_model = load_question_model()
+        risk_scorer = load_risk_scorer()
+        if question_model is None or not risk_scorer.has_proba:
+            raise CommandError("Question and risk models are required")
+
+        n = options['requests']
+        rng = np.random.default_rng(0)
+        question_rows = np.empty((n, 7))
+        question_rows[:, [0, 2, 3, 4, 6]] = np.array(SERVING_DISCRETE_ROWS)[rng.integers(len(SERVING_DISCRETE_ROWS), size=n)]
+        question_rows[:, 1] = rng.integers(0, 15000, size=n)
+        question_rows[:, 5] = rng.choice(session_accuracy_values(15), size=n)
+
+        risk_rows = np.column_stack([
+            rng.uniform(0, 1, size=(n, 3)),          # reading/math/focus accuracy
+            rng.uniform(500, 8000, size=n),          # avg_time_ms
+            rng.uniform(0, 0.5, size=(n, 3)),        # reversal / pv / impulse rates
+        ]).astype(np.float32)
+
+        self.stdout.write(f"{options['threads']} threads, {n} single-row calls per model, "
+                          f"window {config['WINDOW_MS']} ms, max batch {config['MAX_BATCH']}")
+
+        for name, model, call, rows in (
+            ('question', question_model, _predict_rows, question_rows),
+            ('risk', risk_scorer, _risk_proba_rows, risk_rows),
+        ):
+            direct, direct_ms, direct_s = self._run(options['threads'], rows, lambda X: call(model, X))
+
+            batcher = InferenceBatcher(
+                name, call,
+                window_ms=config['WINDOW_MS'],
+                max_batch=config['MAX_BATCH'],
+                max_queue=config['MAX_QUEUE'],
+                timeout_ms=config['TIMEOUT_MS'],
+            )
+            batched, _, batched_s = self._run(options['threads'], rows, lambda X: batcher.submit(model, X))
+            stats = batcher.stats()
+
+            if not np.array_equal(direct, batched):
+                raise CommandError(f"❌ {name}: batched results differ from direct calls")
+
+            self.stdout.write(self.style.SUCCESS(f"\n{name} model"))
+            self.stdout.write(
+                f"  direct : {n / direct_s:8.0f} rows/s, latency p50 {np.percentile(direct_ms, 50):.2f} ms, "
+                f"p95 {np.percentile(direct_ms, 95):.2f} ms, p99 {np.percentile(direct_ms, 99):.2f} ms"
+            )
+            latency = stats['latency_ms']
+            self.stdout.write(
+                f"  batched: {n / batched_s:8.0f} rows/s, latency p50 {latency['p50']:.2f} ms, "
+                f"p95 {latency['p95']:.2f} ms, p99 {latency['p99']:.2f} ms"
+            )
+            self.stdout.write(
+                f"  {stats['model_calls']} model calls, mean batch {stats['mean_batch_size']:.1f}, "
+                f"queue full {stats['queue_full']}, timeouts {stats['timeouts']}"
+            )
+            self.stdout.write(f"  batch sizes: {stats['batch_sizes']}")
+
+    def _run(self, threads, rows, predict):
+        """Call predict on every row from `threads` threads; return results, latencies (ms), wall time."""
+        results = [None] * len(rows)
+        latencies = np.zeros(len(rows))
+        next_index = iter(range(len(rows)))
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                with lock:
+                    i = next(next_index, None)
+                if i is None:
+                    return
+                start = time.perf_counter()
+                results[i] = predict(rows[i:i + 1])
+                latencies[i] = (time.perf_counter() - start) * 1000
+
+        pool = [threading.Thread(target=worker) for _ in range(threads)]
+        start = time.perf_counter()
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        return np.vstack(results), latencies, time.perf_counter() - start
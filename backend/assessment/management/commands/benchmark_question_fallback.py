@@ -0,0 +1,140 @@
+"""
+Benchmark of the rule-based question fallback.
+
+Run with: python manage.py benchmark_question_fallback [--questions 100000] [--answered 0,1000,20000] [--repeat 20]
+
+Creates a throwaway test database with --questions questions spread evenly
+over the nine (domain, difficulty) cells, and one session per --answered
+size. Answers fill the requested cell (reading/easy) first, so larger
+sessions fall through to the wider tiers. For every session it times:
+
+    cascade  - the previous implementation: up to four
+               filter(...).exclude(question_id__in=<answered subquery>).first() queries
+    ranked   - adaptive_logic.pick_unanswered_question (one query: ranked
+               UNION ALL of LIMIT 1 tiers with NOT EXISTS)
+    bank     - the in-memory QuestionBank (see question_bank.py)
+
+and checks that every method picks an unanswered question from the tier the
+cascade picks from (ranked and bank pick at random within a tier).
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+
+from assessment.adaptive_logic import pick_unanswered_question
+from assessment.models import Question, Session, User, UserResponse
+from assessment.question_bank import QuestionBank
+
+DOMAINS = ['reading', 'math', 'attention']
+DIFFICULTIES = ['easy', 'medium', 'hard']
+TARGET = ('reading', 'easy')
+SEED_BATCH = 5000
+
+
+def cascade_pick(session_id: str, domain: str, difficulty: str):
+    """The fallback as it was before pick_unanswered_question (kept for comparison)."""
+    answered_ids = UserResponse.objects.filter(
+        session_id=session_id, question__isnull=False
+    ).values_list('question_id', flat=True)
+    for filters in ({'domain': domain, 'difficulty': difficulty}, {'domain': domain},
+                    {'difficulty': difficulty}, {}):
+        question = Question.objects.filter(**filters).exclude(question_id__in=answered_ids).first()
+        if question:
+            return question
+    return None
+
+
+def tier(question) -> int:
+    """Fallback tier of a pick for TARGET: 0 exact, 1 same domain, 2 same difficulty, 3 other."""
+    if question.domain == TARGET[0]:
+        return 0 if question.difficulty == TARGET[1] else 1
+    return 2 if question.difficulty == TARGET[1] else 3
+
+
+class Command(BaseCommand):
+    help = "Compare the question fallback cascade, the single ranked query and the in-memory bank."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=100000, help='Questions in the bank')
+        parser.add_argument('--answered', default='0,1000,20000',
+                            help='Comma-separated numbers of answered questions per session')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed calls per method and session')
+
+    def handle(self, *args, **options):
+        answered_sizes = [int(size) for size in options['answered'].split(',') if size.strip()]
+        repeat = options['repeat']
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            start = time.perf_counter()
+            question_ids = self._seed_questions(options['questions'])
+            sessions = [self._seed_session(i, count, question_ids) for i, count in enumerate(answered_sizes)]
+            self.stdout.write(f"Seeded {len(question_ids)} questions in {time.perf_counter() - start:.1f}s")
+
+            start = time.perf_counter()
+            bank = QuestionBank.load()
+            self.stdout.write(f"Question bank loaded in {(time.perf_counter() - start) * 1000:.0f} ms\n")
+
+            self.stdout.write(f"{'answered':>9} {'method':<8}{'ms/call':>10}{'queries':>9}  picked")
+            for session_id, count in zip(sessions, answered_sizes):
+                picks = {}
+                for name, pick in (
+                    ('cascade', lambda: cascade_pick(session_id, *TARGET)),
+                    ('ranked', lambda: pick_unanswered_question(session_id, *TARGET)),
+                    ('bank', lambda: bank.pick(bank.answered(session_id, count), *TARGET)),
+                ):
+                    pick()  # warm-up (loads the bank's answered set)
+                    with CaptureQueriesContext(connection) as queries:
+                        start = time.perf_counter()
+                        for _ in range(repeat):
+                            question = pick()
+                        elapsed = (time.perf_counter() - start) / repeat * 1000
+                    picks[name] = question
+                    picked = f"{question.domain}/{question.difficulty}" if question else '-'
+                    self.stdout.write(
+                        f"{count:>9} {name:<8}{elapsed:>10.3f}{len(queries) / repeat:>9.1f}  {picked}"
+                    )
+
+                answered = set(UserResponse.objects.filter(session_id=session_id).values_list('question_id', flat=True))
+                expected = tier(picks['cascade'])
+                for name, question in picks.items():
+                    if tier(question) != expected or question.question_id in answered:
+                        self.stdout.write(self.style.ERROR(
+                            f"❌ {name} picked {question}, expected an unanswered question from tier {expected}"
+                        ))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def _seed_questions(self, count):
+        questions = [
+            Question(
+                question_id=f"BQ_{i:07d}",
+                domain=DOMAINS[i % 3],
+                difficulty=DIFFICULTIES[i // 3 % 3],
+                question_text=f"Benchmark question {i}",
+                options=['a', 'b', 'c', 'd'],
+                correct_option='a',
+            )
+            for i in range(count)
+        ]
+        Question.objects.bulk_create(questions, batch_size=SEED_BATCH)
+        return [question.question_id for question in questions]
+
+    def _seed_session(self, index, count, question_ids):
+        """A session that has answered `count` questions, those in the TARGET cell first."""
+        user = User.objects.create(age_group='9-11')
+        session = Session.objects.create(session_id=f"BENCH_{index}", user=user)
+
+        in_target = [qid for i, qid in enumerate(question_ids) if (DOMAINS[i % 3], DIFFICULTIES[i // 3 % 3]) == TARGET]
+        target_set = set(in_target)
+        ordered = in_target + [qid for qid in question_ids if qid not in target_set]
+        UserResponse.objects.bulk_create([
+            UserResponse(session=session, user=user, question_id=question_id, domain=TARGET[0],
+                         difficulty=TARGET[1], correct=True, response_time_ms=1500)
+            for question_id in ordered[:count]
+        ], batch_size=SEED_BATCH)
+        return session.session_id
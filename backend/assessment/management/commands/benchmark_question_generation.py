@@ -0,0 +1,55 @@
+"""
+Microbenchmark of question generation.
+
+Run with: python manage.py benchmark_question_generation [--repeat 20000] [--batch 10000]
+
+Prints the per-question cost of QuestionGeneratorModel.generate_question for
+every (domain, difficulty) cell, and of generate_questions in batches.
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from assessment.ml_utils import load_question_model
+
+DOMAINS = ['reading', 'math', 'attention']
+DIFFICULTIES = ['easy', 'medium', 'hard']
+
+
+class Command(BaseCommand):
+    help = "Measure per-question generation cost for each domain and difficulty."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20000, help='generate_question calls per cell')
+        parser.add_argument('--batch', type=int, default=10000, help='generate_questions batch size')
+
+    def handle(self, *args, **options):
+        generator = load_question_model()
+        if generator is None:
+            raise CommandError("No question model found")
+
+        random.seed(0)
+        repeat, batch = options['repeat'], options['batch']
+        self.stdout.write(f"{'cell':<20}{'single µs':>12}{'batch µs':>12}")
+
+        single_total = batch_total = 0.0
+        for domain in DOMAINS:
+            for difficulty in DIFFICULTIES:
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    generator.generate_question(domain, difficulty)
+                single = (time.perf_counter() - start) / repeat * 1e6
+
+                start = time.perf_counter()
+                generator.generate_questions(domain, difficulty, batch, seed=0)
+                batched = (time.perf_counter() - start) / batch * 1e6
+
+                single_total += single
+                batch_total += batched
+                self.stdout.write(f"{domain + '/' + difficulty:<20}{single:>12.2f}{batched:>12.2f}")
+
+        cells = len(DOMAINS) * len(DIFFICULTIES)
+        self.stdout.write(self.style.SUCCESS(
+            f"{'mean':<20}{single_total / cells:>12.2f}{batch_total / cells:>12.2f}"
+        ))
@@ -0,0 +1,126 @@
+"""
+Benchmark of the end-of-session risk scoring.
+
+Run with: python manage.py benchmark_risk_scoring [--sessions 200] [--repeat 5]
+
+Builds --sessions random sessions of 15 answers (as SessionStats rows and
+as response lists, nothing is written) and times:
+
+    stats before   - EndSessionView's scoring as it was: risk_features_from_stats,
+                     a one-row DataFrame, model.predict and model.predict_proba
+    stats after    - ml_utils.get_prediction_from_stats (float32 row, one predict_proba)
+    list before    - get_prediction as it was: six passes over the responses
+                     then the DataFrame path
+    list after     - ml_utils.get_prediction
+
+and checks that both give the same label and confidence for every session.
+"""
+import random
+import time
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+
+from assessment.ml_utils import (
+    RISK_LABELS,
+    get_prediction,
+    get_prediction_from_stats,
+    load_prediction_model,
+    risk_features_from_stats,
+)
+from assessment.models import SessionStats
+from assessment.session_state import apply_response
+
+DOMAINS = ['reading', 'math', 'attention']
+MISTAKES = [None, 'letter_reversal', 'number_reversal', 'substitution', 'spelling_error']
+
+
+def legacy_model_output(model, risk_features):
+    """The risk model call as it was before RiskScorer (kept for comparison)."""
+    features = pd.DataFrame([risk_features])
+    prediction = model.predict(features)[0]
+    probs = model.predict_proba(features)[0]
+    return RISK_LABELS.get(prediction, 'low-risk'), max(probs)
+
+
+def legacy_features(responses):
+    """get_prediction's feature code as it was before the single pass (kept for comparison)."""
+    total = len(responses)
+    reading = [r for r in responses if r.get('domain') in ['reading', 'writing']]
+    math = [r for r in responses if r.get('domain') == 'math']
+    focus = [r for r in responses if r.get('domain') in ['attention', 'focus']]
+    return {
+        "reading_acc": sum(1 for r in reading if r.get('correct')) / len(reading) if reading else 0.5,
+        "math_acc": sum(1 for r in math if r.get('correct')) / len(math) if math else 0.5,
+        "focus_acc": sum(1 for r in focus if r.get('correct')) / len(focus) if focus else 0.5,
+        "avg_time_ms": sum(r.get('response_time_ms', 2000) for r in responses) / total,
+        "rev_rate": sum(1 for r in responses if r.get('mistake_type') == 'letter_reversal') / total,
+        "pv_rate": sum(1 for r in responses if r.get('mistake_type') in ['number_reversal', 'substitution']) / total,
+        "impulse_rate": sum(1 for r in responses
+                            if not r.get('correct') and r.get('response_time_ms', 2000) < 1000) / total,
+    }
+
+
+class Command(BaseCommand):
+    help = "Time EndSessionView's risk scoring before and after the NumPy-only feature path."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=200)
+        parser.add_argument('--repeat', type=int, default=5, help='Timed passes over all sessions')
+
+    def handle(self, *args, **options):
+        model = load_prediction_model()
+        if not hasattr(model, 'predict_proba'):
+            raise CommandError("The risk model has no predict_proba")
+
+        rng = random.Random(0)
+        sessions = [self._session(rng) for _ in range(options['sessions'])]
+
+        timings = {}
+        results = {}
+        for name, score in (
+            ('stats before', lambda stats, responses: legacy_model_output(model, risk_features_from_stats(stats))),
+            ('stats after', lambda stats, responses: get_prediction_from_stats(stats)),
+            ('list before', lambda stats, responses: legacy_model_output(model, legacy_features(responses))),
+            ('list after', lambda stats, responses: get_prediction(responses)),
+        ):
+            score(*sessions[0])  # warm-up
+            start = time.perf_counter()
+            for _ in range(options['repeat']):
+                results[name] = [score(stats, responses) for stats, responses in sessions]
+            timings[name] = (time.perf_counter() - start) / (options['repeat'] * len(sessions)) * 1000
+
+        self.stdout.write(f"{'path':<14}{'ms/session':>12}")
+        for name, elapsed in timings.items():
+            self.stdout.write(f"{name:<14}{elapsed:>12.3f}")
+        for path in ('stats', 'list'):
+            self.stdout.write(f"{path}: {timings[f'{path} before'] / timings[f'{path} after']:.1f}x faster")
+
+        mismatches = 0
+        for path in ('stats', 'list'):
+            for (label, top), after in zip(results[f'{path} before'], results[f'{path} after']):
+                mismatches += label != after['risk'] or self._level(top) != after['confidence_level']
+        if mismatches:
+            raise CommandError(f"❌ {mismatches} sessions scored differently")
+        self.stdout.write(self.style.SUCCESS("✅ Same label and confidence level for every session"))
+
+    @staticmethod
+    def _level(top):
+        return 'high' if top * 100 > 80 else 'moderate' if top * 100 > 60 else 'low'
+
+    @staticmethod
+    def _session(rng):
+        """(SessionStats, response list) of one random 15-answer session."""
+        stats = SessionStats(domain_stats={}, mistake_counts={}, irt_responses={})
+        responses = []
+        skill = {domain: rng.random() for domain in DOMAINS}
+        for _ in range(15):
+            domain = rng.choice(DOMAINS)
+            correct = rng.random() < skill[domain]
+            response_time_ms = int(np.clip(rng.gauss(2500, 1500), 300, 12000))
+            mistake_type = None if correct else rng.choice(MISTAKES)
+            apply_response(stats, domain, 'medium', correct, response_time_ms, mistake_type)
+            responses.append({'domain': domain, 'correct': correct, 'response_time_ms': response_time_ms,
+                              'mistake_type': mistake_type})
+        return stats, responses
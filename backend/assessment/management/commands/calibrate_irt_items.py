@@ -0,0 +1,90 @@
+"""
+Calibrate IRT item parameters from the stored answers.
+
+Run with: python manage.py calibrate_irt_items [--min-responses 30] [--iterations 50] [--dry-run]
+
+Every UserResponse is one answer to an item: the catalog template of a
+generated question (through GeneratedQuestion) or a stored question's
+question_id. Each session's answers in one domain form one person. The 2PL
+parameters are fitted with irt.calibrate, and items with at least
+--min-responses answers replace the contents of ItemParameter. Servers
+pick up the new parameters within ASSESSMENT_IRT['MAX_AGE_S'].
+"""
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from assessment.irt import PRIOR_LOCATION, calibrate, irt_config
+from assessment.models import ItemParameter, UserResponse
+from assessment.question_catalog import get_catalog
+
+
+class Command(BaseCommand):
+    help = "Fit 2PL item parameters from UserResponse history into ItemParameter."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-responses', type=int, default=30,
+                            help='Items with fewer answers keep the prior parameters')
+        parser.add_argument('--iterations', type=int, default=50, help='Maximum EM cycles')
+        parser.add_argument('--dry-run', action='store_true', help="Calibrate and report, but don't write")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        templates = get_catalog().templates
+        item_index, item_domain, item_difficulty = {}, [], []
+        person_index = {}
+        persons, items, correct = [], [], []
+
+        for session_id, domain, difficulty, is_correct, question_id, template_id in (
+            UserResponse.objects.values_list('session_id', 'domain', 'difficulty', 'correct',
+                                             'question_id', 'generated_question__template_id').iterator()
+        ):
+            item_id = question_id or template_id
+            if item_id is None:
+                continue  # generated question without its GeneratedQuestion row
+            if item_id not in item_index:
+                template = templates.get(item_id)
+                item_index[item_id] = len(item_index)
+                item_domain.append(template.domain if template else domain)
+                item_difficulty.append(template.difficulty if template else difficulty)
+            persons.append(person_index.setdefault((session_id, domain), len(person_index)))
+            items.append(item_index[item_id])
+            correct.append(is_correct)
+
+        if not items:
+            raise CommandError("No answers to calibrate from")
+        self.stdout.write(f"Loaded {len(items)} answers to {len(item_index)} items from {len(person_index)} "
+                          f"session domains in {time.perf_counter() - start:.1f}s")
+
+        start = time.perf_counter()
+        items = np.array(items)
+        a, b = calibrate(
+            np.array(persons), items, np.array(correct, dtype=bool),
+            np.array([PRIOR_LOCATION.get(difficulty, 0.0) for difficulty in item_difficulty]),
+            iterations=options['iterations'], grid_points=irt_config()['GRID_POINTS'],
+        )
+        counts = np.bincount(items, minlength=len(item_index))
+        self.stdout.write(f"Calibrated in {time.perf_counter() - start:.1f}s\n")
+
+        rows = []
+        self.stdout.write(f"{'item':<36}{'level':<8}{'answers':>8}{'a':>7}{'b':>7}")
+        for item_id, i in sorted(item_index.items()):
+            if counts[i] < options['min_responses']:
+                continue
+            self.stdout.write(f"{item_id:<36}{item_difficulty[i]:<8}{counts[i]:>8}{a[i]:>7.2f}{b[i]:>7.2f}")
+            rows.append(ItemParameter(item_id=item_id, domain=item_domain[i], difficulty=item_difficulty[i],
+                                      discrimination=float(a[i]), location=float(b[i]), responses=int(counts[i])))
+
+        skipped = len(item_index) - len(rows)
+        if options['dry_run']:
+            self.stdout.write(f"Dry run: {len(rows)} items calibrated, {skipped} below --min-responses")
+            return
+
+        with transaction.atomic():
+            ItemParameter.objects.all().delete()
+            ItemParameter.objects.bulk_create(rows, batch_size=1000)
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Wrote {len(rows)} item parameters ({skipped} items below --min-responses keep the prior)"
+        ))
@@ -0,0 +1,136 @@
+"""
+Compile the question model into a constant-time decision table.
+
+Run with: python manage.py export_decision_table [--max-items 15] [--verify-only] [--min-coverage 1.0]
+
+After building, the table is checked against QuestionGeneratorModel.predict on
+two samples of inputs the serving path can produce:
+
+    serving sample  - random serving inputs (integer response times)
+    threshold grid  - response times on either side of every split threshold,
+                      crossed with every discrete row and reachable accuracy
+
+The command exits non-zero on any mismatch, or when less than --min-coverage
+of either sample is answered from the table (the rest would only exercise the
+forest fallback). assessment/training_data_phase1.csv is also compared, but
+most of its rows lie outside the tabulated grid, so its coverage is reported
+and not gated.
+"""
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from assessment.decision_table import (
+    DecisionTable,
+    SERVING_DISCRETE_ROWS,
+    TIME_FEATURE,
+    boundary_values,
+    model_fingerprint,
+    session_accuracy_values,
+)
+from assessment.ml_utils import load_question_model
+
+FEATURES = [
+    "last_correct",
+    "last_response_time",
+    "diff_easy",
+    "diff_medium",
+    "diff_hard",
+    "session_accuracy",
+    "current_domain",
+]
+
+
+class Command(BaseCommand):
+    help = "Export the question model as a decision table and verify it matches the forest."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=str(settings.ASSESSMENT_QUESTION_TABLE_PATH))
+        parser.add_argument('--max-items', type=int, default=15,
+                            help='Longest session whose session_accuracy values are tabulated')
+        parser.add_argument('--verify-only', action='store_true',
+                            help='Verify an existing table instead of building one')
+        parser.add_argument('--samples', type=int, default=20000,
+                            help='Inputs to check in each of the serving sample and the threshold grid')
+        parser.add_argument('--min-coverage', type=float, default=1.0,
+                            help='Minimum fraction of each serving check answered from the table')
+
+    def handle(self, *args, **options):
+        model = load_question_model()
+        if model is None:
+            raise CommandError("No question model found")
+
+        output = options['output']
+        if options['verify_only']:
+            table = DecisionTable.load(output)
+            if table.fingerprint != model_fingerprint(model):
+                raise CommandError(f"{output} was built from a different question model")
+        else:
+            start = time.perf_counter()
+            table = DecisionTable.build(model, max_items=options['max_items'])
+            table.save(output)
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ Built {table.table.shape} table in {time.perf_counter() - start:.1f}s "
+                f"({os.path.getsize(output) / 1024:.0f} KB) -> {output}"
+            ))
+
+        failures = self._verify(model, table, options['max_items'], options['samples'], options['min_coverage'])
+        if failures:
+            raise CommandError("❌ " + "; ".join(failures))
+        self.stdout.write(self.style.SUCCESS("✅ Decision table matches QuestionGeneratorModel.predict"))
+
+    def _verify(self, model, table, max_items, samples, min_coverage):
+        """
+        Compare the table with the forest.
+
+        Returns:
+            List of failure messages (empty when the table passes)
+        """
+        rng = np.random.default_rng(0)
+        accuracy_values = session_accuracy_values(max_items)
+        discrete = np.array(SERVING_DISCRETE_ROWS)[rng.integers(len(SERVING_DISCRETE_ROWS), size=2 * samples)]
+
+        # Inputs the serving path can produce
+        X_serving = np.empty((samples, len(FEATURES)))
+        X_serving[:, [0, 2, 3, 4, 6]] = discrete[:samples]
+        X_serving[:, 1] = rng.integers(0, 15000, size=samples)
+        X_serving[:, 5] = rng.choice(accuracy_values, size=samples)
+
+        # The same, with response times right at the cell boundaries
+        X_grid = np.empty((samples, len(FEATURES)))
+        X_grid[:, [0, 2, 3, 4, 6]] = discrete[samples:]
+        X_grid[:, 1] = rng.choice(boundary_values(table.edges[TIME_FEATURE]), size=samples)
+        X_grid[:, 5] = rng.choice(accuracy_values, size=samples)
+
+        csv_path = os.path.join(settings.BASE_DIR, 'assessment', 'training_data_phase1.csv')
+        X_csv = pd.read_csv(csv_path)[FEATURES].values
+
+        failures = []
+        for label, X, gated in (('serving sample', X_serving, True), ('threshold grid', X_grid, True),
+                                ('training CSV', X_csv, False)):
+            expected = model.predict(X)
+            prediction, covered = table.lookup(X)
+            mismatches = int((prediction[covered] != expected[covered]).any(axis=1).sum())
+            coverage = covered.mean()
+
+            timed = X[covered][:1000]
+            start = time.perf_counter()
+            for row in timed:
+                table.lookup(row[None, :])
+            per_row_us = (time.perf_counter() - start) / max(1, len(timed)) * 1e6
+
+            self.stdout.write(
+                f"{label}: {len(X)} rows, {int(covered.sum())} answered from the table "
+                f"({coverage * 100:.1f}%{'' if gated else ', not gated'}), "
+                f"{mismatches} mismatches, {per_row_us:.0f} µs per single-row lookup"
+            )
+            if mismatches:
+                failures.append(f"{label}: {mismatches} predictions differ from the forest")
+            if gated and coverage < min_coverage:
+                failures.append(f"{label}: only {coverage * 100:.1f}% answered from the table "
+                                f"(minimum {min_coverage * 100:.1f}%)")
+        return failures
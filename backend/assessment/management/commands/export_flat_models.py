@@ -0,0 +1,115 @@
+"""
+Flatten the question and prediction models' forests for serving without scikit-learn.
+
+Run with: python manage.py export_flat_models [--verify-only]
+
+Each RandomForestClassifier is converted to a FlatForest (assessment/flat_forest.py)
+and written to ASSESSMENT_FLAT_MODEL_DIR as <model>.npz, tagged with the sha1 of
+the pickle it came from. The files are then reloaded and checked against the
+pickled forests' predict_proba and predict on the training CSVs:
+
+    question model   - assessment/training_data_phase1.csv
+    prediction model - ../clinical_data.csv
+
+The command exits non-zero on any difference. Servers use the files (and skip
+unpickling the forests) while ASSESSMENT_FLAT_MODELS is on and the pickle is
+unchanged.
+"""
+import os
+import sys
+import time
+import warnings
+
+import joblib
+import pandas as pd
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from assessment.flat_forest import FlatForest, file_digest, load_forests, save_forests
+from assessment.ml_utils import PREDICTION_MODEL_PATH, RISK_FEATURES, flat_model_path, resolve_question_model_path
+
+QUESTION_FEATURES = [
+    "last_correct",
+    "last_response_time",
+    "diff_easy",
+    "diff_medium",
+    "diff_hard",
+    "session_accuracy",
+    "current_domain",
+]
+
+
+class Command(BaseCommand):
+    help = "Export the ML models' random forests as NumPy-only .npz files and verify them against scikit-learn."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify-only', action='store_true',
+                            help='Verify the existing files instead of exporting')
+        parser.add_argument('--question-data',
+                            default=os.path.join(settings.BASE_DIR, 'assessment', 'training_data_phase1.csv'))
+        parser.add_argument('--risk-data', default=os.path.join(settings.BASE_DIR.parent, 'clinical_data.csv'))
+
+    def handle(self, *args, **options):
+        # The question model was pickled from inside assessment/, see ml_utils
+        assessment_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        if assessment_dir not in sys.path:
+            sys.path.append(assessment_dir)
+        os.makedirs(settings.ASSESSMENT_FLAT_MODEL_DIR, exist_ok=True)
+
+        # Pickles saved with another scikit-learn version warn on load; the check below compares outputs
+        warnings.filterwarnings('ignore', module='sklearn')
+
+        models = []
+        question_path = resolve_question_model_path()
+        if question_path:
+            model = joblib.load(question_path)
+            models.append((question_path, {'domain': model.domain_classifier,
+                                           'difficulty': model.difficulty_classifier},
+                           pd.read_csv(options['question_data'])[QUESTION_FEATURES].values))
+        if os.path.exists(PREDICTION_MODEL_PATH):
+            model = joblib.load(PREDICTION_MODEL_PATH)
+            columns = list(getattr(model, 'feature_names_in_', RISK_FEATURES))
+            models.append((PREDICTION_MODEL_PATH, {'risk': model}, pd.read_csv(options['risk_data'])[columns].values))
+        if not models:
+            raise CommandError("No question or prediction model found")
+
+        mismatches = 0
+        for source_path, forests, X in models:
+            output = flat_model_path(source_path)
+            if not options['verify_only']:
+                start = time.perf_counter()
+                save_forests(output, {name: FlatForest.from_sklearn(forest) for name, forest in forests.items()},
+                             file_digest(source_path))
+                self.stdout.write(self.style.SUCCESS(
+                    f"✅ {source_path} ({os.path.getsize(source_path) / 1024:.0f} KB) -> {output} "
+                    f"({os.path.getsize(output) / 1024:.0f} KB) in {time.perf_counter() - start:.1f}s"
+                ))
+
+            flat_forests, digest = load_forests(output)
+            if digest != file_digest(source_path):
+                raise CommandError(f"{output} was exported from a different {os.path.basename(source_path)}")
+            for name, forest in forests.items():
+                mismatches += self._verify(name, forest, flat_forests[name], X)
+
+        if mismatches:
+            raise CommandError(f"❌ {mismatches} rows differ from scikit-learn")
+        self.stdout.write(self.style.SUCCESS("✅ Flattened forests match scikit-learn on the training data"))
+
+    def _verify(self, name, forest, flat, X):
+        """Rows where the flattened forest's predict_proba or predict differs, with single-row timings."""
+        differs = (flat.predict_proba(X) != forest.predict_proba(X)).any(axis=1)
+        mismatches = int((differs | (flat.predict(X) != forest.predict(X))).sum())
+
+        timings = {}
+        for label, predict in (('scikit-learn', forest.predict_proba), ('flattened', flat.predict_proba)):
+            rows = X[:200]
+            start = time.perf_counter()
+            for row in rows:
+                predict(row[None, :])
+            timings[label] = (time.perf_counter() - start) / len(rows) * 1000
+
+        self.stdout.write(
+            f"{name}: {flat.n_trees} trees, {len(flat.feature)} nodes, {len(X)} rows, {mismatches} mismatches; "
+            f"single row {timings['scikit-learn']:.2f} ms -> {timings['flattened']:.2f} ms"
+        )
+        return mismatches
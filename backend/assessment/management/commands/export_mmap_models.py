@@ -0,0 +1,46 @@
+"""
+Re-dump the ML models in joblib's mmap-friendly layout.
+
+Run with: python manage.py export_mmap_models
+
+The copies are written uncompressed to ASSESSMENT_MMAP_MODEL_DIR so that
+joblib.load(..., mmap_mode='r') can map their numpy arrays straight from the
+page cache. Enable them with ASSESSMENT_MODEL_MMAP_MODE='r'.
+"""
+import os
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+import joblib
+
+from assessment.ml_utils import PREDICTION_MODEL_PATH, resolve_question_model_path
+
+
+class Command(BaseCommand):
+    help = "Write uncompressed, memory-mappable copies of the question and prediction models."
+
+    def handle(self, *args, **options):
+        # The question model was pickled from inside assessment/, see ml_utils
+        assessment_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        if assessment_dir not in sys.path:
+            sys.path.append(assessment_dir)
+
+        out_dir = settings.ASSESSMENT_MMAP_MODEL_DIR
+        os.makedirs(out_dir, exist_ok=True)
+
+        sources = [resolve_question_model_path(), PREDICTION_MODEL_PATH]
+        for path in sources:
+            if not path or not os.path.exists(path):
+                continue
+
+            model = joblib.load(path)
+            out_path = os.path.join(out_dir, os.path.basename(path))
+            # compress=0 keeps every numpy array as a raw, aligned buffer that can be mmapped
+            joblib.dump(model, out_path, compress=0)
+            self.stdout.write(self.style.SUCCESS(f"✅ {path} -> {out_path}"))
+
+        self.stdout.write(
+            "Set ASSESSMENT_MODEL_MMAP_MODE='r' and run gunicorn with preload_app to share these pages."
+        )
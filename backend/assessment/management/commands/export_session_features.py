@@ -0,0 +1,57 @@
+"""
+Export the stored session feature vectors as a training set.
+
+Run with: python manage.py export_session_features [--output session_features.csv]
+
+Writes one CSV row per SessionFeatureVector of the current
+FEATURE_SCHEMA_VERSION: session_id, user_id, age_group, total, the 7
+RISK_FEATURES and final_label, the label of the session's latest
+FinalPrediction. Rows are read straight from session_feature_vectors with a
+single streamed query, so no UserResponse is scanned. Sessions completed
+before the table existed have no vector; `manage.py rescore_sessions` fills
+them in.
+"""
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import OuterRef, Subquery
+
+from assessment.ml_utils import RISK_FEATURES
+from assessment.models import FinalPrediction, SessionFeatureVector
+from assessment.session_features import FEATURE_SCHEMA_VERSION
+
+COLUMNS = ('session_id', 'user_id', 'age_group', 'total') + RISK_FEATURES + ('final_label',)
+
+
+class Command(BaseCommand):
+    help = "Write the stored per-session risk features and labels to a CSV file for model training."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='session_features.csv')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        latest_label = FinalPrediction.objects.filter(
+            session_id=OuterRef('session_id')
+        ).order_by('-prediction_id').values('final_label')[:1]
+        vectors = SessionFeatureVector.objects.filter(schema_version=FEATURE_SCHEMA_VERSION)
+        if not vectors.exists():
+            raise CommandError(f"No feature vectors of schema version {FEATURE_SCHEMA_VERSION} "
+                               "(run `manage.py rescore_sessions` to build them)")
+        rows = vectors.order_by('session_id').annotate(final_label=Subquery(latest_label)).values_list(
+            'session_id', 'user_id', 'user__age_group', 'total', *RISK_FEATURES, 'final_label'
+        )
+
+        count = 0
+        with open(options['output'], 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            for row in rows.iterator(chunk_size=5000):
+                writer.writerow(row)
+                count += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Exported {count} sessions (feature schema v{FEATURE_SCHEMA_VERSION}) in "
+            f"{time.perf_counter() - start:.1f}s -> {options['output']}"
+        ))
@@ -0,0 +1,88 @@
+"""
+Generate a bank of questions and write it into the Question table.
+
+Run with: python manage.py generate_question_bank [--count 1000] [--seed 0] [--domain math] [--difficulty easy]
+                                                  [--age-group 9-11]
+
+Uses QuestionGeneratorModel.generate_questions, so a bank is reproducible
+from its seed. Question ids are GEN_<domain><difficulty>_<seed>_<n>, e.g.
+GEN_ME_0_000042. Rows that already exist are left untouched.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from assessment.ml_utils import load_question_model
+from assessment.models import Question
+
+DOMAINS = ['reading', 'math', 'attention']
+DIFFICULTIES = ['easy', 'medium', 'hard']
+QUESTION_ID_LENGTH = Question._meta.get_field('question_id').max_length
+
+
+class Command(BaseCommand):
+    help = "Bulk-generate questions per domain and difficulty into the Question table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=1000, help='Questions per domain and difficulty')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--domain', choices=DOMAINS, help='Only this domain (default: all)')
+        parser.add_argument('--difficulty', choices=DIFFICULTIES, help='Only this difficulty (default: all)')
+        parser.add_argument('--age-group', default='', help='Tag the questions with this age group (default: every age)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per INSERT')
+        parser.add_argument('--dry-run', action='store_true', help="Generate and report, but don't write")
+
+    def handle(self, *args, **options):
+        generator = load_question_model()
+        if generator is None:
+            raise CommandError("No question model found")
+
+        count, seed = options['count'], options['seed']
+        if len(f"GEN_XX_{seed}_{count - 1:06d}") > QUESTION_ID_LENGTH:
+            raise CommandError(f"Question ids would exceed {QUESTION_ID_LENGTH} characters; use a smaller --seed")
+
+        domains = [options['domain']] if options['domain'] else DOMAINS
+        difficulties = [options['difficulty']] if options['difficulty'] else DIFFICULTIES
+
+        total_created = 0
+        for domain in domains:
+            for difficulty in difficulties:
+                start = time.perf_counter()
+                # Each cell gets its own stream so cells don't depend on which others are generated
+                bank = generator.generate_questions(
+                    domain, difficulty, count,
+                    seed=[seed, DOMAINS.index(domain), DIFFICULTIES.index(difficulty)]
+                )
+                generated_in = time.perf_counter() - start
+
+                prefix = f"GEN_{domain[0].upper()}{difficulty[0].upper()}_{seed}_"
+                questions = [
+                    Question(
+                        question_id=f"{prefix}{i:06d}",
+                        domain=domain,
+                        difficulty=difficulty,
+                        age_group=options['age_group'],
+                        question_text=text,
+                        options=list(row),
+                        correct_option=answer,
+                    )
+                    for i, (text, row, answer) in enumerate(zip(
+                        bank['question_text'], bank['options'], bank['correct_option']
+                    ))
+                ]
+
+                if options['dry_run']:
+                    created = 0
+                else:
+                    before = Question.objects.filter(question_id__startswith=prefix).count()
+                    Question.objects.bulk_create(questions, batch_size=options['batch_size'], ignore_conflicts=True)
+                    created = Question.objects.filter(question_id__startswith=prefix).count() - before
+                total_created += created
+
+                self.stdout.write(
+                    f"{domain}/{difficulty}: {count} generated in {generated_in * 1000:.1f} ms, "
+                    f"{created} new rows ({time.perf_counter() - start:.2f}s total) "
+                    f"- e.g. {questions[0].question_text!r}"
+                )
+
+        self.stdout.write(self.style.SUCCESS(f"✅ {total_created} questions written"))
@@ -0,0 +1,129 @@
+"""
+Worker cold-start profile.
+
+Run with: python manage.py profile_startup [--runs 5] [--budget-ms 1500] [--no-preload] [--top 15]
+
+Starts --runs fresh interpreters that each do what a new web worker does:
+import the WSGI application (django.setup() and the model warm-up, see
+assessment.apps.warm_up_models) and the URLconf (the views). Each run
+reports:
+
+    cold start   - from spawning the interpreter until the app is ready
+    app          - the same, without interpreter startup
+
+One extra run with `python -X importtime` breaks the import cost down per
+top-level package and lists the slowest modules. It also shows which of the
+ML stack's packages (numpy, pandas, joblib, scikit-learn, scipy) were
+imported. --no-preload profiles workers started with
+ASSESSMENT_PRELOAD_MODELS=0, which import ml_utils lazily (assessment/ml.py).
+
+The command fails when the median cold start is over --budget-ms
+(settings.ASSESSMENT_STARTUP_BUDGET_MS by default).
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+ML_PACKAGES = ('numpy', 'pandas', 'joblib', 'sklearn', 'scipy')
+
+RESULT_PREFIX = 'PROFILE_STARTUP '
+
+# Run in the child interpreter; prints RESULT_PREFIX + JSON as its last line
+WORKER_SCRIPT = f"""
+import json, sys, time
+start = time.perf_counter()
+from importlib import import_module
+from django.conf import settings
+import_module(settings.WSGI_APPLICATION.rsplit('.', 1)[0])
+import_module(settings.ROOT_URLCONF)
+print({RESULT_PREFIX!r} + json.dumps({{
+    'app_ms': (time.perf_counter() - start) * 1000,
+    'ready_at': time.time(),
+    'preload': settings.ASSESSMENT_PRELOAD_MODELS,
+    'ml_packages': [name for name in {ML_PACKAGES!r} if name in sys.modules],
+}}))
+"""
+
+
+class Command(BaseCommand):
+    help = "Measure worker cold-start time and per-module import cost, and check it against a budget."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--budget-ms', type=float, default=None,
+                            help='Maximum median cold start (default: settings.ASSESSMENT_STARTUP_BUDGET_MS)')
+        parser.add_argument('--no-preload', action='store_true',
+                            help='Profile workers started with ASSESSMENT_PRELOAD_MODELS=0')
+        parser.add_argument('--top', type=int, default=15, help='Number of slowest modules to list')
+
+    def handle(self, *args, **options):
+        budget = options['budget_ms'] if options['budget_ms'] is not None else settings.ASSESSMENT_STARTUP_BUDGET_MS
+        env = dict(os.environ)
+        if options['no_preload']:
+            env['ASSESSMENT_PRELOAD_MODELS'] = '0'
+
+        cold, app = [], []
+        for _ in range(options['runs']):
+            result, _ = self._start_worker(env)
+            cold.append(result['cold_start_ms'])
+            app.append(result['app_ms'])
+        result, import_times = self._start_worker(env, importtime=True)
+
+        self.stdout.write(f"Preload models: {'yes' if result['preload'] else 'no'}, {options['runs']} runs")
+        for label, values in (('cold start', cold), ('app', app)):
+            self.stdout.write(f"  {label:<11} median {statistics.median(values):7.1f} ms   "
+                              f"min {min(values):7.1f} ms   max {max(values):7.1f} ms")
+        self.stdout.write(f"  ML packages imported: {', '.join(result['ml_packages']) or 'none'}")
+
+        packages = defaultdict(lambda: [0, 0])
+        for module, self_us, _ in import_times:
+            package = packages[module.split('.')[0]]
+            package[0] += self_us
+            package[1] += 1
+        self.stdout.write("\nImport time by package (-X importtime, self time):")
+        for name, (self_us, count) in sorted(packages.items(), key=lambda item: -item[1][0])[:options['top']]:
+            self.stdout.write(f"  {name:<28} {self_us / 1000:8.1f} ms  ({count} modules)")
+
+        self.stdout.write("\nSlowest modules (self / cumulative):")
+        for module, self_us, cumulative_us in sorted(import_times, key=lambda row: -row[1])[:options['top']]:
+            self.stdout.write(f"  {module:<48} {self_us / 1000:8.1f} ms {cumulative_us / 1000:8.1f} ms")
+
+        median = statistics.median(cold)
+        if median > budget:
+            raise CommandError(f"❌ Median cold start {median:.0f} ms is over the {budget:.0f} ms budget")
+        self.stdout.write(self.style.SUCCESS(f"\n✅ Median cold start {median:.0f} ms (budget {budget:.0f} ms)"))
+
+    def _start_worker(self, env, importtime=False):
+        """
+        Run WORKER_SCRIPT in a fresh interpreter.
+
+        Returns:
+            (result, import_times) - the script's result plus cold_start_ms,
+            and (module, self_us, cumulative_us) per import when importtime is set
+        """
+        command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', WORKER_SCRIPT]
+        spawned_at = time.time()
+        process = subprocess.run(command, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+                                 encoding='utf-8')
+        results = [line for line in process.stdout.splitlines() if line.startswith(RESULT_PREFIX)]
+        if process.returncode or not results:
+            raise CommandError(f"Worker startup failed:\n{process.stderr[-2000:]}")
+
+        result = json.loads(results[-1][len(RESULT_PREFIX):])
+        result['cold_start_ms'] = (result['ready_at'] - spawned_at) * 1000
+
+        import_times = []
+        for line in process.stderr.splitlines():
+            # "import time: <self us> | <cumulative us> | <indented module name>"
+            if not line.startswith('import time:') or 'imported package' in line:
+                continue
+            self_us, cumulative_us, module = line[len('import time:'):].split('|')
+            import_times.append((module.strip(), int(self_us), int(cumulative_us)))
+        return result, import_times
@@ -0,0 +1,79 @@
+"""
+Re-score every completed session with the current risk model.
+
+Run with: python manage.py rescore_sessions [--chunk-size 2000] [--workers 4] [--dry-run]
+
+Run this after replacing prediction_model.pkl. Completed sessions are
+split into chunks of --chunk-size session ids. Each chunk is scored by
+assessment.rescoring.rescore_range with one predict_proba call, and written
+to FinalPrediction in bulk (one executemany UPDATE, bulk_create). The latest
+prediction of a session is updated in place; sessions without one get one.
+Features are read from SessionFeatureVector; sessions without a vector of the
+current FEATURE_SCHEMA_VERSION are rebuilt from their answers and get one.
+
+With --workers > 1 the chunks run in a pool of spawned processes. Each
+worker sets up Django and opens its own database connection. At most two
+chunks per worker are queued, so memory stays bounded however many sessions
+there are. SQLite serializes the writes, so use --workers 1 there.
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from assessment.ml_utils import load_risk_scorer
+from assessment.rescoring import rescore_range, session_ranges
+
+
+class Command(BaseCommand):
+    help = "Re-score all completed sessions into FinalPrediction after a risk model update."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Sessions per chunk')
+        parser.add_argument('--workers', type=int, help='Worker processes (default: CPU count, 1 on SQLite)')
+        parser.add_argument('--dry-run', action='store_true', help="Score and report, but don't write")
+
+    def handle(self, *args, **options):
+        if not load_risk_scorer().has_proba:
+            raise CommandError("The risk model has no predict_proba")
+
+        workers = options['workers']
+        if workers is None:
+            workers = 1 if connection.vendor == 'sqlite' else os.cpu_count() or 1
+        chunks = session_ranges(options['chunk_size'])
+        totals = {'sessions': 0, 'updated': 0, 'created': 0, 'changed': 0, 'features_computed': 0}
+
+        start = time.perf_counter()
+        if workers == 1:
+            for first, last in chunks:
+                self._add(totals, rescore_range(first, last, options['dry_run']), start)
+        else:
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=django.setup) as pool:
+                pending = set()
+                for first, last in chunks:
+                    pending.add(pool.submit(rescore_range, first, last, options['dry_run']))
+                    if len(pending) >= 2 * workers:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            self._add(totals, future.result(), start)
+                for future in pending:
+                    self._add(totals, future.result(), start)
+
+        elapsed = time.perf_counter() - start
+        action = "Scored (dry run)" if options['dry_run'] else "Re-scored"
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {action} {totals['sessions']} sessions in {elapsed:.1f}s with {workers} worker(s) "
+            f"({totals['sessions'] / max(elapsed, 1e-9):.0f} sessions/s): {totals['updated']} updated, "
+            f"{totals['created']} created, {totals['changed']} changed label, "
+            f"{totals['features_computed']} feature vectors rebuilt from answers"
+        ))
+
+    def _add(self, totals, counts, start):
+        for key, value in counts.items():
+            totals[key] += value
+        self.stdout.write(f"  {totals['sessions']} sessions ({time.perf_counter() - start:.1f}s)")
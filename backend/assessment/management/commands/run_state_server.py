@@ -0,0 +1,31 @@
+"""
+Run the local stand-in for the networked session-state store.
+
+Run with: python manage.py run_state_server [--port 6379]
+
+Point API nodes at it with
+    ASSESSMENT_STATE_STORE = {'BACKEND': 'redis', 'OPTIONS': {'host': '127.0.0.1', 'port': 6379}}
+"""
+from django.core.management.base import BaseCommand
+
+from assessment.state_server import StateServer
+
+
+class Command(BaseCommand):
+    help = "Serve the Redis-protocol stand-in used for local multi-node testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=6379)
+
+    def handle(self, *args, **options):
+        server = StateServer((options['host'], options['port']))
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Session state server listening on {options['host']}:{options['port']}"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-17 07:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assessment', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessionStats',
+            fields=[
+                ('session', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='assessment.session')),
+                ('total', models.IntegerField(default=0)),
+                ('correct', models.IntegerField(default=0)),
+                ('impulse_count', models.IntegerField(default=0)),
+                ('response_time_sum', models.BigIntegerField(default=0)),
+                ('response_time_sq_sum', models.BigIntegerField(default=0)),
+                ('domain_stats', models.JSONField(default=dict)),
+                ('mistake_counts', models.JSONField(default=dict)),
+                ('last_domain', models.CharField(blank=True, max_length=20, null=True)),
+                ('last_difficulty', models.CharField(blank=True, max_length=20, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'session_stats',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 07:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assessment', '0002_sessionstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sessionstats',
+            name='last_question_id',
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-17 07:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assessment', '0003_sessionstats_last_question'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeneratedQuestion',
+            fields=[
+                ('seed', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('template_id', models.CharField(max_length=64)),
+                ('catalog_version', models.PositiveSmallIntegerField()),
+            ],
+            options={
+                'db_table': 'generated_questions',
+            },
+        ),
+        migrations.AlterField(
+            model_name='userresponse',
+            name='question',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='responses', to='assessment.question'),
+        ),
+        migrations.AddField(
+            model_name='userresponse',
+            name='generated_question',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='responses', to='assessment.generatedquestion'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-17 08:14
+
+import random
+
+import assessment.models
+from django.db import migrations, models
+
+
+def assign_random_keys(apps, schema_editor):
+    # AddField evaluates the default once, so existing rows would all share one key
+    Question = apps.get_model('assessment', 'Question')
+    questions = list(Question.objects.only('question_id'))
+    for question in questions:
+        question.random_key = random.random()
+    Question.objects.bulk_update(questions, ['random_key'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assessment', '0004_generated_questions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='age_group',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='random_key',
+            field=models.FloatField(default=assessment.models.new_random_key),
+        ),
+        migrations.RunPython(assign_random_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['age_group', 'domain', 'difficulty', 'random_key'], name='questions_age_cell_key'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-17 08:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assessment', '0005_question_age_group_random_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemParameter',
+            fields=[
+                ('item_id', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('domain', models.CharField(max_length=20)),
+                ('difficulty', models.CharField(max_length=20)),
+                ('discrimination', models.FloatField()),
+                ('location', models.FloatField()),
+                ('responses', models.IntegerField()),
+                ('calibrated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'irt_item_parameters',
+            },
+        ),
+        migrations.AddField(
+            model_name='sessionstats',
+            name='irt_responses',
+            field=models.JSONField(default=dict),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-17 08:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assessment', '0006_irt_item_parameters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sessionstats',
+            name='stop_label',
+            field=models.CharField(blank=True, max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='sessionstats',
+            name='stop_streak',
+            field=models.IntegerField(default=0),
+        ),
+    ]
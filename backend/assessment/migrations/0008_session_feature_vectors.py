@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-17 08:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assessment', '0007_sessionstats_stop_streak'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessionFeatureVector',
+            fields=[
+                ('session', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='feature_vector', serialize=False, to='assessment.session')),
+                ('schema_version', models.PositiveSmallIntegerField()),
+                ('total', models.IntegerField()),
+                ('reading_acc', models.FloatField()),
+                ('math_acc', models.FloatField()),
+                ('focus_acc', models.FloatField()),
+                ('avg_time_ms', models.FloatField()),
+                ('rev_rate', models.FloatField()),
+                ('pv_rate', models.FloatField()),
+                ('impulse_rate', models.FloatField()),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feature_vectors', to='assessment.user')),
+            ],
+            options={
+                'db_table': 'session_feature_vectors',
+            },
+        ),
+    ]
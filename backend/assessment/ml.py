@@ -0,0 +1,40 @@
+"""
+Lazy entry points into ml_utils for the request-serving modules.
+
+views, services and stopping import the model functions from here instead
+of from ml_utils. Each name below is a thin function that imports ml_utils
+on its first call. ml_utils brings in the model registry and the inference
+batcher (and joblib and scikit-learn once a pickle is loaded). Until then,
+a worker that only serves start-session, the admin or a management command
+pays none of that import cost.
+
+When ASSESSMENT_PRELOAD_MODELS is on, server processes import ml_utils at
+startup anyway, to warm up the models (assessment.apps.warm_up_models).
+`manage.py profile_startup` reports the cost either way.
+"""
+from importlib import import_module
+from typing import Any, Callable
+
+_ml_utils = None
+
+
+def _lazy(name: str) -> Callable[..., Any]:
+    def call(*args, **kwargs):
+        global _ml_utils
+        if _ml_utils is None:
+            _ml_utils = import_module('.ml_utils', __package__)
+        return getattr(_ml_utils, name)(*args, **kwargs)
+
+    call.__name__ = call.__qualname__ = name
+    call.__doc__ = f"ml_utils.{name}, imported on first call."
+    return call
+
+
+generate_question = _lazy('generate_question')
+get_prediction = _lazy('get_prediction')
+load_question_model = _lazy('load_question_model')
+predict_next_question = _lazy('predict_next_question')
+predict_risk = _lazy('predict_risk')
+risk_features_from_stats = _lazy('risk_features_from_stats')
+risk_features_from_vector = _lazy('risk_features_from_vector')
+risk_top_class = _lazy('risk_top_class')
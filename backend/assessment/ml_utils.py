@@ -2,77 +2,304 @@
 ML model integration utilities.
 Handles model loading, feature extraction, and prediction.
 """
+import copy
+import importlib.util
+import logging
 import os
+import threading
+import time
+from contextlib import contextmanager
 import numpy as np
-import pandas as pd
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Tuple
 from django.conf import settings
 
-# Try to import joblib, fall back to placeholder if not available
-try:
-    import joblib
-    HAS_JOBLIB = True
-except ImportError:
-    HAS_JOBLIB = False
+from .flat_forest import file_digest, load_forests
+from .inference_batcher import get_batcher
+from .model_registry import registry
+from .question_pool import get_question_pool
+from .session_features import DEFAULT_MODEL_FEATURES, MODEL_FEATURES, SessionFeatures
+
+logger = logging.getLogger(__name__)
+
+# joblib (and scikit-learn with it) is only imported when a pickle is actually loaded;
+# fall back to the placeholder model if it isn't installed
+HAS_JOBLIB = importlib.util.find_spec('joblib') is not None
 
 # Paths to the ML models
 QUESTION_MODEL_PATH = os.path.join(settings.BASE_DIR, 'question_generator.pkl')
 PREDICTION_MODEL_PATH = os.path.join(settings.BASE_DIR, 'prediction_model.pkl')
 
-# Global model instances
-_question_model = None
-_prediction_model = None
 
+def _question_model_paths() -> List[str]:
+    """Candidate locations for the question generation model, in priority order."""
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return [
+        os.path.join(current_dir, 'question_model.pkl'),       # Trained script output
+        QUESTION_MODEL_PATH,                                    # Old location
+        os.path.join(settings.BASE_DIR, 'question_model.pkl'),
+    ]
 
-def load_question_model():
-    """Load the question generation ML model from disk."""
-    global _question_model
-    if _question_model is None:
-        import sys
-        
-        # Ensure the current directory is in sys.path so the unpickler can find 'question_generator_model'
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        if current_dir not in sys.path:
-            sys.path.append(current_dir)
-            
-        # Check multiple locations
-        paths_to_check = [
-            os.path.join(current_dir, 'question_model.pkl'),       # Trained script output
-            os.path.join(settings.BASE_DIR, 'question_generator.pkl'), # Old location
-        ]
-        
-        model_path = None
-        for path in paths_to_check:
-            if os.path.exists(path):
-                model_path = path
-                break
-        
-        if model_path:
-            try:
-                _question_model = joblib.load(model_path)
-                print(f"✅ Loaded question generation model from {model_path}")
-            except Exception as e:
-                 print(f"❌ Failed to load question model from {model_path}: {e}")
-        else:
-             print("⚠️  No question generation model found.")
 
-    return _question_model
+def resolve_question_model_path():
+    """Return the first existing question model path, or None."""
+    for path in _question_model_paths():
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def flat_model_path(source_path: str) -> str:
+    """Where `manage.py export_flat_models` writes the flattened forests of a pickled model."""
+    name = os.path.splitext(os.path.basename(source_path))[0]
+    return os.path.join(settings.ASSESSMENT_FLAT_MODEL_DIR, f'{name}.npz')
+
+
+def _load_flat_forests(source_path: str):
+    """
+    The FlatForests exported from source_path, by name, or None.
+
+    Only used while ASSESSMENT_FLAT_MODELS is on and the export was made from
+    the pickle as it is now; otherwise the pickle is loaded as usual.
+    """
+    path = flat_model_path(source_path)
+    if not getattr(settings, 'ASSESSMENT_FLAT_MODELS', False) or not os.path.exists(path):
+        return None
+
+    try:
+        forests, source_digest = load_forests(path)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning("Could not read %s, ignoring it: %s", path, e)
+        return None
+    if source_digest != file_digest(source_path):
+        logger.warning("%s was exported from a different %s, ignoring it (re-run `manage.py export_flat_models`)",
+                       path, os.path.basename(source_path))
+        return None
+    return forests
+
+
+def _load_artifact(path: str):
+    """
+    joblib.load() a model artifact.
+
+    When ASSESSMENT_MODEL_MMAP_MODE is set and an mmap-friendly copy exists in
+    ASSESSMENT_MMAP_MODEL_DIR (see `manage.py export_mmap_models`), the copy is loaded
+    with its numpy arrays memory-mapped so forked workers share the same physical pages.
+    """
+    import joblib
+
+    mmap_mode = getattr(settings, 'ASSESSMENT_MODEL_MMAP_MODE', None)
+    if mmap_mode:
+        mmap_path = os.path.join(settings.ASSESSMENT_MMAP_MODEL_DIR, os.path.basename(path))
+        if os.path.exists(mmap_path):
+            return joblib.load(mmap_path, mmap_mode=mmap_mode), mmap_path
+        logger.warning("No mmap copy of %s, loading into private memory", os.path.basename(path))
+    return joblib.load(path), path
+
+
+def _load_question_model_from_disk():
+    """Unpickle the question generation model, or return None if unavailable."""
+    import sys
+
+    # Ensure the current directory is in sys.path so the unpickler can find 'question_generator_model'
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    if current_dir not in sys.path:
+        sys.path.append(current_dir)
+
+    model_path = resolve_question_model_path()
+    if not model_path:
+        logger.warning("No question generation model found.")
+        return None
+
+    forests = _load_flat_forests(model_path)
+    if forests is not None:
+        from .question_generator_model import QuestionGeneratorModel
+
+        model = QuestionGeneratorModel()
+        model.domain_classifier = forests['domain']
+        model.difficulty_classifier = forests['difficulty']
+        logger.info("Loaded question generation model from %s (flattened forests)", flat_model_path(model_path))
+        return model
+
+    try:
+        model, loaded_from = _load_artifact(model_path)
+        logger.info("Loaded question generation model from %s", loaded_from)
+        return model
+    except Exception:
+        logger.exception("Failed to load question model from %s", model_path)
+        return None
+
+
+def _load_prediction_model_from_disk():
+    """Unpickle the final prediction model, falling back to the rule-based placeholder."""
+    if os.path.exists(PREDICTION_MODEL_PATH):
+        forests = _load_flat_forests(PREDICTION_MODEL_PATH)
+        if forests is not None:
+            logger.info("Loaded prediction model from %s (flattened forest)", flat_model_path(PREDICTION_MODEL_PATH))
+            return forests['risk']
+
+    if HAS_JOBLIB and os.path.exists(PREDICTION_MODEL_PATH):
+        model, loaded_from = _load_artifact(PREDICTION_MODEL_PATH)
+        logger.info("Loaded prediction model from %s", loaded_from)
+        return model
+
+    # Use placeholder model if joblib not available or file doesn't exist
+    logger.warning("Using rule-based prediction (prediction_model.pkl not found)")
+    return PlaceholderPredictionModel()
+
+
+def _load_question_table_from_disk():
+    """Load the compiled decision table for the question model, if it matches that model."""
+    from .decision_table import DecisionTable, model_fingerprint
+
+    table_path = getattr(settings, 'ASSESSMENT_QUESTION_TABLE_PATH', None)
+    model = registry.get('question')
+    if model is None or not table_path or not os.path.exists(table_path):
+        return None
+
+    table = DecisionTable.load(table_path)
+    if table.fingerprint != model_fingerprint(model):
+        logger.warning("%s was built from a different question model, ignoring it "
+                       "(re-run `manage.py export_decision_table`)", table_path)
+        return None
+
+    logger.info("Loaded question decision table from %s", table_path)
+    return table
+
+
+# Risk model features, in the order RiskScorer rows use unless the model was fitted with another
+RISK_FEATURES = ('reading_acc', 'math_acc', 'focus_acc', 'avg_time_ms', 'rev_rate', 'pv_rate', 'impulse_rate')
+
+
+class RiskScorer:
+    """
+    The risk model fed with float32 NumPy rows instead of one-row DataFrames.
+
+    Rows follow the model's feature_names_in_ (or RISK_FEATURES). The
+    forest is called through a shallow copy without feature_names_in_, so
+    scikit-learn accepts plain arrays without a warning while the trees stay
+    shared with the loaded model. The trees evaluate float32, so rows need no
+    conversion.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        names = getattr(model, 'feature_names_in_', None)
+        self.columns = tuple(names) if names is not None else RISK_FEATURES
+        self.classes = getattr(model, 'classes_', None)
+        self.has_proba = hasattr(model, 'predict_proba') and self.classes is not None
+        self.estimator = model
+        if names is not None:
+            self.estimator = copy.copy(model)
+            del self.estimator.feature_names_in_
+
+    def row(self, risk_features: Dict[str, float]) -> np.ndarray:
+        """1 x n_features float32 row."""
+        return np.array([[risk_features[name] for name in self.columns]], dtype=np.float32)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        return self.estimator.predict_proba(X)
+
+
+def _load_risk_scorer():
+    return RiskScorer(registry.get('prediction'))
+
+
+registry.register('question', _load_question_model_from_disk)
+registry.register('prediction', _load_prediction_model_from_disk)
+registry.register('question_table', _load_question_table_from_disk)
+registry.register('risk_scorer', _load_risk_scorer)
+
+
+def load_question_model():
+    """Return the shared question generation model (loaded once per process)."""
+    return registry.get('question')
 
 
 def load_prediction_model():
-    """Load the final prediction ML model from disk."""
-    global _prediction_model
-    if _prediction_model is None:
-        if HAS_JOBLIB and os.path.exists(PREDICTION_MODEL_PATH):
-            _prediction_model = joblib.load(PREDICTION_MODEL_PATH)
-            print(f"✅ Loaded prediction model from {PREDICTION_MODEL_PATH}")
-        else:
-            # Use placeholder model if joblib not available or file doesn't exist
-            _prediction_model = PlaceholderPredictionModel()
-            print("⚠️  Using rule-based prediction (prediction_model.pkl not found)")
-    return _prediction_model
+    """Return the shared final prediction model (loaded once per process)."""
+    return registry.get('prediction')
+
+
+def load_risk_scorer() -> RiskScorer:
+    """Return the shared RiskScorer around the final prediction model."""
+    return registry.get('risk_scorer')
+
+
+def generate_question(model, domain: str, difficulty: str) -> Dict[str, Any]:
+    """
+    Generate a question for (domain, difficulty).
+
+    Questions for the shared model come from the pregenerated pool
+    (see question_pool.py), which generates synchronously when it runs dry.
+    """
+    if model is registry.get('question'):
+        pool = get_question_pool(_generate_with_shared_model)
+        if pool is not None:
+            return pool.take(domain, difficulty)
+    return model.generate_question(domain, difficulty)
+
+
+def _generate_with_shared_model(domain: str, difficulty: str) -> Dict[str, Any]:
+    return load_question_model().generate_question(domain, difficulty)
+
+
+_inference = threading.local()
+
+
+@contextmanager
+def track_inference_time():
+    """
+    Accumulate time spent in model calls on this thread inside the block.
+
+    Yields a dict {'seconds': float, 'calls': int} (used by `manage.py benchmark_api`).
+    """
+    tracker = {'seconds': 0.0, 'calls': 0}
+    _inference.tracker = tracker
+    try:
+        yield tracker
+    finally:
+        _inference.tracker = None
+
+
+@contextmanager
+def _timed_inference():
+    tracker = getattr(_inference, 'tracker', None)
+    if tracker is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        tracker['seconds'] += time.perf_counter() - start
+        tracker['calls'] += 1
+
+
+def predict_next_question(model, features: np.ndarray) -> np.ndarray:
+    """
+    Run the question model, answering from the compiled decision table when available.
+
+    Returns the same (n_samples, 2) [domain, difficulty] array as model.predict().
+    """
+    # Rows the table can't answer go through the micro-batcher when it is enabled
+    batcher = get_batcher('question', _predict_rows)
+    predict = model.predict if batcher is None else (lambda X: batcher.submit(model, X))
+
+    table = registry.get('question_table')
+    with _timed_inference():
+        if table is not None:
+            return table.predict(features, fallback=predict)
+        return predict(features)
+
+
+def _predict_rows(model, X: np.ndarray) -> np.ndarray:
+    """Batch function for the question model."""
+    return model.predict(X)
 
 
+def _risk_proba_rows(scorer: RiskScorer, X: np.ndarray) -> np.ndarray:
+    """Batch function for the risk model (RiskScorer rows)."""
+    return scorer.predict_proba(X)
 
 
 class PlaceholderQuestionModel:
@@ -132,42 +359,87 @@ class PlaceholderQuestionModel:
 class PlaceholderPredictionModel:
     """
     Placeholder model for final prediction when actual model is not available.
-    Returns risk scores based on feature analysis.
+    Returns risk labels based on feature analysis.
+
+    Called through RiskScorer like the real model, so rows are the 7
+    RISK_FEATURES. The rule-based scores are the original ones over
+    MODEL_FEATURES columns; model_features() maps the rows onto those
+    columns. It has no predict_proba, so results get the default confidence
+    (see risk_result).
     """
-    
-    def predict(self, features: np.ndarray) -> np.ndarray:
+
+    # Classes in scores() column order, and the score below which a session is 'Low Risk'
+    CLASSES = ('Dyslexia Risk', 'Dyscalculia Risk', 'Attention Risk')
+    RISK_THRESHOLD = 0.5
+
+    # Letter reversals that saturate the dyslexia score. The rows carry the reversal
+    # rate, so a session that reverses every answer counts as this many.
+    REVERSAL_COUNT_SCALE = 5
+
+    def model_features(self, features: np.ndarray) -> np.ndarray:
         """
-        Generate prediction based on features.
-        Returns array of [dyslexia_risk, dyscalculia_risk, attention_risk]
+        MODEL_FEATURES rows for RISK_FEATURES rows.
+
+        accuracy is the mean of the three group accuracies and
+        letter_reversal_count is rev_rate * REVERSAL_COUNT_SCALE. Columns the
+        rows don't carry (consistency, confidence_mismatch) keep their
+        DEFAULT_MODEL_FEATURES values.
         """
-        # Extract feature values
-        accuracy = features[0][0] if features.shape[1] > 0 else 0.5
-        avg_response_time = features[0][1] if features.shape[1] > 1 else 2000
-        error_rate = features[0][2] if features.shape[1] > 2 else 0.5
-        reading_accuracy = features[0][4] if features.shape[1] > 4 else 0.5
-        math_accuracy = features[0][5] if features.shape[1] > 5 else 0.5
-        letter_reversal_count = features[0][6] if features.shape[1] > 6 else 0
-        
+        columns = dict(zip(RISK_FEATURES, np.asarray(features, dtype=np.float64).T))
+        accuracy = (columns['reading_acc'] + columns['math_acc'] + columns['focus_acc']) / 3
+        mapped = {
+            'accuracy': accuracy,
+            'avg_response_time': columns['avg_time_ms'],
+            'error_rate': 1 - accuracy,
+            'reading_accuracy': columns['reading_acc'],
+            'math_accuracy': columns['math_acc'],
+            'letter_reversal_count': columns['rev_rate'] * self.REVERSAL_COUNT_SCALE,
+        }
+        rows = np.tile(np.array(DEFAULT_MODEL_FEATURES, dtype=np.float64), (len(accuracy), 1))
+        for name, values in mapped.items():
+            rows[:, MODEL_FEATURES.index(name)] = values
+        return rows
+
+    def scores(self, features: np.ndarray) -> np.ndarray:
+        """
+        Rule-based risk scores of RISK_FEATURES rows.
+
+        Returns array of [dyslexia_risk, dyscalculia_risk, attention_risk] per row
+        """
+        row = dict(zip(MODEL_FEATURES, self.model_features(features).T))
+        accuracy = row['accuracy']
+        avg_response_time = row['avg_response_time']
+        error_rate = row['error_rate']
+        reading_accuracy = row['reading_accuracy']
+        math_accuracy = row['math_accuracy']
+        letter_reversal_count = row['letter_reversal_count']
+
         # Simple rule-based risk calculation
-        dyslexia_risk = min(1.0, 
-            (1 - accuracy) * 0.4 + 
-            (1 - reading_accuracy) * 0.3 + 
+        dyslexia_risk = np.minimum(1.0,
+            (1 - accuracy) * 0.4 +
+            (1 - reading_accuracy) * 0.3 +
             (letter_reversal_count / 5) * 0.3
         )
-        
-        dyscalculia_risk = min(1.0, 
-            (1 - accuracy) * 0.3 + 
-            (1 - math_accuracy) * 0.4 + 
+
+        dyscalculia_risk = np.minimum(1.0,
+            (1 - accuracy) * 0.3 +
+            (1 - math_accuracy) * 0.4 +
             (avg_response_time / 5000) * 0.3
         )
-        
-        attention_risk = min(1.0, 
-            (avg_response_time / 5000) * 0.5 + 
+
+        attention_risk = np.minimum(1.0,
+            (avg_response_time / 5000) * 0.5 +
             (1 - accuracy) * 0.3 +
             (error_rate * 0.2)
         )
-        
-        return np.array([[dyslexia_risk, dyscalculia_risk, attention_risk]])
+
+        return np.column_stack([dyslexia_risk, dyscalculia_risk, attention_risk])
+
+    def predict(self, features: np.ndarray) -> np.ndarray:
+        """One label per row: the class with the highest score, or 'Low Risk' if none reaches RISK_THRESHOLD."""
+        scores = self.scores(features)
+        labels = np.array(self.CLASSES, dtype=object)[np.argmax(scores, axis=1)]
+        return np.where(scores.max(axis=1) >= self.RISK_THRESHOLD, labels, 'Low Risk').astype(object)
 
 
 def extract_question_features(
@@ -188,10 +460,7 @@ def extract_question_features(
     Returns:
         numpy array of shape (1, 10) with features for question model
     """
-    from .models import UserResponse, Question
-    
-    # Get all responses for this session
-    responses = UserResponse.objects.filter(session_id=session_id).order_by('answered_at')
+    from .session_state import get_session_snapshot
     
     # Default values for first question
     if not last_question_id or correct is None or response_time_ms is None:
@@ -203,12 +472,12 @@ def extract_question_features(
             0       # current_domain (reading)
         ]])
     
-    # Get last question difficulty
-    try:
-        last_question = Question.objects.get(question_id=last_question_id)
-        last_difficulty = last_question.difficulty
-    except Question.DoesNotExist:
-        last_difficulty = 'medium'
+    # Session totals and the last response, in a single query
+    snapshot = get_session_snapshot(session_id)
+    total = snapshot['total'] if snapshot else 0
+    
+    # Last question difficulty (the most recent response is the answer to last_question_id)
+    last_difficulty = snapshot['last_difficulty'] if total else 'medium'
     
     # One-hot encode difficulty
     diff_easy = 1 if last_difficulty == 'easy' else 0
@@ -216,10 +485,8 @@ def extract_question_features(
     diff_hard = 1 if last_difficulty == 'hard' else 0
     
     # Calculate session accuracy
-    if responses.exists():
-        total = responses.count()
-        correct_count = responses.filter(correct=True).count()
-        session_accuracy = correct_count / total if total > 0 else 0.5
+    if total:
+        session_accuracy = snapshot['correct'] / total
     else:
         session_accuracy = 1.0 if correct else 0.0
     
@@ -227,15 +494,7 @@ def extract_question_features(
     domain_map = {'reading': 0, 'math': 1, 'attention': 2}
     
     # Get last domain
-    last_domain = 'reading' # Default
-    if last_question_id:
-        try:
-             # We already fetched last_question above if it existed, but let's be safe
-             q_obj = Question.objects.get(question_id=last_question_id)
-             last_domain = q_obj.domain
-        except Question.DoesNotExist:
-             pass
-             
+    last_domain = snapshot['last_domain'] if total else 'reading'
     cur_domain_val = domain_map.get(last_domain, 0)
 
     # 7 features: [last_correct, last_response_time, diff_easy, diff_medium, diff_hard, session_accuracy, current_domain]
@@ -268,63 +527,11 @@ def extract_features(responses: List[Dict[str, Any]]) -> np.ndarray:
     
     Args:
         responses: List of response dictionaries
-        
+
     Returns:
-        numpy array of features
+        numpy array of shape (1, 8) (SessionFeatures.model_features)
     """
-    if not responses:
-        # Return default features
-        return np.array([[0.5, 2000, 0.5, 500, 0.5, 0.5, 0, 0]])
-    
-    # Calculate accuracy
-    total = len(responses)
-    correct_count = sum(1 for r in responses if r.get('correct', False))
-    accuracy = correct_count / total if total > 0 else 0.5
-    
-    # Calculate average response time
-    response_times = [r.get('response_time_ms', 2000) for r in responses]
-    avg_response_time = np.mean(response_times) if response_times else 2000
-    
-    # Error rate
-    error_rate = 1 - accuracy
-    
-    # Consistency (std dev of response times)
-    consistency = np.std(response_times) if len(response_times) > 1 else 500
-    
-    # Domain-specific accuracy
-    reading_responses = [r for r in responses if r.get('domain') == 'reading']
-    reading_correct = sum(1 for r in reading_responses if r.get('correct', False))
-    reading_accuracy = reading_correct / len(reading_responses) if reading_responses else 0.5
-    
-    math_responses = [r for r in responses if r.get('domain') == 'math']
-    math_correct = sum(1 for r in math_responses if r.get('correct', False))
-    math_accuracy = math_correct / len(math_responses) if math_responses else 0.5
-    
-    # Letter reversal count (from mistake patterns)
-    letter_reversal_count = sum(
-        1 for r in responses 
-        if r.get('mistake_type') == 'letter_reversal'
-    )
-    
-    # Confidence mismatch
-    confidence_mismatch = sum(
-        1 for r in responses
-        if (r.get('confidence') == 'low' and r.get('correct')) or
-           (r.get('confidence') == 'high' and not r.get('correct'))
-    )
-    
-    features = np.array([[
-        accuracy,
-        avg_response_time,
-        error_rate,
-        consistency,
-        reading_accuracy,
-        math_accuracy,
-        letter_reversal_count,
-        confidence_mismatch
-    ]])
-    
-    return features
+    return SessionFeatures.from_responses(responses).model_features()
 
 
 def get_next_question_ml(
@@ -349,7 +556,7 @@ def get_next_question_ml(
     features = extract_question_features(session_id, last_question_id, correct, response_time_ms)
     
     # Get prediction
-    prediction = model.predict(features)
+    prediction = predict_next_question(model, features)
     
     # Handle different output shapes
     if len(prediction.shape) == 2:
@@ -379,8 +586,6 @@ def get_prediction(responses: List[Dict[str, Any]]) -> Dict[str, Any]:
     Returns:
         Dictionary with risk, confidence_level, and key_insights
     """
-    model = load_prediction_model()
-    
     if not responses:
         return {
             'risk': 'low-risk',
@@ -389,52 +594,111 @@ def get_prediction(responses: List[Dict[str, Any]]) -> Dict[str, Any]:
             'scores': {'dyslexia': 0, 'dyscalculia': 0, 'attention': 0}
         }
     
-    # Calculate features for risk_classifier model
-    # Expected features: reading_acc, math_acc, focus_acc, avg_time_ms, rev_rate, pv_rate, impulse_rate
-    
-    total = len(responses)
-    
-    # Domain-specific accuracy
-    reading_responses = [r for r in responses if r.get('domain') in ['reading', 'writing']]
-    math_responses = [r for r in responses if r.get('domain') == 'math']
-    focus_responses = [r for r in responses if r.get('domain') in ['attention', 'focus']]
-    
-    reading_acc = sum(1 for r in reading_responses if r.get('correct')) / len(reading_responses) if reading_responses else 0.5
-    math_acc = sum(1 for r in math_responses if r.get('correct')) / len(math_responses) if math_responses else 0.5
-    focus_acc = sum(1 for r in focus_responses if r.get('correct')) / len(focus_responses) if focus_responses else 0.5
-    
-    # Average time
-    avg_time_ms = sum(r.get('response_time_ms', 2000) for r in responses) / total
-    
-    # Reversal rate (letter_reversal mistakes)
-    reversal_count = sum(1 for r in responses if r.get('mistake_type') == 'letter_reversal')
-    rev_rate = reversal_count / total
-    
-    # Position/visual rate (other visual mistakes)
-    pv_count = sum(1 for r in responses if r.get('mistake_type') in ['number_reversal', 'substitution'])
-    pv_rate = pv_count / total
-    
-    # Impulse rate (fast incorrect answers)
-    impulse_count = sum(1 for r in responses if not r.get('correct') and r.get('response_time_ms', 2000) < 1000)
-    impulse_rate = impulse_count / total
-    
-    # Create DataFrame with exact column names
-    features = pd.DataFrame([{
-        "reading_acc": reading_acc,
-        "math_acc": math_acc,
-        "focus_acc": focus_acc,
-        "avg_time_ms": avg_time_ms,
-        "rev_rate": rev_rate,
-        "pv_rate": pv_rate,
-        "impulse_rate": impulse_rate
-    }])
-    
-    # Get prediction
-    prediction = model.predict(features)[0]  # Returns label like "Dyslexia Risk"
+    return predict_risk(risk_features_from_responses(responses))
+
+
+# Domains pooled into each risk model accuracy feature
+RISK_ACCURACY_GROUPS = {'reading': 0, 'writing': 0, 'math': 1, 'attention': 2, 'focus': 2}
+
+
+def risk_features_from_responses(responses: List[Dict[str, Any]]) -> Dict[str, float]:
+    """
+    Compute the 7 risk_classifier features from a non-empty response list
+    (see SessionFeatures.risk_features).
+    """
+    return SessionFeatures.from_responses(responses).risk_features()
+
+
+def risk_features_from_stats(stats) -> Dict[str, float]:
+    """
+    Compute the 7 risk_classifier features from a SessionStats row.
+
+    Matches the features get_prediction() derives from the full response list.
+    """
+    return SessionFeatures.from_stats(stats).risk_features()
+
+
+def risk_features_from_vector(vector) -> Dict[str, float]:
+    """The 7 risk_classifier features stored in a SessionFeatureVector row."""
+    return {name: getattr(vector, name) for name in RISK_FEATURES}
+
+
+def get_prediction_from_stats(stats) -> Dict[str, Any]:
+    """Get risk prediction from a session's SessionStats row (no response scan)."""
+    if not stats.total:
+        return get_prediction([])
+    return predict_risk(risk_features_from_stats(stats))
+
+
+# Risk model classes -> labels used by the API
+RISK_LABELS = {
+    'Low Risk': 'low-risk',
+    'Dyslexia Risk': 'dyslexia-risk',
+    'Dyscalculia Risk': 'dyscalculia-risk',
+    'Attention Risk': 'attention-risk'
+}
+
+
+def _risk_model_output(risk_features: Dict[str, float]):
+    """(predicted class, class probabilities or None) of the risk model for one session."""
+    scorer = load_risk_scorer()
+    row = scorer.row(risk_features)
+
+    with _timed_inference():
+        if not scorer.has_proba:
+            return scorer.estimator.predict(row)[0], None
+
+        # One forest pass: the label is the most probable class (what predict() returns)
+        batcher = get_batcher('risk', _risk_proba_rows)
+        probs = scorer.predict_proba(row)[0] if batcher is None else batcher.submit(scorer, row)[0]
+    return scorer.classes[int(np.argmax(probs))], probs
+
+
+def risk_top_class(risk_features: Dict[str, float]) -> Optional[Tuple[str, float]]:
+    """
+    (label, probability) of the most probable risk class for one session, or
+    None if the risk model has no predict_proba.
+    """
+    prediction, probs = _risk_model_output(risk_features)
+    if probs is None:
+        return None
+    return RISK_LABELS.get(prediction, 'low-risk'), float(max(probs))
+
+
+def predict_risk(risk_features: Dict[str, float]) -> Dict[str, Any]:
+    """
+    Run the risk model on the 7 session features and build the result.
     
-    # Get confidence
-    if hasattr(model, 'predict_proba'):
-        probs = model.predict_proba(features)[0]
+    Args:
+        risk_features: reading_acc, math_acc, focus_acc, avg_time_ms, rev_rate, pv_rate, impulse_rate
+        
+    Returns:
+        Dictionary with risk, confidence_level, key_insights and scores
+    """
+    prediction, probs = _risk_model_output(risk_features)
+    return risk_result(risk_features, prediction, probs)
+
+
+def risk_result(risk_features: Dict[str, float], prediction, probs) -> Dict[str, Any]:
+    """
+    Build the prediction result from the risk model's output for one session.
+
+    Args:
+        risk_features: The 7 features the model was run on
+        prediction: Predicted class (e.g. "Dyslexia Risk")
+        probs: Class probabilities, or None if the model has no predict_proba
+
+    Returns:
+        Dictionary with risk, confidence_level, key_insights and scores
+    """
+    reading_acc = risk_features["reading_acc"]
+    math_acc = risk_features["math_acc"]
+    focus_acc = risk_features["focus_acc"]
+    avg_time_ms = risk_features["avg_time_ms"]
+    rev_rate = risk_features["rev_rate"]
+    impulse_rate = risk_features["impulse_rate"]
+    
+    if probs is not None:
         confidence_score = max(probs) * 100
         
         if confidence_score > 80:
@@ -448,14 +712,7 @@ def get_prediction(responses: List[Dict[str, Any]]) -> Dict[str, Any]:
         confidence_score = 70
     
     # Map prediction to our format
-    label_map = {
-        'Low Risk': 'low-risk',
-        'Dyslexia Risk': 'dyslexia-risk',
-        'Dyscalculia Risk': 'dyscalculia-risk',
-        'Attention Risk': 'attention-risk'
-    }
-    
-    final_label = label_map.get(prediction, 'low-risk')
+    final_label = RISK_LABELS.get(prediction, 'low-risk')
     
     # Generate insights
     key_insights = []
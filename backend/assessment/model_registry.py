@@ -0,0 +1,69 @@
+"""
+Process-wide registry for ML model artifacts.
+
+Models are unpickled once per process and the shared instance is handed out
+to every request, instead of calling joblib.load() on each call.
+"""
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """
+    Loads each registered model at most once per process.
+
+    A loader is any zero-argument callable returning the model (or None if the
+    model is unavailable). The result is cached either way, so a missing model
+    does not cause the candidate paths to be re-checked on every request.
+    """
+
+    def __init__(self):
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._models: Dict[str, Any] = {}
+        # Re-entrant: a loader may depend on another registered model
+        self._lock = threading.RLock()
+        self.load_times: Dict[str, float] = {}
+
+    def register(self, name: str, loader: Callable[[], Any]) -> None:
+        """Register a loader for a model name."""
+        self._loaders[name] = loader
+
+    def get(self, name: str) -> Any:
+        """Return the shared model instance, loading it on first use."""
+        if name in self._models:
+            return self._models[name]
+
+        with self._lock:
+            # Another thread may have finished loading while we waited
+            if name not in self._models:
+                start = time.perf_counter()
+                self._models[name] = self._loaders[name]()
+                self.load_times[name] = time.perf_counter() - start
+        return self._models[name]
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def warm_up(self) -> None:
+        """Load every registered model now (called from assessment.apps.warm_up_models)."""
+        for name in list(self._loaders):
+            self.get(name)
+            logger.debug("%s model ready in %.1f ms", name, self.load_times.get(name, 0) * 1000)
+
+    def reset(self, name: str = None) -> None:
+        """Drop cached models so they are reloaded on next use (e.g. after retraining)."""
+        with self._lock:
+            if name is None:
+                self._models.clear()
+                self.load_times.clear()
+            else:
+                self._models.pop(name, None)
+                self.load_times.pop(name, None)
+
+
+# Shared instance used by ml_utils and views
+registry = ModelRegistry()
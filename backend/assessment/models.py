@@ -1,8 +1,17 @@
 """
 Database models for LD Screening Assessment.
 """
+import random
+
 from django.db import models
 
+from .question_catalog import generated_question_id, get_catalog
+
+
+def new_random_key() -> float:
+    """Default for Question.random_key."""
+    return random.random()
+
 
 class User(models.Model):
     """Stores user information for assessment sessions."""
@@ -49,17 +58,80 @@ class Question(models.Model):
     question_id = models.CharField(max_length=20, primary_key=True)
     domain = models.CharField(max_length=20, choices=DOMAIN_CHOICES)
     difficulty = models.CharField(max_length=20, choices=DIFFICULTY_CHOICES)
+    age_group = models.CharField(max_length=20, blank=True, default='')  # '' = suitable for every age group
     question_text = models.TextField()
     options = models.JSONField()  # List of options
     correct_option = models.CharField(max_length=255)
+    # Uniform in [0, 1); random picks take the first key >= a random point through the index below
+    random_key = models.FloatField(default=new_random_key)
 
     class Meta:
         db_table = 'questions'
+        indexes = [
+            models.Index(fields=['age_group', 'domain', 'difficulty', 'random_key'], name='questions_age_cell_key'),
+        ]
 
     def __str__(self):
         return f"{self.question_id}: {self.question_text[:50]}"
 
 
+class GeneratedQuestion(models.Model):
+    """
+    A dynamically generated question, stored as the (template_id, seed) it was
+    generated from instead of as a Question row. Rows are written in bulk when
+    questions are served. The client sees generated_question_id(seed).
+    """
+    seed = models.BigIntegerField(primary_key=True)
+    template_id = models.CharField(max_length=64)
+    catalog_version = models.PositiveSmallIntegerField()
+
+    class Meta:
+        db_table = 'generated_questions'
+
+    def __str__(self):
+        return f"{self.question_id}: {self.template_id}"
+
+    @property
+    def question_id(self) -> str:
+        return generated_question_id(self.seed)
+
+    def regenerate(self) -> dict:
+        """Rebuild the question exactly as it was served."""
+        catalog = get_catalog()
+        template = catalog.get(self.template_id)
+        question_text, options, correct_idx = catalog.generate(self.template_id, self.seed)
+        return {
+            'question_id': self.question_id,
+            'domain': template.domain,
+            'difficulty': template.difficulty,
+            'question_text': question_text,
+            'options': options,
+            'correct_option': options[correct_idx],
+        }
+
+
+class ItemParameter(models.Model):
+    """
+    Calibrated two-parameter logistic (2PL) IRT parameters of one item, written
+    by `manage.py calibrate_irt_items`. An item is a catalog template for
+    generated questions and a question_id for stored questions. Items
+    without a row use the prior for their difficulty level (see irt.py).
+    """
+    item_id = models.CharField(max_length=64, primary_key=True)
+    domain = models.CharField(max_length=20)
+    difficulty = models.CharField(max_length=20)
+    discrimination = models.FloatField()  # a
+    location = models.FloatField()  # b: ability with a 50% chance of answering correctly
+    responses = models.IntegerField()  # Responses the calibration used
+    calibrated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'irt_item_parameters'
+
+    def __str__(self):
+        return f"{self.item_id}: a={self.discrimination:.2f} b={self.location:.2f}"
+
+
 class UserResponse(models.Model):
     """Stores individual user responses during assessment."""
     CONFIDENCE_CHOICES = [
@@ -71,7 +143,11 @@ class UserResponse(models.Model):
     response_id = models.AutoField(primary_key=True)
     session = models.ForeignKey(Session, on_delete=models.CASCADE, related_name='responses')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='responses')
-    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='responses')
+    # Exactly one of question / generated_question is set
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='responses', null=True, blank=True)
+    # No database constraint: answers store the seed from the question id without looking the row up
+    generated_question = models.ForeignKey(GeneratedQuestion, on_delete=models.DO_NOTHING, related_name='responses',
+                                           null=True, blank=True, db_constraint=False)
     domain = models.CharField(max_length=20)
     difficulty = models.CharField(max_length=20)
     correct = models.BooleanField()
@@ -85,6 +161,13 @@ class UserResponse(models.Model):
     def __str__(self):
         return f"Response {self.response_id} - {'Correct' if self.correct else 'Incorrect'}"
 
+    @property
+    def answered_question_id(self) -> str:
+        """Id of the answered question as the client saw it."""
+        if self.question_id is not None:
+            return self.question_id
+        return generated_question_id(self.generated_question_id)
+
 
 class MistakePattern(models.Model):
     """Mistake fingerprinting for identifying learning disability patterns."""
@@ -124,3 +207,63 @@ class FinalPrediction(models.Model):
 
     def __str__(self):
         return f"Prediction {self.prediction_id}: {self.final_label}"
+
+
+class SessionFeatureVector(models.Model):
+    """
+    The risk model's feature vector of a completed session, written by
+    EndSessionView so readers don't have to rebuild it from UserResponse.
+    schema_version is session_features.FEATURE_SCHEMA_VERSION when the row was
+    written; `manage.py rescore_sessions` recomputes rows of older versions.
+    """
+    session = models.OneToOneField(Session, on_delete=models.CASCADE, primary_key=True,
+                                   related_name='feature_vector')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='feature_vectors')
+    schema_version = models.PositiveSmallIntegerField()
+    total = models.IntegerField()  # Answers the features were computed from
+    # ml_utils.RISK_FEATURES
+    reading_acc = models.FloatField()
+    math_acc = models.FloatField()
+    focus_acc = models.FloatField()
+    avg_time_ms = models.FloatField()
+    rev_rate = models.FloatField()
+    pv_rate = models.FloatField()
+    impulse_rate = models.FloatField()
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'session_feature_vectors'
+
+    def __str__(self):
+        return f"Features of {self.session_id} (v{self.schema_version})"
+
+
+class SessionStats(models.Model):
+    """
+    Running aggregates for a session, updated in the same transaction as each
+    submitted answer so reads never have to re-scan UserResponse.
+    """
+    session = models.OneToOneField(Session, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    total = models.IntegerField(default=0)
+    correct = models.IntegerField(default=0)
+    impulse_count = models.IntegerField(default=0)  # Incorrect answers given in under 1000 ms
+    response_time_sum = models.BigIntegerField(default=0)
+    response_time_sq_sum = models.BigIntegerField(default=0)
+    # {domain: {"count": n, "correct": n, "time_ms": n, "mistakes": {mistake_type: n}}}
+    domain_stats = models.JSONField(default=dict)
+    mistake_counts = models.JSONField(default=dict)  # {mistake_type: n}
+    # {domain: [[item_id, difficulty, correct], ...]} - IRT ability estimation input (only kept while ASSESSMENT_IRT is enabled)
+    irt_responses = models.JSONField(default=dict)
+    # Early stopping (see stopping.py): confident risk class and how many answers in a row it has held
+    stop_label = models.CharField(max_length=32, null=True, blank=True)
+    stop_streak = models.IntegerField(default=0)
+    last_question_id = models.CharField(max_length=20, null=True, blank=True)
+    last_domain = models.CharField(max_length=20, null=True, blank=True)
+    last_difficulty = models.CharField(max_length=20, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'session_stats'
+
+    def __str__(self):
+        return f"Stats for {self.session_id} ({self.correct}/{self.total})"
@@ -0,0 +1,215 @@
+"""
+In-process index of the Question table.
+
+get_adaptive_question used to run up to four
+`Question.objects.filter(...).exclude(question_id__in=answered_ids).first()`
+queries, each with a subquery over the session's responses. A QuestionBank
+loads the table once and keeps:
+
+    rows        - every question as a tuple of QUESTION_FIELDS, by position
+    positions   - question_id -> position (also serves Question lookups)
+    partitions  - pre-shuffled arrays of positions for each fallback tier:
+                  (age_group, domain, difficulty), ('', domain, difficulty),
+                  (None, domain, None), (None, None, difficulty), (None, None, None)
+
+Each session's answered questions are a bitset over positions, plus a cursor
+per partition that starts at a random offset and wraps around. Answered items
+never become unanswered, so a cursor only moves forward and picking the next
+unanswered item is amortized O(1).
+
+The bank is rebuilt after Question post_save/post_delete (see apps.py) and
+after MAX_AGE_S, which covers changes made by other processes or by
+bulk_create/update (no signals). Configure with settings.ASSESSMENT_QUESTION_BANK.
+"""
+import logging
+import random
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Question, UserResponse
+
+logger = logging.getLogger(__name__)
+
+# Stored per question; Question instances are only built for the rows handed out
+QUESTION_FIELDS = ('question_id', 'domain', 'difficulty', 'age_group', 'question_text', 'options', 'correct_option')
+
+DEFAULTS = {
+    'ENABLED': True,
+    'MAX_AGE_S': 300,
+    'MAX_SESSIONS': 10000,  # answered bitsets kept (least recently used are dropped)
+}
+
+
+class AnsweredSet:
+    """Answered question positions of one session, and its cursor into each partition."""
+
+    __slots__ = ('bits', 'cursors', 'total')
+
+    def __init__(self, size: int, total: Optional[int] = None):
+        self.bits = bytearray((size + 7) // 8)
+        self.cursors: Dict[tuple, tuple] = {}  # partition -> (random start, items passed)
+        self.total = total  # Session responses reflected in the bits (None: unknown)
+
+    def add(self, position: int) -> None:
+        self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, position: int) -> bool:
+        return bool(self.bits[position >> 3] >> (position & 7) & 1)
+
+
+class QuestionBank:
+    """A snapshot of the Question table, partitioned for get_adaptive_question."""
+
+    def __init__(self, rows: List[tuple], max_sessions: int = 10000, seed=None):
+        self.rows = rows
+        self.positions = {row[0]: i for i, row in enumerate(rows)}
+        self.max_sessions = max_sessions
+        self.built_at = time.monotonic()
+
+        cells: Dict[tuple, List[int]] = {}
+        for i, row in enumerate(rows):
+            cells.setdefault((row[3], row[1], row[2]), []).append(i)
+
+        # The wider tiers are unions of cells
+        tiers: Dict[tuple, List[int]] = {(None, None, None): list(range(len(rows)))}
+        for (age_group, domain, difficulty), members in cells.items():
+            tiers[(age_group, domain, difficulty)] = members
+            tiers.setdefault((None, domain, None), []).extend(members)
+            tiers.setdefault((None, None, difficulty), []).extend(members)
+
+        rng = random.Random(seed)
+        self.partitions: Dict[tuple, array] = {}
+        for key, members in tiers.items():
+            rng.shuffle(members)
+            self.partitions[key] = array('l', members)
+
+        self._sessions: 'OrderedDict[str, AnsweredSet]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, max_sessions: int = 10000) -> 'QuestionBank':
+        return cls(list(Question.objects.values_list(*QUESTION_FIELDS)), max_sessions=max_sessions)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def question(self, position: int) -> Question:
+        return Question.from_db(Question.objects.db, QUESTION_FIELDS, self.rows[position])
+
+    def get(self, question_id: str) -> Optional[Question]:
+        """The Question with this id, or None if it isn't in the bank."""
+        position = self.positions.get(question_id)
+        return self.question(position) if position is not None else None
+
+    def answered(self, session_id: str, total: Optional[int] = None) -> AnsweredSet:
+        """
+        The session's answered set, reloaded from its responses (one query)
+        unless it is known to reflect `total` responses.
+        """
+        with self._lock:
+            answered = self._sessions.get(session_id)
+            if answered is not None:
+                self._sessions.move_to_end(session_id)
+        if answered is not None and total is not None and answered.total == total:
+            return answered
+
+        answered = AnsweredSet(len(self.rows), total)
+        for question_id in UserResponse.objects.filter(
+            session_id=session_id, question__isnull=False
+        ).values_list('question_id', flat=True):
+            position = self.positions.get(question_id)
+            if position is not None:
+                answered.add(position)
+
+        with self._lock:
+            self._sessions[session_id] = answered
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return answered
+
+    def record_answer(self, session_id: str, question_id: Optional[str], total: int) -> None:
+        """
+        Mark an answer in the session's set if it is loaded and up to date.
+
+        `total` is the session's response count including this answer. Any
+        other state is left to be reloaded by answered(). That also covers a
+        rolled-back answer, because the counts no longer match.
+        """
+        with self._lock:
+            answered = self._sessions.get(session_id)
+        if answered is None or answered.total != total - 1:
+            return
+        position = self.positions.get(question_id) if question_id is not None else None
+        if position is not None:
+            answered.add(position)
+        answered.total = total
+
+    def pick(self, answered: AnsweredSet, domain: str, difficulty: str, age_group: str = '') -> Optional[Question]:
+        """
+        Random unanswered question for (domain, difficulty), from the age
+        group's questions and then those for every age, falling back to the
+        domain, then the difficulty, then any question.
+        """
+        keys = [(age_group, domain, difficulty), ('', domain, difficulty),
+                (None, domain, None), (None, None, difficulty), (None, None, None)]
+        for key in keys[1:] if not age_group else keys:
+            partition = self.partitions.get(key)
+            if partition is None:
+                continue
+            size = len(partition)
+            start, passed = answered.cursors.get(key) or (random.randrange(size), 0)
+            while passed < size and partition[(start + passed) % size] in answered:
+                passed += 1
+            answered.cursors[key] = (start, passed)
+            if passed < size:
+                return self.question(partition[(start + passed) % size])
+        return None
+
+
+_bank: Optional[QuestionBank] = None
+_bank_lock = threading.Lock()
+
+
+def bank_config() -> Dict[str, Any]:
+    return {**DEFAULTS, **getattr(settings, 'ASSESSMENT_QUESTION_BANK', {})}
+
+
+def get_question_bank() -> Optional[QuestionBank]:
+    """Return the process-wide bank (loaded on first use), or None if it is disabled."""
+    global _bank
+    config = bank_config()
+    if not config['ENABLED']:
+        return None
+
+    bank = _bank
+    if bank is not None and time.monotonic() - bank.built_at < config['MAX_AGE_S']:
+        return bank
+
+    with _bank_lock:
+        if _bank is bank:
+            _bank = QuestionBank.load(max_sessions=config['MAX_SESSIONS'])
+            logger.debug("Question bank loaded: %d questions", len(_bank))
+        return _bank
+
+
+def current_question_bank() -> Optional[QuestionBank]:
+    """The loaded bank, without loading or refreshing it."""
+    return _bank
+
+
+def invalidate_question_bank(**kwargs) -> None:
+    """
+    Drop the bank once the current transaction commits; the next use reloads it.
+    Connected to Question post_save/post_delete.
+    """
+    def drop():
+        global _bank
+        with _bank_lock:
+            _bank = None
+    transaction.on_commit(drop)
@@ -0,0 +1,325 @@
+"""
+Question template catalog.
+
+Templates live in question_catalog.json (versioned) rather than inside the
+pickled QuestionGeneratorModel. The catalog is loaded once per process and
+compiled into typed template objects, so generating a question is a direct
+method call instead of substring checks on the template text:
+
+    FixedTemplate       - fixed text and options
+    LetterWordTemplate  - "starts with {letter}", options are the candidate words
+    ArithmeticTemplate  - add / subtract / multiply / divide / multiply_add
+    StarCountTemplate   - count the stars in a random star/dot string
+
+Each template has generate(rng) for one question (rng is random.Random or the
+random module) and generate_batch(rng, n) for NumPy batches (rng is a
+numpy Generator). Numeric distractors are drawn in closed form: three
+distinct offsets of +-1..3 that keep the option positive.
+
+A question served to a user is addressed by (template_id, seed): generating
+it with random.Random(seed) always gives the same text and options, so only
+those two values need to be stored (see QuestionCatalog.generate and
+generated_question_id).
+
+This module is imported by question_generator_model, which is also loaded as
+a top-level module when unpickling, so it must not depend on Django.
+"""
+import json
+import os
+import random
+from functools import lru_cache
+from itertools import permutations
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'question_catalog.json')
+
+# Offsets used for numeric distractors
+DISTRACTOR_OFFSETS = (-3, -2, -1, 1, 2, 3)
+_OFFSET_ARRAY = np.array(DISTRACTOR_OFFSETS)
+
+# Seeds of served questions: non-negative and fit a signed 64-bit column
+SEED_BITS = 63
+# Public id of a seed-addressed question: 'G_' + 16 hex digits (fits Question.question_id's 20)
+GENERATED_ID_PREFIX = 'G_'
+
+
+def _arrangements(offsets):
+    """Every ordering of the answer (offset 0) and three distinct distractor offsets."""
+    return tuple(permutation for permutation in permutations((0,) + offsets, 4) if 0 in permutation)
+
+
+# All option layouts, for answers 0..3 (fewer valid offsets) and for everything larger
+_SMALL_ANSWER_ARRANGEMENTS = {
+    answer: _arrangements(tuple(offset for offset in DISTRACTOR_OFFSETS if answer + offset > 0))
+    for answer in range(4)
+}
+_ARRANGEMENTS = _arrangements(DISTRACTOR_OFFSETS)
+
+
+def _randint(rng, low: int, high: int) -> int:
+    """rng.randint without its argument checks (low <= result <= high)."""
+    return low + int(rng.random() * (high - low + 1))
+
+
+def numeric_options(answer: int, rng) -> Tuple[List[str], int]:
+    """Four shuffled options: the answer and three distinct positive distractors."""
+    layout = rng.choice(_ARRANGEMENTS if answer > 3 else _SMALL_ANSWER_ARRANGEMENTS[answer])
+    return [str(answer + offset) for offset in layout], layout.index(0)
+
+
+def numeric_options_batch(rng: np.random.Generator, answer: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Vectorised numeric_options: ((m, 4) object array of str, answer index per row)."""
+    candidates = answer[:, None] + _OFFSET_ARRAY
+    # Random key per offset, invalid (non-positive) ones sorted last; every answer >= 0 has 3 valid offsets
+    keys = np.where(candidates > 0, rng.random(candidates.shape), np.inf)
+    chosen = np.argsort(keys, axis=1)[:, :3]
+    values = np.column_stack([answer, np.take_along_axis(candidates, chosen, axis=1)])
+
+    order = np.argsort(rng.random(values.shape), axis=1)
+    shuffled = np.take_along_axis(values, order, axis=1)
+    return shuffled.astype(str).astype(object), np.argmax(order == 0, axis=1)
+
+
+def _join(*parts) -> np.ndarray:
+    """Element-wise string concatenation of literals and integer arrays."""
+    result = None
+    for part in parts:
+        part = part if isinstance(part, str) else np.asarray(part).astype(str)
+        result = part if result is None else np.char.add(result, part)
+    return result.astype(object)
+
+
+class QuestionTemplate:
+    """Base class: one catalog entry."""
+
+    kind = None
+
+    def __init__(self, spec: Dict):
+        self.id = spec['id']
+        self.domain = spec['domain']
+        self.difficulty = spec['difficulty']
+        self.text = spec['text']
+
+    def generate(self, rng) -> Tuple[str, List[str], int]:
+        """Return (question_text, options, index of the correct option)."""
+        raise NotImplementedError
+
+    def generate_batch(self, rng: np.random.Generator, n: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return (question_text (n,), options (n, 4), correct index (n,))."""
+        raise NotImplementedError
+
+
+class FixedTemplate(QuestionTemplate):
+    kind = 'fixed'
+
+    def __init__(self, spec):
+        super().__init__(spec)
+        self.options = tuple(spec['options'])
+        self.answer = spec['answer']
+
+    def generate(self, rng):
+        return self.text, list(self.options), self.answer
+
+    def generate_batch(self, rng, n):
+        options = np.empty((n, len(self.options)), dtype=object)
+        options[:] = self.options
+        return np.full(n, self.text, dtype=object), options, np.full(n, self.answer)
+
+
+class LetterWordTemplate(QuestionTemplate):
+    kind = 'letter_word'
+
+    def __init__(self, spec):
+        super().__init__(spec)
+        self.letters = tuple(spec['words'])
+        self.words = tuple(spec['words'][letter] for letter in self.letters)
+        self.texts = tuple(self.text.format(letter=letter) for letter in self.letters)
+
+    def generate(self, rng):
+        index = rng.randrange(len(self.letters))
+        # A uniformly random order of all the words
+        options = list(self.words)
+        rng.shuffle(options)
+        return self.texts[index], options, options.index(self.words[index])
+
+    def generate_batch(self, rng, n):
+        index = rng.integers(len(self.letters), size=n)
+        order = np.argsort(rng.random((n, len(self.words))), axis=1)
+        options = np.array(self.words, dtype=object)[order]
+        return (np.array(self.texts, dtype=object)[index], options,
+                np.argmax(order == index[:, None], axis=1))
+
+
+class ArithmeticTemplate(QuestionTemplate):
+    kind = 'arithmetic'
+
+    def __init__(self, spec):
+        super().__init__(spec)
+        self.operation = spec['operation']
+        self.ranges = {name: tuple(bounds) for name, bounds in spec['ranges'].items()}
+        # Operation chosen once here, not per question
+        self._operands = getattr(self, f'_{self.operation}')
+        self._operands_batch = getattr(self, f'_{self.operation}_batch')
+        # The text pieces around {a}, {b}, {c} for batch formatting
+        self._pieces = self.text.replace('{', '}').split('}')
+
+    def generate(self, rng):
+        values, answer = self._operands(rng)
+        options, correct = numeric_options(answer, rng)
+        return self.text.format(**values), options, correct
+
+    def generate_batch(self, rng, n):
+        values, answer = self._operands_batch(rng, n)
+        parts = [values[piece] if i % 2 else piece for i, piece in enumerate(self._pieces) if piece or i % 2]
+        options, correct = numeric_options_batch(rng, answer)
+        return _join(*parts), options, correct
+
+    # Single question: (format values, answer)
+
+    def _add(self, rng):
+        a, b = _randint(rng, *self.ranges['a']), _randint(rng, *self.ranges['b'])
+        return {'a': a, 'b': b}, a + b
+
+    def _subtract(self, rng):
+        a = _randint(rng, *self.ranges['a'])
+        b = _randint(rng, 1, a - 1)
+        return {'a': a, 'b': b}, a - b
+
+    def _multiply(self, rng):
+        a, b = _randint(rng, *self.ranges['a']), _randint(rng, *self.ranges['b'])
+        return {'a': a, 'b': b}, a * b
+
+    def _divide(self, rng):
+        b, answer = _randint(rng, *self.ranges['b']), _randint(rng, *self.ranges['answer'])
+        return {'a': answer * b, 'b': b}, answer
+
+    def _multiply_add(self, rng):
+        a, b, c = (_randint(rng, *self.ranges[name]) for name in ('a', 'b', 'c'))
+        return {'a': a, 'b': b, 'c': c}, a * b + c
+
+    # Batches: ({name: array}, answers)
+
+    def _draw(self, rng, name, n):
+        low, high = self.ranges[name]
+        return rng.integers(low, high + 1, size=n)
+
+    def _add_batch(self, rng, n):
+        a, b = self._draw(rng, 'a', n), self._draw(rng, 'b', n)
+        return {'a': a, 'b': b}, a + b
+
+    def _subtract_batch(self, rng, n):
+        a = self._draw(rng, 'a', n)
+        b = 1 + (rng.random(n) * (a - 1)).astype(np.int64)
+        return {'a': a, 'b': b}, a - b
+
+    def _multiply_batch(self, rng, n):
+        a, b = self._draw(rng, 'a', n), self._draw(rng, 'b', n)
+        return {'a': a, 'b': b}, a * b
+
+    def _divide_batch(self, rng, n):
+        b, answer = self._draw(rng, 'b', n), self._draw(rng, 'answer', n)
+        return {'a': answer * b, 'b': b}, answer
+
+    def _multiply_add_batch(self, rng, n):
+        a, b, c = (self._draw(rng, name, n) for name in ('a', 'b', 'c'))
+        return {'a': a, 'b': b, 'c': c}, a * b + c
+
+
+class StarCountTemplate(QuestionTemplate):
+    kind = 'star_count'
+    STAR, DOT = '⭐', '🔵'
+
+    def __init__(self, spec):
+        super().__init__(spec)
+        self.count = tuple(spec['count'])
+        self.extra = spec['extra']
+        self.star_probability = spec['star_probability']
+        self.prefix = self.text.split('{stars}')[0]
+        self._symbols = (self.STAR, self.DOT)
+        self._cum_weights = (self.star_probability, 1.0)
+
+    def generate(self, rng):
+        length = _randint(rng, *self.count) + self.extra
+        stars = ''.join(rng.choices(self._symbols, cum_weights=self._cum_weights, k=length))
+        answer = stars.count(self.STAR)
+        options, correct = numeric_options(answer, rng)
+        return self.prefix + stars, options, correct
+
+    def generate_batch(self, rng, n):
+        width = self.count[1] + self.extra
+        length = rng.integers(self.count[0], self.count[1] + 1, size=n) + self.extra
+        is_star = rng.random((n, width)) < self.star_probability
+        in_string = np.arange(width) < length[:, None]
+        chars = np.where(is_star, self.STAR, self.DOT).astype('<U1')
+        chars[~in_string] = ''
+        # Trailing empty cells are stripped when viewed as one fixed-width string
+        stars = np.ascontiguousarray(chars).view(f'<U{width}').ravel()
+        answer = (is_star & in_string).sum(axis=1)
+        options, correct = numeric_options_batch(rng, answer)
+        return np.char.add(self.prefix, stars).astype(object), options, correct
+
+
+TEMPLATE_KINDS = {
+    cls.kind: cls
+    for cls in (FixedTemplate, LetterWordTemplate, ArithmeticTemplate, StarCountTemplate)
+}
+
+
+class QuestionCatalog:
+    """Compiled templates, indexed by id and by (domain, difficulty)."""
+
+    def __init__(self, version: int, templates: List[QuestionTemplate]):
+        self.version = version
+        self.templates = {template.id: template for template in templates}
+        self.cells: Dict[Tuple[str, str], Tuple[QuestionTemplate, ...]] = {}
+        for template in templates:
+            key = (template.domain, template.difficulty)
+            self.cells[key] = self.cells.get(key, ()) + (template,)
+
+    def cell(self, domain: str, difficulty: str) -> Tuple[QuestionTemplate, ...]:
+        """Templates for a domain and difficulty (reading/easy if there are none)."""
+        return self.cells.get((domain, difficulty)) or self.cells[('reading', 'easy')]
+
+    def get(self, template_id: str) -> QuestionTemplate:
+        return self.templates[template_id]
+
+    def generate(self, template_id: str, seed: int) -> Tuple[str, List[str], int]:
+        """(question_text, options, correct index) of the question addressed by (template_id, seed)."""
+        return self.templates[template_id].generate(random.Random(seed))
+
+
+def new_seed() -> int:
+    """Seed for a newly served question."""
+    return random.getrandbits(SEED_BITS)
+
+
+def generated_question_id(seed: int) -> str:
+    """Question id sent to the client for a seed-addressed question."""
+    return f'{GENERATED_ID_PREFIX}{seed:016x}'
+
+
+def parse_generated_question_id(question_id: str) -> Optional[int]:
+    """The seed encoded in a generated_question_id, or None for any other id."""
+    if not question_id.startswith(GENERATED_ID_PREFIX) or len(question_id) != len(GENERATED_ID_PREFIX) + 16:
+        return None
+    try:
+        seed = int(question_id[len(GENERATED_ID_PREFIX):], 16)
+    except ValueError:
+        return None
+    return seed if seed < 1 << SEED_BITS else None
+
+
+def load_catalog(path: str = CATALOG_PATH) -> QuestionCatalog:
+    """Read and compile a catalog file."""
+    with open(path, encoding='utf-8') as f:
+        spec = json.load(f)
+    templates = [TEMPLATE_KINDS[entry['kind']](entry) for entry in spec['templates']]
+    return QuestionCatalog(spec['version'], templates)
+
+
+@lru_cache(maxsize=None)
+def get_catalog() -> QuestionCatalog:
+    """The catalog shipped with the app, loaded once per process."""
+    return load_catalog()
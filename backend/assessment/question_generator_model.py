@@ -7,7 +7,12 @@ imported by both the training script and Django views.
 
 import numpy as np
 import random
-from sklearn.ensemble import RandomForestClassifier
+
+try:
+    from .question_catalog import get_catalog, new_seed
+except ImportError:
+    # Loaded as a top-level module (training script, unpickling)
+    from question_catalog import get_catalog, new_seed
 
 
 class QuestionGeneratorModel:
@@ -18,61 +23,17 @@ class QuestionGeneratorModel:
     def __init__(self):
         self.domain_classifier = None
         self.difficulty_classifier = None
-        
-        # Question templates by domain and difficulty
-        self.templates = {
-            'reading': {
-                'easy': [
-                    ('Find the word that starts with "{letter}"', ['bat', 'car', 'ant', 'cat'], 2),
-                    ('Which word rhymes with "cat"?', ['dog', 'bat', 'car', 'sun'], 1),
-                    ('What letter does "apple" start with?', ['B', 'A', 'C', 'D'], 1),
-                ],
-                'medium': [
-                    ('What is the opposite of "hot"?', ['sad', 'cold', 'small', 'down'], 1),
-                    ('Which word means the same as "happy"?', ['sad', 'joyful', 'angry', 'tired'], 1),
-                    ('Complete: The dog ___ fast', ['run', 'runs', 'running', 'ran'], 1),
-                ],
-                'hard': [
-                    ('Complete the sentence: She ___ to school yesterday', ['go', 'went', 'goes', 'going'], 1),
-                    ('Which word is spelled correctly?', ['recieve', 'receive', 'recive', 'receeve'], 1),
-                    ('What is the past tense of "swim"?', ['swam', 'swimmed', 'swum', 'swimming'], 0),
-                ]
-            },
-            'math': {
-                'easy': [
-                    ('What is {a} + {b}?', None, None),  # Dynamic
-                    ('What is {a} - {b}?', None, None),
-                    ('Count: ⭐⭐⭐⭐⭐', ['3', '4', '5', '6'], 2),
-                ],
-                'medium': [
-                    ('What is {a} × {b}?', None, None),
-                    ('What is {a} ÷ {b}?', None, None),
-                    ('What comes next: 2, 4, 6, 8, ?', ['9', '10', '11', '12'], 1),
-                ],
-                'hard': [
-                    ('Solve: {a} × {b} + {c}', None, None),
-                    ('If 3x = 12, what is x?', ['3', '4', '5', '6'], 1),
-                    ('What is 15% of 60?', ['6', '7', '8', '9'], 3),
-                ]
-            },
-            'attention': {
-                'easy': [
-                    ('Count the ⭐s: {stars}', None, None),
-                    ('Which shape is different? 🔵🔵🔴🔵', ['1st', '2nd', '3rd', '4th'], 2),
-                    ('Find the number: A B 3 C D', ['A', 'B', '3', 'C'], 2),
-                ],
-                'medium': [
-                    ('What comes next: 2, 4, 6, 8, ?', ['9', '10', '11', '12'], 1),
-                    ('Pattern: ▲▼▲▼▲?', ['▲', '▼', '●', '■'], 1),
-                    ('Which is the odd one out: 2, 4, 5, 8', ['2', '4', '5', '8'], 2),
-                ],
-                'hard': [
-                    ('Find the pattern: 1, 1, 2, 3, 5, 8, ?', ['10', '11', '13', '15'], 2),
-                    ('Complete: A1, B2, C3, D?', ['3', '4', 'E4', 'D4'], 1),
-                    ('What number is missing: 2, 4, _, 8, 10', ['5', '6', '7', '8'], 1),
-                ]
-            }
-        }
+    
+    def __getstate__(self):
+        # Templates come from question_catalog.json, not from the pickle
+        state = self.__dict__.copy()
+        state.pop('templates', None)
+        return state
+    
+    def __setstate__(self, state):
+        # Artifacts saved before the catalog still carry a templates dict
+        state.pop('templates', None)
+        self.__dict__.update(state)
     
     def fit(self, X, y):
         """
@@ -82,6 +43,9 @@ class QuestionGeneratorModel:
             X: Features [cur_domain, cur_diff, correct, time_ms]
             y: Targets [target_domain, target_diff]
         """
+        # Imported here so serving from flattened forests (flat_forest.py) never loads scikit-learn
+        from sklearn.ensemble import RandomForestClassifier
+        
         # Split y into domain and difficulty
         y_domain = y[:, 0]
         y_difficulty = y[:, 1]
@@ -122,106 +86,89 @@ class QuestionGeneratorModel:
             difficulty: 'easy', 'medium', or 'hard'
         
         Returns:
-            Dictionary with question_text, options, correct_option
+            Dictionary with template_id, seed, question_text, options,
+            correct_option. get_catalog().generate(template_id, seed)
+            regenerates the same question.
         """
-        # Map numeric to string if needed
-        domain_map = {0: 'reading', 1: 'math', 2: 'attention'}
-        diff_map = {0: 'easy', 1: 'medium', 2: 'hard'}
-        
-        if isinstance(domain, (int, np.integer)):
-            domain = domain_map.get(domain, 'reading')
-        if isinstance(difficulty, (int, np.integer)):
-            difficulty = diff_map.get(difficulty, 'medium')
-        
-        # Get templates for this domain/difficulty
-        templates = self.templates.get(domain, {}).get(difficulty, [])
-        if not templates:
-            # Fallback
-            templates = self.templates['reading']['easy']
-        
-        # Choose random template
-        template = random.choice(templates)
-        question_text, options, correct_idx = template
-        
-        # Generate dynamic content for math questions
-        if domain == 'math' and options is None:
-            if 'What is' in question_text and '+' in question_text:
-                a, b = random.randint(1, 10), random.randint(1, 10)
-                answer = a + b
-                question_text = f"What is {a} + {b}?"
-                options = self._generate_options(answer)
-                correct_idx = options.index(str(answer))
-            elif '×' in question_text:
-                a, b = random.randint(2, 9), random.randint(2, 9)
-                answer = a * b
-                question_text = f"What is {a} × {b}?"
-                options = self._generate_options(answer)
-                correct_idx = options.index(str(answer))
-            elif '-' in question_text:
-                a = random.randint(5, 15)
-                b = random.randint(1, a-1)
-                answer = a - b
-                question_text = f"What is {a} - {b}?"
-                options = self._generate_options(answer)
-                correct_idx = options.index(str(answer))
-            elif '÷' in question_text:
-                b = random.randint(2, 5)
-                answer = random.randint(2, 10)
-                a = answer * b
-                question_text = f"What is {a} ÷ {b}?"
-                options = self._generate_options(answer)
-                correct_idx = options.index(str(answer))
-            elif 'Solve:' in question_text:
-                a, b, c = random.randint(2, 5), random.randint(2, 5), random.randint(1, 10)
-                answer = a * b + c
-                question_text = f"Solve: {a} × {b} + {c}"
-                options = self._generate_options(answer)
-                correct_idx = options.index(str(answer))
-        
-        # Generate dynamic content for attention questions
-        if domain == 'attention' and 'Count the ⭐s' in question_text:
-            count = random.randint(5, 12)
-            stars = ''.join(['⭐' if random.random() > 0.3 else '🔵' for _ in range(count + 5)])
-            actual_count = stars.count('⭐')
-            question_text = f"Count the ⭐s: {stars}"
-            options = self._generate_options(actual_count)
-            correct_idx = options.index(str(actual_count))
-        
-        # Handle letter substitution for reading
-        if '{letter}' in question_text:
-            letter = random.choice(['A', 'B', 'C', 'D'])
-            question_text = question_text.format(letter=letter)
-            # Update options to match
-            words = {'A': 'ant', 'B': 'bat', 'C': 'cat', 'D': 'dog'}
-            correct_word = words[letter]
-            options = random.sample([w for w in words.values() if w != correct_word], 3)
-            options.insert(random.randint(0, 3), correct_word)
-            correct_idx = options.index(correct_word)
+        domain, difficulty = _names(domain, difficulty)
+        
+        # Choose random template; its content comes from a seeded generator
+        catalog = get_catalog()
+        template = random.choice(catalog.cell(domain, difficulty))
+        seed = new_seed()
+        question_text, options, correct_idx = catalog.generate(template.id, seed)
         
         return {
             'domain': domain,
             'difficulty': difficulty,
+            'template_id': template.id,
+            'seed': seed,
             'question_text': question_text,
             'options': options,
             'correct_option': options[correct_idx]
         }
     
-    def _generate_options(self, correct_answer):
-        """Generate 4 options including the correct answer."""
-        options = [str(correct_answer)]
-        
-        # Generate 3 wrong options
-        for _ in range(3):
-            wrong = correct_answer + random.choice([-3, -2, -1, 1, 2, 3])
-            if wrong > 0 and str(wrong) not in options:
-                options.append(str(wrong))
-        
-        # Fill remaining if needed
-        while len(options) < 4:
-            wrong = correct_answer + random.randint(-5, 5)
-            if wrong > 0 and str(wrong) not in options:
-                options.append(str(wrong))
-        
-        # Shuffle
-        random.shuffle(options)
-        return options[:4]
+    def generate_questions(self, domain, difficulty, n, seed=None):
+        """
+        Generate n questions for one domain and difficulty at once.
+        
+        Vectorised counterpart of generate_question: operands, answers,
+        distractors and star strings are built as NumPy arrays for the whole
+        batch, using a seeded Generator instead of the global random module.
+        
+        Args:
+            domain: 'reading', 'math', or 'attention'
+            difficulty: 'easy', 'medium', or 'hard'
+            n: Number of questions
+            seed: Seed for numpy.random.default_rng (same seed, same batch)
+        
+        Returns:
+            Columnar dictionary:
+                domain, difficulty  - as given
+                template_id         - (n,) catalog template of each question
+                question_text       - (n,) object array
+                options             - (n, 4) object array
+                correct_index       - (n,) position of the answer in options
+                correct_option      - (n,) object array
+        """
+        domain, difficulty = _names(domain, difficulty)
+        rng = np.random.default_rng(seed)
+        
+        templates = get_catalog().cell(domain, difficulty)
+        template_index = rng.integers(len(templates), size=n)
+        template_id = np.empty(n, dtype=object)
+        question_text = np.empty(n, dtype=object)
+        options = np.empty((n, 4), dtype=object)
+        correct_index = np.empty(n, dtype=np.int64)
+        
+        for t, template in enumerate(templates):
+            rows = np.flatnonzero(template_index == t)
+            if len(rows) == 0:
+                continue
+            texts, batch_options, batch_correct = template.generate_batch(rng, len(rows))
+            template_id[rows] = template.id
+            question_text[rows] = texts
+            options[rows] = batch_options
+            correct_index[rows] = batch_correct
+        
+        return {
+            'domain': domain,
+            'difficulty': difficulty,
+            'template_id': template_id,
+            'question_text': question_text,
+            'options': options,
+            'correct_index': correct_index,
+            'correct_option': options[np.arange(n), correct_index],
+        }
+
+
+def _names(domain, difficulty):
+    """Map numeric domain/difficulty to names if needed."""
+    domain_map = {0: 'reading', 1: 'math', 2: 'attention'}
+    diff_map = {0: 'easy', 1: 'medium', 2: 'hard'}
+    
+    if isinstance(domain, (int, np.integer)):
+        domain = domain_map.get(domain, 'reading')
+    if isinstance(difficulty, (int, np.integer)):
+        difficulty = diff_map.get(difficulty, 'medium')
+    return domain, difficulty
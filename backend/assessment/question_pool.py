@@ -0,0 +1,170 @@
+"""
+Pregenerated question pools.
+
+QuestionGeneratorModel.generate_question (template choice, random operands,
+distractor loops) would otherwise run inside the request. A QuestionPool
+keeps a queue of ready-made questions for every (domain, difficulty) cell.
+A background thread tops a cell back up to TARGET_DEPTH once it drops to
+LOW_WATERMARK, so the request path only pops an item. An empty cell
+falls back to generating the question synchronously.
+
+Configure with settings.ASSESSMENT_QUESTION_POOL. Off by default, so
+management commands and tests don't start the thread.
+"""
+import logging
+import os
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'TARGET_DEPTH': 32,
+    'LOW_WATERMARK': 8,
+    'REFILL_INTERVAL_S': 1.0,  # periodic check in addition to low-watermark wake-ups
+}
+
+POOL_DOMAINS = ('reading', 'math', 'attention')
+POOL_DIFFICULTIES = ('easy', 'medium', 'hard')
+
+
+class QuestionPool:
+    """
+    Per-process pools of generated questions, one per (domain, difficulty).
+
+    `generate(domain, difficulty)` must return a new question dict
+    (QuestionGeneratorModel.generate_question).
+    """
+
+    def __init__(self, generate: Callable[[str, str], Dict[str, Any]], target_depth: int = 32,
+                 low_watermark: int = 8, refill_interval_s: float = 1.0):
+        self.generate = generate
+        self.target_depth = target_depth
+        self.low_watermark = low_watermark
+        self.refill_interval = refill_interval_s
+        self.pid = os.getpid()
+
+        self._pools = {
+            (domain, difficulty): deque()
+            for domain in POOL_DOMAINS
+            for difficulty in POOL_DIFFICULTIES
+        }
+        self._stats = {cell: {'hits': 0, 'misses': 0, 'generated': 0} for cell in self._pools}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+
+        self._thread = threading.Thread(target=self._run, name='question-pool-refill', daemon=True)
+        self._thread.start()
+
+    def take(self, domain: str, difficulty: str) -> Dict[str, Any]:
+        """Pop a ready-made question, generating one synchronously if the pool is empty."""
+        items = self._pools.get((domain, difficulty))
+        if items is None:
+            # Not a pooled cell (generate_question falls back to another template set)
+            return self.generate(domain, difficulty)
+
+        try:
+            question = items.popleft()
+        except IndexError:
+            question = None
+
+        with self._lock:
+            self._stats[(domain, difficulty)]['hits' if question is not None else 'misses'] += 1
+        if len(items) <= self.low_watermark:
+            self._wake.set()
+
+        if question is None:
+            question = self.generate(domain, difficulty)
+        return question
+
+    def refill(self) -> None:
+        """Top up every cell at or below the low watermark to the target depth."""
+        for cell, items in self._pools.items():
+            if len(items) > self.low_watermark:
+                continue
+            generated = 0
+            while len(items) < self.target_depth and not self._stopped:
+                items.append(self.generate(*cell))
+                generated += 1
+            with self._lock:
+                self._stats[cell]['generated'] += generated
+
+    def _run(self):
+        while not self._stopped:
+            try:
+                self.refill()
+            except Exception:
+                logger.exception("Question pool refill failed")
+            self._wake.wait(self.refill_interval)
+            self._wake.clear()
+
+    def stop(self) -> None:
+        self._stopped = True
+        self._wake.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-cell depth and hit/miss counts."""
+        with self._lock:
+            cells = {
+                f'{domain}/{difficulty}': dict(self._stats[(domain, difficulty)], depth=len(items))
+                for (domain, difficulty), items in self._pools.items()
+            }
+        hits = sum(cell['hits'] for cell in cells.values())
+        misses = sum(cell['misses'] for cell in cells.values())
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+            'cells': cells,
+        }
+
+
+_pool: Optional[QuestionPool] = None
+_pool_lock = threading.Lock()
+
+
+def pool_config() -> Dict[str, Any]:
+    return {**DEFAULTS, **getattr(settings, 'ASSESSMENT_QUESTION_POOL', {})}
+
+
+def get_question_pool(generate: Callable[[str, str], Dict[str, Any]]) -> Optional[QuestionPool]:
+    """Return the process-wide pool (started on first use), or None if pooling is disabled."""
+    global _pool
+    # The refill thread does not survive a fork, so each process starts its own
+    if _pool is not None and _pool.pid == os.getpid():
+        return _pool
+
+    config = pool_config()
+    if not config['ENABLED']:
+        return None
+
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = QuestionPool(
+                generate,
+                target_depth=config['TARGET_DEPTH'],
+                low_watermark=config['LOW_WATERMARK'],
+                refill_interval_s=config['REFILL_INTERVAL_S'],
+            )
+    return _pool
+
+
+def question_pool_stats() -> Optional[Dict[str, Any]]:
+    """Stats of this process's pool, or None if it hasn't been started."""
+    if _pool is None or _pool.pid != os.getpid():
+        return None
+    return _pool.stats()
+
+
+def reset_question_pool() -> None:
+    """Discard pooled questions (e.g. after the question model is reloaded)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.stop()
+        _pool = None
@@ -0,0 +1,223 @@
+"""
+Bulk re-scoring of completed sessions with the current risk model.
+
+`manage.py rescore_sessions` splits the completed sessions into ranges of
+session ids (session_ranges) and hands each range to rescore_range, usually
+in a process pool. For one range, rescore_range:
+
+    1. reads the stored SessionFeatureVector rows of the current
+       FEATURE_SCHEMA_VERSION
+    2. for the sessions without one, streams their UserResponse and
+       MistakePattern rows with iterator() (server-side cursors where the
+       backend has them) and aggregates the 7 risk features with np.bincount
+    3. runs predict_proba once for the whole range (RiskScorer rows)
+    4. updates each session's latest FinalPrediction with one executemany
+       UPDATE, bulk_creates one for sessions that have none, and stores the
+       feature vectors computed in step 2
+
+Memory is bounded by the size of one range. The features are the ones
+EndSessionView computes from SessionStats. Each response counts its first
+MistakePattern, as rebuild_session_stats does.
+"""
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+from django.db import connection, transaction
+
+from .ml_utils import RISK_ACCURACY_GROUPS, RISK_FEATURES, get_prediction, load_risk_scorer, risk_result
+from .models import FinalPrediction, MistakePattern, Session, SessionFeatureVector, UserResponse
+from .session_features import FEATURE_SCHEMA_VERSION, IMPULSE_THRESHOLD_MS
+
+# Rows fetched per round trip while streaming
+CURSOR_CHUNK = 5000
+
+# Mistake codes in risk_feature_matrix
+MISTAKE_CODES = {'letter_reversal': 1, 'number_reversal': 2, 'substitution': 2}
+
+PREDICTION_FIELDS = ['dyslexia_risk_score', 'dyscalculia_risk_score', 'attention_risk_score',
+                     'final_label', 'key_insights', 'confidence_level']
+
+
+def session_ranges(chunk_size: int) -> Iterator[Tuple[str, str]]:
+    """(first, last) session ids of consecutive chunks of completed sessions, by keyset pagination."""
+    completed = Session.objects.filter(completed=True).order_by('session_id')
+    last = None
+    while True:
+        page = completed if last is None else completed.filter(session_id__gt=last)
+        ids = list(page.values_list('session_id', flat=True)[:chunk_size])
+        if not ids:
+            return
+        yield ids[0], ids[-1]
+        last = ids[-1]
+
+
+def risk_feature_matrix(session: np.ndarray, group: np.ndarray, correct: np.ndarray, time_ms: np.ndarray,
+                        mistake: np.ndarray, n_sessions: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    The 7 risk features of many sessions from their responses, grouped with np.bincount.
+
+    Args:
+        session: Session index of each response
+        group: Accuracy group of each response (RISK_ACCURACY_GROUPS, -1 for none)
+        correct: Outcome of each response (bool)
+        time_ms: Response time of each response
+        mistake: MISTAKE_CODES value of each response's mistake (0 for none)
+        n_sessions: Number of sessions
+
+    Returns:
+        (features, totals) - (n_sessions, 7) in RISK_FEATURES order, and the
+        number of responses per session
+    """
+    total = np.bincount(session, minlength=n_sessions)
+    safe_total = np.maximum(total, 1)
+    features = np.empty((n_sessions, len(RISK_FEATURES)))
+
+    for g in range(3):
+        in_group = group == g
+        answered = np.bincount(session, in_group, minlength=n_sessions)
+        right = np.bincount(session, in_group & correct, minlength=n_sessions)
+        features[:, g] = np.where(answered > 0, right / np.maximum(answered, 1), 0.5)
+
+    features[:, 3] = np.bincount(session, time_ms, minlength=n_sessions) / safe_total
+    features[:, 4] = np.bincount(session, mistake == 1, minlength=n_sessions) / safe_total
+    features[:, 5] = np.bincount(session, mistake == 2, minlength=n_sessions) / safe_total
+    features[:, 6] = np.bincount(session, ~correct & (time_ms < IMPULSE_THRESHOLD_MS), minlength=n_sessions) / safe_total
+    return features, total
+
+
+def rescore_range(first_session_id: str, last_session_id: str, dry_run: bool = False) -> Dict[str, int]:
+    """
+    Re-score the completed sessions with ids in [first_session_id, last_session_id].
+
+    Returns:
+        Counts: sessions, updated, created, changed (sessions whose label
+        changed), features_computed (sessions whose features were rebuilt
+        from their answers)
+    """
+    sessions = Session.objects.filter(completed=True, session_id__range=(first_session_id, last_session_id))
+    users = dict(sessions.values_list('session_id', 'user_id'))
+    index = {session_id: i for i, session_id in enumerate(users)}
+
+    stored = {}
+    for session_id, total, *values in SessionFeatureVector.objects.filter(
+        session__in=sessions, schema_version=FEATURE_SCHEMA_VERSION
+    ).values_list('session_id', 'total', *RISK_FEATURES).iterator(chunk_size=CURSOR_CHUNK):
+        stored[session_id] = (total, values)
+    missing = sessions.exclude(feature_vector__schema_version=FEATURE_SCHEMA_VERSION)
+
+    first_mistake = {}
+    session, group, correct, time_ms, mistake = [], [], [], [], []
+    if len(stored) < len(index):
+        for response_id, mistake_type in MistakePattern.objects.filter(
+            response__session__in=missing
+        ).order_by('mistake_id').values_list('response_id', 'mistake_type').iterator(chunk_size=CURSOR_CHUNK):
+            first_mistake.setdefault(response_id, mistake_type)
+
+        for response_id, session_id, domain, is_correct, response_time_ms in UserResponse.objects.filter(
+            session__in=missing
+            ).values_list('response_id', 'session_id', 'domain', 'correct', 'response_time_ms').iterator(
+            chunk_size=CURSOR_CHUNK
+        ):
+            session.append(index[session_id])
+            group.append(RISK_ACCURACY_GROUPS.get(domain, -1))
+            correct.append(is_correct)
+            time_ms.append(response_time_ms)
+            mistake.append(MISTAKE_CODES.get(first_mistake.get(response_id), 0))
+
+    features, totals = risk_feature_matrix(
+        np.array(session, dtype=np.int64), np.array(group, dtype=np.int64), np.array(correct, dtype=bool),
+        np.array(time_ms, dtype=np.float64), np.array(mistake, dtype=np.int64), len(index),
+    )
+    for session_id, (total, values) in stored.items():
+        features[index[session_id]] = values
+        totals[index[session_id]] = total
+    results = _score(features, totals)
+
+    vectors = [
+        SessionFeatureVector(session_id=session_id, user_id=users[session_id], schema_version=FEATURE_SCHEMA_VERSION,
+                             total=int(totals[i]), **dict(zip(RISK_FEATURES, features[i].tolist())))
+        for session_id, i in index.items()
+        if session_id not in stored and totals[i]
+    ]
+
+    # Latest prediction of each session (ordered, so the last one wins)
+    latest = {}
+    for session_id, prediction_id, final_label in FinalPrediction.objects.filter(
+        session__in=sessions
+    ).order_by('session_id', 'prediction_id').values_list('session_id', 'prediction_id', 'final_label').iterator(
+        chunk_size=CURSOR_CHUNK
+    ):
+        latest[session_id] = (prediction_id, final_label)
+
+    updates: List[FinalPrediction] = []
+    creates: List[FinalPrediction] = []
+    changed = 0
+    for session_id, i in index.items():
+        result = results[i]
+        fields = {
+            'dyslexia_risk_score': result['scores']['dyslexia'],
+            'dyscalculia_risk_score': result['scores']['dyscalculia'],
+            'attention_risk_score': result['scores']['attention'],
+            'final_label': result['risk'],
+            'key_insights': result['key_insights'],
+            'confidence_level': result['confidence_level'],
+        }
+        if session_id in latest:
+            prediction_id, old_label = latest[session_id]
+            changed += old_label != result['risk']
+            updates.append(FinalPrediction(prediction_id=prediction_id, **fields))
+        else:
+            creates.append(FinalPrediction(session_id=session_id, user_id=users[session_id], **fields))
+
+    if not dry_run:
+        with transaction.atomic():
+            _update_predictions(updates)
+            FinalPrediction.objects.bulk_create(creates, batch_size=500)
+            # Replaces the vectors of older schema versions
+            SessionFeatureVector.objects.filter(session_id__in=[vector.session_id for vector in vectors]).delete()
+            SessionFeatureVector.objects.bulk_create(vectors, batch_size=500)
+    return {'sessions': len(index), 'updated': len(updates), 'created': len(creates), 'changed': changed,
+            'features_computed': len(vectors)}
+
+
+def _update_predictions(predictions: List[FinalPrediction]) -> None:
+    """
+    Write PREDICTION_FIELDS of existing rows with one executemany UPDATE by
+    primary key. bulk_update builds a CASE per field and row, which is
+    several times slower at this size.
+    """
+    if not predictions:
+        return
+    meta = FinalPrediction._meta
+    fields = [meta.get_field(name) for name in PREDICTION_FIELDS]
+    quote = connection.ops.quote_name
+    sql = (f"UPDATE {quote(meta.db_table)} SET {', '.join(f'{quote(field.column)} = %s' for field in fields)} "
+           f"WHERE {quote(meta.pk.column)} = %s")
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            [field.get_db_prep_save(getattr(prediction, field.attname), connection) for field in fields]
+            + [prediction.pk]
+            for prediction in predictions
+        ])
+
+
+def _score(features: np.ndarray, totals: np.ndarray) -> List[Dict]:
+    """Prediction results for a feature matrix: one predict_proba call for every session with answers."""
+    results = [None] * len(features)
+    scored = np.flatnonzero(totals > 0)
+    if len(scored):
+        scorer = load_risk_scorer()
+        columns = [RISK_FEATURES.index(name) for name in scorer.columns]
+        rows = features[scored][:, columns].astype(np.float32)
+        if scorer.has_proba:
+            probs = scorer.predict_proba(rows)
+            labels = scorer.classes[np.argmax(probs, axis=1)]
+        else:
+            # e.g. PlaceholderPredictionModel: labels only, default confidence
+            labels = scorer.estimator.predict(rows)
+            probs = [None] * len(scored)
+        for i, label, row_probs in zip(scored, labels, probs):
+            results[i] = risk_result(dict(zip(RISK_FEATURES, features[i])), label, row_probs)
+
+    empty = get_prediction([])
+    return [result if result is not None else empty for result in results]
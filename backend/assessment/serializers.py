@@ -22,6 +22,7 @@ class GetNextQuestionRequestSerializer(serializers.Serializer):
     last_question_id = serializers.CharField(required=False, allow_null=True, allow_blank=True)
     correct = serializers.BooleanField(required=False, allow_null=True)
     response_time_ms = serializers.IntegerField(required=False, allow_null=True)
+    prefetch = serializers.BooleanField(required=False, default=False)
 
 
 class QuestionResponseSerializer(serializers.Serializer):
@@ -52,6 +53,11 @@ class SubmitAnswerResponseSerializer(serializers.Serializer):
     response_id = serializers.IntegerField()
 
 
+class AnswerAndNextRequestSerializer(SubmitAnswerRequestSerializer):
+    """Request serializer for the combined answer-and-next call (same fields as submit-answer)."""
+    prefetch = serializers.BooleanField(required=False, default=False)
+
+
 class EndSessionRequestSerializer(serializers.Serializer):
     """Request serializer for ending a session."""
     user_id = serializers.IntegerField()
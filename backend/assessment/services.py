@@ -0,0 +1,463 @@
+"""
+Request-independent pieces of the assessment endpoints.
+
+SubmitAnswerView, GetNextQuestionView and the combined AnswerAndNextView all
+go through these functions, so the answer-storing and question-selection
+logic lives in one place.
+"""
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from django.db import IntegrityError, transaction
+from rest_framework import status
+
+from .adaptive_logic import get_adaptive_question
+from .irt import ItemBank, answer_item_id, get_item_bank, irt_config
+from .ml import generate_question, load_question_model, predict_next_question
+from .models import GeneratedQuestion, Question, UserResponse, MistakePattern, Session, SessionStats, User
+from .question_bank import current_question_bank, get_question_bank
+from .question_catalog import generated_question_id, get_catalog, new_seed, parse_generated_question_id
+from .session_state import advance_snapshot, prefetch_key, record_answer
+from .state_store import get_state_store
+from .stopping import stop_reason
+
+logger = logging.getLogger(__name__)
+
+# Speculative prefetch: answers at or under PREFETCH_FAST_MS count as fast.
+# Each branch is predicted with a representative response time.
+PREFETCH_FAST_MS = 3000
+PREFETCH_BRANCHES = (
+    ('correct_fast', True, 1500),
+    ('incorrect_or_slow', False, 4500),
+)
+
+
+def mistake_severity(mistake_type: str) -> str:
+    """Severity stored with a MistakePattern."""
+    if mistake_type in ['letter_reversal', 'number_reversal']:
+        return 'high'
+    elif mistake_type in ['spelling_error', 'calculation_error']:
+        return 'medium'
+    return 'low'
+
+
+def store_answer(session: Session, user: User, data: Dict[str, Any]) -> Tuple[UserResponse, SessionStats]:
+    """
+    Store one answer: UserResponse, MistakePattern (incorrect answers only)
+    and the session's running aggregates.
+
+    Must be called inside a transaction.
+
+    Args:
+        session: Session being answered
+        user: User giving the answer
+        data: Validated SubmitAnswerRequestSerializer data
+
+    Returns:
+        (user_response, stats) - stats is the session's updated SessionStats row
+    """
+    # Generated questions are referenced by the seed in their id, without a lookup
+    seed = parse_generated_question_id(data['question_id'])
+    question = None
+    if seed is None:
+        bank = get_question_bank()
+        try:
+            question = bank.get(data['question_id']) if bank is not None else None
+            if question is None:
+                question = Question.objects.get(question_id=data['question_id'])
+        except Question.DoesNotExist:
+            # Create question if it doesn't exist (for testing). bulk_create sends no post_save, so
+            # an unknown id doesn't make every session in the process reload the question bank.
+            logger.warning("Unknown question %s answered, storing a placeholder question", data['question_id'])
+            question = Question(
+                question_id=data['question_id'],
+                domain=data['domain'],
+                difficulty=data['difficulty'],
+                question_text='Test question',
+                options=['a', 'b', 'c', 'd'],
+                correct_option='a'
+            )
+            # A concurrent answer may have stored the same placeholder
+            Question.objects.bulk_create([question], ignore_conflicts=True)
+
+    user_response = UserResponse.objects.create(
+        session=session,
+        user=user,
+        question=question,
+        generated_question_id=seed,
+        domain=data['domain'],
+        difficulty=data['difficulty'],
+        correct=data['correct'],
+        response_time_ms=data['response_time_ms'],
+        confidence=data.get('confidence')
+    )
+
+    # Create mistake pattern if provided and answer is incorrect
+    mistake_type = data.get('mistake_type')
+    if mistake_type and not data['correct']:
+        MistakePattern.objects.create(
+            response=user_response,
+            mistake_type=mistake_type,
+            severity=mistake_severity(mistake_type)
+        )
+
+    # The IRT item costs a lookup for generated questions, so it is only resolved while IRT is enabled
+    item_id = answer_item_id(data['question_id']) if irt_config()['ENABLED'] else None
+
+    # Keep the session's running aggregates in step with its responses
+    stats = record_answer(
+        session,
+        data['domain'],
+        data['difficulty'],
+        data['correct'],
+        data['response_time_ms'],
+        mistake_type,
+        data['question_id'],
+        item_id
+    )
+
+    # Keep the session's answered set in the question bank current
+    bank = current_question_bank()
+    if bank is not None:
+        bank.record_answer(session.session_id, question.question_id if question else None, stats.total)
+    return user_response, stats
+
+
+def question_features(snapshot: Dict[str, Any], correct: Optional[bool],
+                      response_time_ms: Optional[int]) -> np.ndarray:
+    """
+    Question model input for the next question of a session.
+
+    Returns:
+        1x7 array [last_correct, last_response_time, diff_easy, diff_medium,
+        diff_hard, session_accuracy, current_domain]
+    """
+    # Only 3 domains for assessment: reading, math, attention
+    domain_map = {'reading': 0, 'math': 1, 'attention': 2}
+
+    total_responses = snapshot['total']
+    if total_responses > 0:
+        is_correct = 1 if correct else 0
+        time_ms = response_time_ms if response_time_ms is not None else 2000
+        last_diff = snapshot['last_difficulty']
+        d_easy = 1 if last_diff == 'easy' else 0
+        d_medium = 1 if last_diff == 'medium' else 0
+        d_hard = 1 if last_diff == 'hard' else 0
+        session_accuracy = snapshot['correct'] / total_responses
+        cur_domain = domain_map.get(snapshot['last_domain'], 0)
+    else:
+        # First question defaults
+        is_correct = 1
+        time_ms = 0
+        d_easy, d_medium, d_hard = 1, 0, 0
+        session_accuracy = 1.0
+        cur_domain = 0
+
+    return np.array([[
+        is_correct,
+        time_ms,
+        d_easy,
+        d_medium,
+        d_hard,
+        session_accuracy,
+        cur_domain
+    ]])
+
+
+def select_next_question(snapshot: Dict[str, Any], correct: Optional[bool] = None,
+                         response_time_ms: Optional[int] = None,
+                         last_question_id: Optional[str] = None,
+                         prefetch: bool = False) -> Tuple[Dict[str, Any], int]:
+    """
+    Pick the next question for a session from its snapshot.
+
+    Args:
+        snapshot: Session snapshot (see session_state.get_session_snapshot)
+        correct, response_time_ms: Outcome of the last answer
+        last_question_id: Only used by the database fallback
+        prefetch: Also return the question after this one for both answer
+            outcomes (see prefetch_candidates). Not done with IRT selection.
+
+    Returns:
+        (response_data, http_status) - the question payload, or an
+        end_session message once the session is complete
+    """
+    session_id = snapshot['session_id']
+
+    # IRT selection (if enabled) replaces both the model and the rule-based fallback
+    item_bank = get_item_bank()
+    if item_bank is not None:
+        issued = []
+        response_data = _irt_question_payload(item_bank, snapshot, issued)
+        save_generated_questions(issued)
+        return response_data, status.HTTP_200_OK
+
+    # Shared, process-wide model instance (loaded once, see model_registry)
+    generator = load_question_model()
+
+    if generator is None:
+        # Fallback to database if generator not found
+        question = get_adaptive_question(
+            session_id=session_id,
+            last_question_id=last_question_id,
+            correct=correct,
+            response_time_ms=response_time_ms,
+            total_responses=snapshot['total'],
+            age_group=snapshot.get('age_group') or ''
+        )
+
+        if not question:
+            return {'message': 'No more questions available', 'end_session': True}, status.HTTP_200_OK
+
+        return {
+            'question_id': question.question_id,
+            'domain': question.domain,
+            'difficulty': question.difficulty,
+            'question_text': question.question_text,
+            'options': question.options
+        }, status.HTTP_200_OK
+
+    features = question_features(snapshot, correct, response_time_ms)
+
+    # Predict next domain and difficulty
+    prediction = predict_next_question(generator, features)
+    next_domain, next_difficulty = _next_target(snapshot, prediction)
+
+    # Generated questions served by this call, recorded together at the end
+    issued = []
+
+    # A candidate sent with the previous question is reused if the model agrees with it
+    candidate, candidate_generated = take_prefetched_question(snapshot, correct, response_time_ms)
+    if candidate is not None and _candidate_matches(candidate, snapshot, next_domain, next_difficulty):
+        logger.debug("Prefetched question confirmed for %s", session_id)
+        response_data = dict(candidate, prefetch_confirmed=True)
+        # Served now, so its GeneratedQuestion row is written now
+        issued.extend(candidate_generated)
+    else:
+        response_data = _question_payload(generator, snapshot, next_domain, next_difficulty, issued)
+        if candidate is not None:
+            response_data['prefetch_confirmed'] = False
+
+    if prefetch and not response_data.get('end_session'):
+        response_data['prefetch'] = prefetch_candidates(generator, snapshot, response_data)
+
+    save_generated_questions(issued)
+    return response_data, status.HTTP_200_OK
+
+
+def _next_target(snapshot: Dict[str, Any], prediction: np.ndarray) -> Tuple[str, str]:
+    """Turn a model prediction row into (domain, difficulty), applying domain rotation."""
+    # Parse prediction (returns [[domain, difficulty]])
+    if len(prediction.shape) == 2 and prediction.shape[1] == 2:
+        next_domain_idx = int(prediction[0][0])
+        next_diff_idx = int(prediction[0][1])
+    else:
+        # Fallback
+        next_domain_idx = 0
+        next_diff_idx = 1
+
+    # Map indices to names (only 3 domains)
+    domain_names = {0: 'reading', 1: 'math', 2: 'attention'}
+    diff_names = {0: 'easy', 1: 'medium', 2: 'hard'}
+
+    # Apply domain rotation to ensure variety
+    domain_counts = dict(snapshot['domain_counts'])
+    predicted_domain = domain_names.get(next_domain_idx, 'reading')
+
+    # If predicted domain has appeared 3+ times more than another domain, rotate
+    min_count = min(domain_counts.values()) if domain_counts else 0
+
+    if domain_counts.get(predicted_domain, 0) >= min_count + 3:
+        # Force rotation to least-used domain
+        next_domain = min(domain_counts, key=domain_counts.get)
+        logger.debug("Rotating domain from %s to %s for balance", predicted_domain, next_domain)
+    else:
+        next_domain = predicted_domain
+
+    next_difficulty = diff_names.get(next_diff_idx, 'medium')
+
+    logger.debug("Model prediction - Domain: %s(%s), Difficulty: %s(%s)",
+                 next_domain_idx, predicted_domain, next_diff_idx, next_difficulty)
+    logger.debug("Domain counts: %s, Final choice: %s", domain_counts, next_domain)
+
+    return next_domain, next_difficulty
+
+
+def _question_payload(generator, snapshot: Dict[str, Any], domain: str, difficulty: str,
+                      issued: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Generate the question payload, or the end_session message once the session is complete.
+
+    The generated question is appended to `issued` (see save_generated_questions).
+    """
+    complete = _session_complete(snapshot)
+    if complete is not None:
+        return complete
+
+    # 🎯 GENERATE QUESTION DYNAMICALLY using the model
+    question_data = generate_question(generator, domain, difficulty)
+    issued.append(question_data)
+
+    return {
+        'question_id': generated_question_id(question_data['seed']),
+        'domain': question_data['domain'],
+        'difficulty': question_data['difficulty'],
+        'question_text': question_data['question_text'],
+        'options': question_data['options'],
+        'correct_option': question_data['correct_option']  # Include for answer validation
+    }
+
+
+def _session_complete(snapshot: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The end_session message once the session is complete, else None (see stopping.py)."""
+    reason = stop_reason(snapshot)
+    if reason is None:
+        return None
+    return {
+        'message': 'Assessment complete! Generating your results...',
+        'end_session': True,
+        'total_questions': snapshot['total'],
+        'stop_reason': reason
+    }
+
+
+def _irt_question_payload(item_bank: ItemBank, snapshot: Dict[str, Any],
+                          issued: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Question payload for the most informative unanswered item (see irt.py),
+    generated from its catalog template. The question is appended to `issued`.
+    """
+    complete = _session_complete(snapshot)
+    if complete is not None:
+        return complete
+
+    template_id = item_bank.next_item(snapshot.get('irt_responses') or {})
+    if template_id is None:
+        return {'message': 'No more questions available', 'end_session': True}
+
+    catalog = get_catalog()
+    template = catalog.get(template_id)
+    seed = new_seed()
+    question_text, options, correct_idx = catalog.generate(template_id, seed)
+    issued.append({'template_id': template_id, 'seed': seed})
+    logger.debug("IRT item %s for %s", template_id, snapshot['session_id'])
+
+    return {
+        'question_id': generated_question_id(seed),
+        'domain': template.domain,
+        'difficulty': template.difficulty,
+        'question_text': question_text,
+        'options': options,
+        'correct_option': options[correct_idx]  # Include for answer validation
+    }
+
+
+def prefetch_candidates(generator, snapshot: Dict[str, Any], question: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Compute the question that follows `question` for both answer outcomes.
+
+    Both branches go through one predict call on a 2-row matrix. The
+    candidates are kept in the state store so the next request can confirm
+    the branch that was actually taken. A candidate's GeneratedQuestion row
+    is only written once it is confirmed (see take_prefetched_question).
+
+    Returns:
+        {'correct_fast': payload, 'incorrect_or_slow': payload}
+    """
+    advanced = [
+        advance_snapshot(snapshot, question['domain'], question['difficulty'], branch_correct,
+                         question['question_id'])
+        for _, branch_correct, _ in PREFETCH_BRANCHES
+    ]
+
+    generated = {name: [] for name, _, _ in PREFETCH_BRANCHES}
+    if all(stop_reason(branch_snapshot) == 'max_items' for branch_snapshot in advanced):
+        # Either way the session ends after this question
+        candidates = {
+            name: _question_payload(generator, branch_snapshot, None, None, generated[name])
+            for (name, _, _), branch_snapshot in zip(PREFETCH_BRANCHES, advanced)
+        }
+    else:
+        features = np.vstack([
+            question_features(branch_snapshot, branch_correct, branch_time_ms)
+            for (_, branch_correct, branch_time_ms), branch_snapshot in zip(PREFETCH_BRANCHES, advanced)
+        ])
+        prediction = predict_next_question(generator, features)
+        candidates = {}
+        for row, (name, _, _), branch_snapshot in zip(prediction, PREFETCH_BRANCHES, advanced):
+            domain, difficulty = _next_target(branch_snapshot, row[None, :])
+            candidates[name] = _question_payload(generator, branch_snapshot, domain, difficulty, generated[name])
+
+    # Keyed by the session total once `question` is answered, so stale candidates are never confirmed
+    get_state_store().set(prefetch_key(snapshot['session_id']), {
+        'total': snapshot['total'] + 1,
+        'candidates': candidates,
+        'generated': {
+            name: [{'template_id': item['template_id'], 'seed': item['seed']} for item in items]
+            for name, items in generated.items()
+        },
+    })
+    return candidates
+
+
+def _candidate_matches(candidate: Dict[str, Any], snapshot: Dict[str, Any],
+                       domain: str, difficulty: str) -> bool:
+    """Whether a prefetched candidate is what the model picks now."""
+    reason = stop_reason(snapshot)
+    if reason is not None:
+        return bool(candidate.get('end_session')) and candidate.get('stop_reason') == reason
+    return (not candidate.get('end_session')
+            and (candidate.get('domain'), candidate.get('difficulty')) == (domain, difficulty))
+
+
+def take_prefetched_question(snapshot: Dict[str, Any], correct: Optional[bool],
+                             response_time_ms: Optional[int]) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Pop the stored candidate for the branch the last answer took.
+
+    Returns:
+        (candidate, generated) - the candidate payload (None if nothing was
+        prefetched for this point of the session) and the (template_id, seed)
+        of its generated question, to save if the candidate is served
+    """
+    if correct is None or response_time_ms is None:
+        return None, []
+
+    store = get_state_store()
+    key = prefetch_key(snapshot['session_id'])
+    prefetched = store.get(key)
+    if prefetched is None:
+        return None, []
+    store.delete(key)
+    if prefetched['total'] != snapshot['total']:
+        return None, []
+
+    branch = 'correct_fast' if correct and response_time_ms <= PREFETCH_FAST_MS else 'incorrect_or_slow'
+    return prefetched['candidates'].get(branch), prefetched.get('generated', {}).get(branch, [])
+
+
+def save_generated_questions(questions: List[Dict[str, Any]]) -> None:
+    """
+    Record served generated questions as (template_id, seed) rows, in one INSERT.
+
+    Only the template and seed are stored; GeneratedQuestion.regenerate()
+    rebuilds the text and options. A seed that is already stored (a 63-bit
+    collision) keeps its existing row and is logged.
+    """
+    if not questions:
+        return
+    version = get_catalog().version
+    rows = [
+        GeneratedQuestion(seed=question['seed'], template_id=question['template_id'], catalog_version=version)
+        for question in questions
+    ]
+    try:
+        # bulk_create runs in a transaction anyway; inside the caller's (answer-and-next) this is a
+        # savepoint, so a collision doesn't abort it
+        with transaction.atomic():
+            GeneratedQuestion.objects.bulk_create(rows)
+    except IntegrityError:
+        logger.warning("Generated question seed collision among %s; existing rows kept",
+                       [generated_question_id(row.seed) for row in rows])
+        GeneratedQuestion.objects.bulk_create(rows, ignore_conflicts=True)
@@ -0,0 +1,273 @@
+"""
+Per-session features shared by the risk model, the placeholder models and
+the dashboard.
+
+SessionFeatures reads a session's answers into a structured NumPy array
+(RECORD_DTYPE: domain code, correct, response time, mistake code,
+confidence code) and aggregates it with np.bincount in one vectorized pass:
+answers, correct answers, time and mistakes per domain, plus the
+session-wide time sum of squares, impulsive answers and confidence
+mismatches. Every feature is read from these aggregates:
+
+    risk_features()   - the 7 risk model inputs (ml_utils.RISK_FEATURES)
+    model_features()  - the 1 x 8 MODEL_FEATURES row (ml_utils.extract_features)
+    domain_groups()   - accuracy, mean time and most common mistake per
+                        DOMAIN_GROUPS group (the dashboard's domain patterns)
+
+SessionFeatures.from_stats fills the same aggregates from a SessionStats
+row, so readers that only have the running aggregates get the same
+features without loading the answers.
+"""
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# Domain codes (index); any other domain gets OTHER_DOMAIN
+DOMAINS = ('reading', 'writing', 'math', 'attention', 'focus')
+DOMAIN_CODES = {domain: code for code, domain in enumerate(DOMAINS)}
+OTHER_DOMAIN = len(DOMAINS)
+
+# Reported domain groups: writing pools with reading, attention with focus
+DOMAIN_GROUPS = ('reading', 'math', 'focus')
+# DOMAIN_GROUPS x domain code one-hot (OTHER_DOMAIN belongs to no group)
+GROUP_MATRIX = np.array([
+    [1, 1, 0, 0, 0, 0],
+    [0, 0, 1, 0, 0, 0],
+    [0, 0, 0, 1, 1, 0],
+])
+
+CONFIDENCE_CODES = {'low': 1, 'medium': 2, 'high': 3}
+
+# Version of risk_features() stored in SessionFeatureVector; bump it when a feature's definition changes
+FEATURE_SCHEMA_VERSION = 1
+
+# Incorrect answers faster than this count as impulsive
+IMPULSE_THRESHOLD_MS = 1000
+
+# Response time assumed for answers without one
+DEFAULT_TIME_MS = 2000
+
+RECORD_DTYPE = np.dtype([
+    ('domain', np.uint8),
+    ('correct', np.bool_),
+    ('time_ms', np.float64),
+    ('mistake', np.uint16),  # 0 = none, i = mistake_types[i - 1]
+    ('confidence', np.uint8),  # CONFIDENCE_CODES, 0 = not given
+])
+
+# Columns of model_features()
+MODEL_FEATURES = ('accuracy', 'avg_response_time', 'error_rate', 'consistency',
+                  'reading_accuracy', 'math_accuracy', 'letter_reversal_count', 'confidence_mismatch')
+
+# model_features() of a session without answers
+DEFAULT_MODEL_FEATURES = (0.5, 2000, 0.5, 500, 0.5, 0.5, 0, 0)
+
+
+class SessionFeatures:
+    """
+    Aggregates of one session's answers and the features derived from them.
+
+    Build with from_responses, from_records or from_stats rather than
+    directly. domain_count, domain_correct and domain_time are indexed by
+    domain code; domain_mistakes is domain code x mistake code, and
+    mistake_order (same shape) is the position at which each pair was first
+    seen (inf if never), which breaks ties between equally common mistakes.
+    """
+
+    def __init__(self, domain_count: np.ndarray, domain_correct: np.ndarray, domain_time: np.ndarray,
+                 domain_mistakes: np.ndarray, mistake_order: np.ndarray, mistake_types: List[str],
+                 time_sq_sum: float, impulse_count: int, confidence_mismatch: int = 0):
+        self.domain_count = domain_count
+        self.domain_correct = domain_correct
+        self.domain_time = domain_time
+        self.domain_mistakes = domain_mistakes
+        self.mistake_order = mistake_order
+        self.mistake_types = mistake_types
+        self.time_sq_sum = time_sq_sum
+        self.impulse_count = impulse_count
+        self.confidence_mismatch = confidence_mismatch
+        self.total = int(domain_count.sum())
+        self.correct = int(domain_correct.sum())
+        self.mistake_totals = dict(zip(mistake_types, domain_mistakes[:, 1:].sum(axis=0).tolist()))
+
+    @classmethod
+    def from_records(cls, records: np.ndarray, mistake_types: List[str]) -> 'SessionFeatures':
+        """Aggregate a RECORD_DTYPE array (mistake codes index into mistake_types)."""
+        n_domains, n_mistakes = OTHER_DOMAIN + 1, len(mistake_types) + 1
+        domain = records['domain'].astype(np.intp)
+        correct = records['correct']
+        time_ms = records['time_ms']
+        confidence = records['confidence']
+
+        pairs = domain * n_mistakes + records['mistake']
+        domain_mistakes = np.bincount(pairs, minlength=n_domains * n_mistakes).reshape(n_domains, n_mistakes)
+        mistake_order = np.full((n_domains, n_mistakes), np.inf)
+        seen, first = np.unique(pairs, return_index=True)
+        mistake_order.flat[seen] = first
+        return cls(
+            domain_count=np.bincount(domain, minlength=n_domains),
+            domain_correct=np.bincount(domain, correct, minlength=n_domains),
+            domain_time=np.bincount(domain, time_ms, minlength=n_domains),
+            domain_mistakes=domain_mistakes,
+            mistake_order=mistake_order,
+            mistake_types=mistake_types,
+            time_sq_sum=float(time_ms @ time_ms),
+            impulse_count=int(np.count_nonzero(~correct & (time_ms < IMPULSE_THRESHOLD_MS))),
+            confidence_mismatch=int(np.count_nonzero(
+                np.where(correct, confidence == CONFIDENCE_CODES['low'], confidence == CONFIDENCE_CODES['high'])
+            )),
+        )
+
+    @classmethod
+    def from_responses(cls, responses: List[Dict[str, Any]]) -> 'SessionFeatures':
+        """
+        Aggregate a list of response dictionaries.
+
+        Keys: domain, correct, response_time_ms (DEFAULT_TIME_MS if missing),
+        mistake_type and confidence (both optional).
+        """
+        mistake_codes = {}
+        records = np.array([
+            (
+                DOMAIN_CODES.get(r.get('domain'), OTHER_DOMAIN),
+                bool(r.get('correct')),
+                r.get('response_time_ms', DEFAULT_TIME_MS),
+                _code(mistake_codes, r.get('mistake_type')),
+                CONFIDENCE_CODES.get(r.get('confidence'), 0),
+            )
+            for r in responses
+        ], dtype=RECORD_DTYPE)
+        return cls.from_records(records, list(mistake_codes))
+
+    @classmethod
+    def from_stats(cls, stats) -> 'SessionFeatures':
+        """
+        Aggregates of a SessionStats row (no response scan).
+
+        SessionStats doesn't keep answer confidence, so confidence_mismatch
+        is 0.
+        """
+        mistake_codes = {}
+        for entry in stats.domain_stats.values():
+            for mistake_type in entry['mistakes']:
+                _code(mistake_codes, mistake_type)
+
+        n_domains = OTHER_DOMAIN + 1
+        domain_count = np.zeros(n_domains, dtype=np.int64)
+        domain_correct = np.zeros(n_domains)
+        domain_time = np.zeros(n_domains)
+        domain_mistakes = np.zeros((n_domains, len(mistake_codes) + 1), dtype=np.int64)
+        mistake_order = np.full(domain_mistakes.shape, np.inf)
+        position = 0
+        for domain, entry in stats.domain_stats.items():
+            code = DOMAIN_CODES.get(domain, OTHER_DOMAIN)
+            domain_count[code] += entry['count']
+            domain_correct[code] += entry['correct']
+            domain_time[code] += entry['time_ms']
+            for mistake_type, count in entry['mistakes'].items():
+                mistake = mistake_codes[mistake_type]
+                domain_mistakes[code, mistake] += count
+                mistake_order[code, mistake] = min(mistake_order[code, mistake], position)
+                position += 1
+
+        return cls(domain_count, domain_correct, domain_time, domain_mistakes, mistake_order, list(mistake_codes),
+                   float(stats.response_time_sq_sum), stats.impulse_count)
+
+    @property
+    def avg_time_ms(self) -> float:
+        return float(self.domain_time.sum()) / self.total
+
+    @property
+    def time_std(self) -> float:
+        """Population standard deviation of the response times."""
+        mean = self.avg_time_ms
+        return float(np.sqrt(max(self.time_sq_sum / self.total - mean * mean, 0.0)))
+
+    def accuracy(self, *domains: str, default: float = 0.5) -> float:
+        """Pooled accuracy over the given domains (all answers if none given), default without answers."""
+        codes = [DOMAIN_CODES[domain] for domain in domains] if domains else slice(None)
+        answered = self.domain_count[codes].sum()
+        return float(self.domain_correct[codes].sum()) / answered if answered else default
+
+    def group_accuracy(self, default: float = 0.5) -> np.ndarray:
+        """Accuracy of each DOMAIN_GROUPS group, default for a group without answers."""
+        answered = GROUP_MATRIX @ self.domain_count
+        right = GROUP_MATRIX @ self.domain_correct
+        return np.where(answered > 0, right / np.maximum(answered, 1), default)
+
+    def mistake_count(self, *mistake_types: str) -> int:
+        """Number of answers with any of the given mistake types."""
+        return sum(self.mistake_totals.get(mistake_type, 0) for mistake_type in mistake_types)
+
+    def risk_features(self) -> Dict[str, float]:
+        """
+        The 7 risk_classifier features of a session with answers.
+
+        Features: reading_acc, math_acc, focus_acc (0.5 without answers in the
+        domain group), avg_time_ms, rev_rate (letter_reversal mistakes), pv_rate
+        (number_reversal / substitution mistakes), impulse_rate (incorrect in
+        under IMPULSE_THRESHOLD_MS).
+        """
+        total = self.total
+        reading_acc, math_acc, focus_acc = self.group_accuracy().tolist()
+        return {
+            "reading_acc": reading_acc,
+            "math_acc": math_acc,
+            "focus_acc": focus_acc,
+            "avg_time_ms": self.avg_time_ms,
+            "rev_rate": self.mistake_count('letter_reversal') / total,
+            "pv_rate": self.mistake_count('number_reversal', 'substitution') / total,
+            "impulse_rate": self.impulse_count / total,
+        }
+
+    def model_features(self) -> np.ndarray:
+        """1 x 8 row of MODEL_FEATURES (DEFAULT_MODEL_FEATURES without answers)."""
+        if not self.total:
+            return np.array([DEFAULT_MODEL_FEATURES])
+
+        accuracy = self.correct / self.total
+        return np.array([[
+            accuracy,
+            self.avg_time_ms,
+            1 - accuracy,
+            self.time_std if self.total > 1 else 500,
+            self.accuracy('reading'),
+            self.accuracy('math'),
+            self.mistake_count('letter_reversal'),
+            self.confidence_mismatch,
+        ]])
+
+    def domain_groups(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Per DOMAIN_GROUPS group: answers, accuracy (0-1), avg_time_ms and
+        common_mistake (the most frequent mistake type, the first seen of
+        equally frequent ones, or None).
+
+        accuracy and avg_time_ms are None for a group without answers.
+        """
+        count = GROUP_MATRIX @ self.domain_count
+        correct = GROUP_MATRIX @ self.domain_correct
+        time_ms = GROUP_MATRIX @ self.domain_time
+        mistakes = (GROUP_MATRIX @ self.domain_mistakes)[:, 1:]
+        order = np.where(GROUP_MATRIX[:, :, None] == 1, self.mistake_order, np.inf).min(axis=1)[:, 1:]
+
+        groups = {}
+        for i, group in enumerate(DOMAIN_GROUPS):
+            answered = int(count[i])
+            common = None
+            if mistakes[i].any():
+                common = int(np.argmin(np.where(mistakes[i] == mistakes[i].max(), order[i], np.inf)))
+            groups[group] = {
+                'answers': answered,
+                'accuracy': float(correct[i]) / answered if answered else None,
+                'avg_time_ms': float(time_ms[i]) / answered if answered else None,
+                'common_mistake': self.mistake_types[common] if common is not None else None,
+            }
+        return groups
+
+
+def _code(codes: Dict[str, int], mistake_type: Optional[str]) -> int:
+    """Mistake code of mistake_type (0 for none), assigning the next one to a new type."""
+    if not mistake_type:
+        return 0
+    return codes.setdefault(mistake_type, len(codes) + 1)
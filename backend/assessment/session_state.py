@@ -0,0 +1,214 @@
+"""
+Session state used by the assessment endpoints.
+
+Each session has a SessionStats row holding running aggregates (counts,
+correct counts and time sums per domain, mistake counters, last
+domain/difficulty, response-time sum and sum of squares). SubmitAnswerView
+updates it in the same transaction that stores the answer, so every reader
+gets O(1) state regardless of session length.
+
+The next-question snapshot derived from it is also kept in the shared
+SessionStateStore (see state_store.py); the database is the fallback on a miss.
+Snapshots are written with set_if_newer on their total, so a write that
+commits late (or a reader repopulating from an older read) never replaces a
+snapshot that already has more answers.
+"""
+from typing import Any, Dict, Optional
+
+from django.db import transaction
+
+from .irt import irt_config, response_item_id
+from .models import Session, SessionStats, UserResponse, MistakePattern
+from .session_features import IMPULSE_THRESHOLD_MS
+from .state_store import get_state_store
+from .stopping import update_stopping_state
+
+# Domains used by the assessment (domain rotation / current_domain feature)
+ASSESSMENT_DOMAINS = ['reading', 'math', 'attention']
+
+
+def apply_response(stats: SessionStats, domain: str, difficulty: str, correct: bool,
+                   response_time_ms: int, mistake_type: str = None, question_id: str = None,
+                   item_id: str = None) -> None:
+    """
+    Fold one answer into the running aggregates (caller saves the row).
+
+    item_id is the IRT item of the answer (see irt.answer_item_id); it is
+    only given while IRT selection is enabled.
+    """
+    stats.total += 1
+    stats.correct += 1 if correct else 0
+    stats.response_time_sum += response_time_ms
+    stats.response_time_sq_sum += response_time_ms * response_time_ms
+    if not correct and response_time_ms < IMPULSE_THRESHOLD_MS:
+        stats.impulse_count += 1
+
+    entry = stats.domain_stats.setdefault(domain, {'count': 0, 'correct': 0, 'time_ms': 0, 'mistakes': {}})
+    entry['count'] += 1
+    entry['correct'] += 1 if correct else 0
+    entry['time_ms'] += response_time_ms
+
+    # Mistake patterns are only stored for incorrect answers (see SubmitAnswerView)
+    if mistake_type and not correct:
+        entry['mistakes'][mistake_type] = entry['mistakes'].get(mistake_type, 0) + 1
+        stats.mistake_counts[mistake_type] = stats.mistake_counts.get(mistake_type, 0) + 1
+
+    if item_id is not None:
+        stats.irt_responses.setdefault(domain, []).append([item_id, difficulty, bool(correct)])
+
+    stats.last_question_id = question_id
+    stats.last_domain = domain
+    stats.last_difficulty = difficulty
+
+
+def rebuild_session_stats(session: Session) -> SessionStats:
+    """Recompute a session's stats from its stored responses (sessions created before SessionStats)."""
+    with transaction.atomic():
+        # Lock the session row so a concurrent submit doesn't interleave with the rebuild
+        Session.objects.select_for_update().filter(pk=session.pk).first()
+        stats = SessionStats(session=session)
+
+        first_mistakes = {}
+        for response_id, mistake_type in MistakePattern.objects.filter(
+            response__session=session
+        ).order_by('mistake_id').values_list('response_id', 'mistake_type'):
+            first_mistakes.setdefault(response_id, mistake_type)
+
+        responses = UserResponse.objects.filter(session=session).order_by('answered_at', 'response_id')
+        track_items = irt_config()['ENABLED']
+        if track_items:
+            responses = responses.select_related('generated_question')
+        for response in responses:
+            apply_response(
+                stats,
+                response.domain,
+                response.difficulty,
+                response.correct,
+                response.response_time_ms,
+                first_mistakes.get(response.response_id),
+                response.answered_question_id,
+                response_item_id(response) if track_items else None,
+            )
+            update_stopping_state(stats)
+
+        stats.save()
+    return stats
+
+
+def record_answer(session: Session, domain: str, difficulty: str, correct: bool,
+                  response_time_ms: int, mistake_type: str = None, question_id: str = None,
+                  item_id: str = None) -> SessionStats:
+    """
+    Update the session's stats for an answer that was just stored.
+
+    Must be called inside the transaction that created the UserResponse. The
+    new snapshot is written through to the state store once that transaction commits.
+    """
+    stats = SessionStats.objects.select_for_update().filter(session=session).first()
+    if stats is None:
+        # First answer since SessionStats was introduced - the rebuild includes this answer
+        stats = rebuild_session_stats(session)
+    else:
+        apply_response(stats, domain, difficulty, correct, response_time_ms, mistake_type, question_id, item_id)
+        update_stopping_state(stats)
+        stats.save()
+
+    snapshot = snapshot_from_stats(session, stats)
+    transaction.on_commit(lambda: get_state_store().set_if_newer(session.session_id, snapshot))
+    return stats
+
+
+def get_session_stats(session: Session) -> SessionStats:
+    """Return the session's stats row, rebuilding it if it doesn't exist yet."""
+    try:
+        return session.stats
+    except SessionStats.DoesNotExist:
+        return rebuild_session_stats(session)
+
+
+def snapshot_from_stats(session: Session, stats: SessionStats) -> Dict[str, Any]:
+    """Build the next-question snapshot from a SessionStats row."""
+    return {
+        'session_id': session.session_id,
+        'user_id': session.user_id,
+        'age_group': session.user.age_group,
+        'completed': session.completed,
+        'total': stats.total,
+        'correct': stats.correct,
+        'accuracy': stats.correct / stats.total if stats.total else None,
+        'domain_counts': {
+            domain: stats.domain_stats.get(domain, {}).get('count', 0)
+            for domain in ASSESSMENT_DOMAINS
+        },
+        'last_question_id': stats.last_question_id,
+        'last_domain': stats.last_domain,
+        'last_difficulty': stats.last_difficulty,
+        'irt_responses': stats.irt_responses,
+        'stop_label': stats.stop_label,
+        'stop_streak': stats.stop_streak,
+    }
+
+
+def advance_snapshot(snapshot: Dict[str, Any], domain: str, difficulty: str, correct: bool,
+                     question_id: str = None) -> Dict[str, Any]:
+    """Snapshot the session would have after one more answer (mirrors apply_response)."""
+    advanced = dict(snapshot)
+    advanced['total'] = snapshot['total'] + 1
+    advanced['correct'] = snapshot['correct'] + (1 if correct else 0)
+    advanced['accuracy'] = advanced['correct'] / advanced['total']
+    advanced['domain_counts'] = dict(snapshot['domain_counts'])
+    if domain in advanced['domain_counts']:
+        advanced['domain_counts'][domain] += 1
+    advanced['last_question_id'] = question_id
+    advanced['last_domain'] = domain
+    advanced['last_difficulty'] = difficulty
+    return advanced
+
+
+def get_session_snapshot(session_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Return a snapshot of the session's progress, or None if the session does not exist.
+
+    Reads the session and its SessionStats row in one query.
+
+    Snapshot keys:
+        session_id, user_id, age_group, completed
+        total, correct       - number of responses / correct responses
+        accuracy             - correct / total (None if no responses)
+        domain_counts        - {'reading': n, 'math': n, 'attention': n}
+        last_question_id, last_domain, last_difficulty - of the most recent response (None if no responses)
+        irt_responses        - {domain: [[item_id, difficulty, correct], ...]} (see irt.py)
+        stop_label, stop_streak - early-stopping state (see stopping.py)
+    """
+    session = Session.objects.select_related('user', 'stats').filter(session_id=session_id).first()
+    if session is None:
+        return None
+    return snapshot_from_stats(session, get_session_stats(session))
+
+
+def load_session_snapshot(session_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Return the session snapshot from the shared state store, falling back to
+    the database (and repopulating the store) on a miss.
+    """
+    store = get_state_store()
+    snapshot = store.get(session_id)
+    if snapshot is None:
+        snapshot = get_session_snapshot(session_id)
+        if snapshot is not None:
+            store.set_if_newer(session_id, snapshot)
+    return snapshot
+
+
+def prefetch_key(session_id: str) -> str:
+    """State store key holding a session's prefetched next-question candidates."""
+    return f"{session_id}:prefetch"
+
+
+def forget_session_snapshot(session_id: str) -> None:
+    """Drop a finished session from the state store once the current transaction commits."""
+    def forget():
+        store = get_state_store()
+        store.delete(session_id)
+        store.delete(prefetch_key(session_id))
+    transaction.on_commit(forget)
@@ -0,0 +1,125 @@
+"""
+Local stand-in for the networked session-state store.
+
+Implements the subset of the Redis protocol RedisStore uses (PING, GET,
+SET with EX, DEL, FLUSHDB, and WATCH / UNWATCH / MULTI / EXEC / DISCARD
+transactions) so multi-node behaviour can be exercised on one machine
+without a Redis install. Not meant for production.
+
+    server = StateServer(('127.0.0.1', 0))
+    server.start()            # serves on a background thread
+    host, port = server.server_address
+    ...
+    server.stop()
+"""
+import socketserver
+import threading
+import time
+
+from .state_store import read_reply
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        watched = {}  # key -> its version at WATCH
+        queued = None  # commands queued since MULTI
+        while True:
+            try:
+                request = read_reply(self.rfile)
+            except (ConnectionError, ValueError):
+                return
+            if not request:
+                continue
+            command, args = request[0].decode().upper(), request[1:]
+            if command == 'WATCH':
+                watched.update(self.server.versions(args))
+                reply = b'+OK\r\n'
+            elif command == 'UNWATCH':
+                watched.clear()
+                reply = b'+OK\r\n'
+            elif command == 'DISCARD':
+                watched.clear()
+                queued = None
+                reply = b'+OK\r\n'
+            elif command == 'MULTI':
+                queued = []
+                reply = b'+OK\r\n'
+            elif command == 'EXEC':
+                reply = self.server.execute_transaction(queued or [], watched)
+                watched.clear()
+                queued = None
+            elif queued is not None:
+                queued.append((command, args))
+                reply = b'+QUEUED\r\n'
+            else:
+                reply = self.server.execute(command, args)
+            self.wfile.write(reply)
+
+
+class StateServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=('127.0.0.1', 6379)):
+        super().__init__(address, _Handler)
+        self._data = {}  # key -> (expires_at or None, value)
+        self._versions = {}  # key -> number of writes, checked by EXEC against WATCH
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def execute(self, command, args):
+        with self._lock:
+            return self._execute(command, args)
+
+    def execute_transaction(self, commands, watched):
+        """EXEC: run the queued commands, or reply nil if a watched key was written since WATCH."""
+        with self._lock:
+            if any(self._versions.get(key, 0) != version for key, version in watched.items()):
+                return b'*-1\r\n'
+            replies = [self._execute(command, args) for command, args in commands]
+        return b'*%d\r\n' % len(replies) + b''.join(replies)
+
+    def versions(self, keys):
+        with self._lock:
+            return {key: self._versions.get(key, 0) for key in keys}
+
+    def _execute(self, command, args):
+        if command == 'PING':
+            return b'+PONG\r\n'
+        if command == 'GET':
+            entry = self._data.get(args[0])
+            if entry is None or (entry[0] is not None and entry[0] < time.monotonic()):
+                self._data.pop(args[0], None)
+                return b'$-1\r\n'
+            return b'$%d\r\n%s\r\n' % (len(entry[1]), entry[1])
+        if command == 'SET':
+            expires_at = None
+            if len(args) >= 4 and args[2].upper() == b'EX':
+                expires_at = time.monotonic() + int(args[3])
+            self._data[args[0]] = (expires_at, args[1])
+            self._touch(args[0])
+            return b'+OK\r\n'
+        if command == 'DEL':
+            removed = sum(1 for key in args if self._data.pop(key, None) is not None)
+            for key in args:
+                self._touch(key)
+            return b':%d\r\n' % removed
+        if command == 'FLUSHDB':
+            for key in self._data:
+                self._touch(key)
+            self._data.clear()
+            return b'+OK\r\n'
+        return b'-ERR unknown command\r\n'
+
+    def _touch(self, key):
+        self._versions[key] = self._versions.get(key, 0) + 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,314 @@
+"""
+Shared session-state store for the next-question path.
+
+GetNextQuestionView needs a small amount of running state per session (last
+question, last difficulty/domain, domain counts, accuracy). With several API
+nodes a per-process dict is not enough, so the state lives behind the
+SessionStateStore interface:
+
+    LocalMemoryStore  - in-process LRU with TTL, for a single worker process
+    RedisStore        - networked key-value store speaking the Redis protocol;
+                        `manage.py run_state_server` starts a local stand-in
+    DatabaseOnlyStore - keeps nothing, every read goes to the database
+
+SubmitAnswerView writes through to the store and the database (SessionStats)
+is the fallback on a miss. Snapshots are written with set_if_newer, so a
+write that commits late never replaces a snapshot with more answers. A write
+that fails deletes the key, so readers fall back to the database instead of
+getting an old value. Configure with settings.ASSESSMENT_STATE_STORE.
+
+A LocalMemoryStore is private to its process. With several workers, one
+worker would keep serving a snapshot after another worker recorded the next
+answer. gunicorn.conf.py therefore selects DatabaseOnlyStore when it runs
+more than one worker, unless a backend is set explicitly.
+"""
+import json
+import logging
+import socket
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class SessionStateStore:
+    """Base class: JSON-serialisable state per session id, with hit/miss counters."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        state = self._get(session_id)
+        if state is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return state
+
+    def set(self, session_id: str, state: Dict[str, Any]) -> None:
+        self._set(session_id, state)
+
+    def set_if_newer(self, session_id: str, state: Dict[str, Any], version_key: str = 'total') -> None:
+        """Store state unless the stored entry has a higher state[version_key] (e.g. more answers)."""
+        self._set_if_newer(session_id, state, version_key)
+
+    def delete(self, session_id: str) -> None:
+        self._delete(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'backend': type(self).__name__,
+            'hits': self.hits,
+            'misses': self.misses,
+            'errors': self.errors,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def _get(self, session_id):
+        raise NotImplementedError
+
+    def _set(self, session_id, state):
+        raise NotImplementedError
+
+    def _set_if_newer(self, session_id, state, version_key):
+        raise NotImplementedError
+
+    def _delete(self, session_id):
+        raise NotImplementedError
+
+
+class LocalMemoryStore(SessionStateStore):
+    """In-process LRU cache with a per-entry TTL."""
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 3600):
+        super().__init__()
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # session_id -> (expires_at, state JSON)
+        self._lock = threading.Lock()
+
+    def _get(self, session_id):
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            expires_at, encoded = entry
+            if expires_at < time.monotonic():
+                del self._entries[session_id]
+                return None
+            self._entries.move_to_end(session_id)
+            # Callers get their own copy so they can't mutate the cached state
+            return json.loads(encoded)
+
+    def _set(self, session_id, state):
+        with self._lock:
+            self._store(session_id, state)
+
+    def _set_if_newer(self, session_id, state, version_key):
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if (entry is not None and entry[0] >= time.monotonic()
+                    and json.loads(entry[1]).get(version_key, -1) > state[version_key]):
+                return
+            self._store(session_id, state)
+
+    def _store(self, session_id, state):
+        """Insert or replace an entry (caller holds the lock)."""
+        self._entries[session_id] = (time.monotonic() + self.ttl_seconds, json.dumps(state))
+        self._entries.move_to_end(session_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _delete(self, session_id):
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+
+class RedisStore(SessionStateStore):
+    """
+    Key-value store over the Redis wire protocol (GET / SET EX / DEL).
+
+    Speaks RESP directly so no client library is needed. Network errors are
+    counted and treated as a miss, so requests fall back to the database; the
+    outage is logged once when it starts and once when it ends. A
+    failed write deletes the key (once the server is reachable again) rather
+    than leaving the previous value to be served. set_if_newer is an optimistic
+    WATCH / MULTI / EXEC transaction.
+    """
+
+    # set_if_newer attempts before giving up on a contended key (and deleting it)
+    CAS_ATTEMPTS = 3
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 6379, ttl_seconds: int = 3600,
+                 prefix: str = 'ld:session:', timeout: float = 0.5):
+        super().__init__()
+        self.address = (host, port)
+        self.ttl_seconds = int(ttl_seconds)
+        self.prefix = prefix
+        self.timeout = timeout
+        self._local = threading.local()  # one connection per thread
+        self.unavailable = False  # set by a network error, cleared by the next successful command
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            sock = socket.create_connection(self.address, timeout=self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn = (sock, sock.makefile('rb'))
+            self._local.conn = conn
+        return conn
+
+    def _reset(self):
+        conn = getattr(self._local, 'conn', None)
+        self._local.conn = None
+        if conn is not None:
+            conn[1].close()
+            conn[0].close()
+
+    def command(self, *args):
+        """Send one command and return its decoded reply."""
+        payload = [f'*{len(args)}\r\n'.encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            payload.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        try:
+            sock, reader = self._connection()
+            sock.sendall(b''.join(payload))
+            reply = read_reply(reader)
+        except (OSError, ConnectionError) as e:
+            self._reset()
+            if not self.unavailable:
+                self.unavailable = True
+                logger.warning("Session state store %s:%s unavailable (%s), falling back to the database",
+                               *self.address, e)
+            raise
+        if self.unavailable:
+            self.unavailable = False
+            logger.warning("Session state store %s:%s available again", *self.address)
+        return reply
+
+    def _get(self, session_id):
+        try:
+            raw = self.command('GET', self.prefix + session_id)
+        except (OSError, ConnectionError):
+            self.errors += 1
+            return None
+        return json.loads(raw) if raw is not None else None
+
+    def _set(self, session_id, state):
+        key = self.prefix + session_id
+        try:
+            self.command('SET', key, json.dumps(state), 'EX', self.ttl_seconds)
+        except (OSError, ConnectionError):
+            self.errors += 1
+            self._discard(key)
+
+    def _set_if_newer(self, session_id, state, version_key):
+        key = self.prefix + session_id
+        try:
+            for _ in range(self.CAS_ATTEMPTS):
+                self.command('WATCH', key)
+                raw = self.command('GET', key)
+                if raw is not None and json.loads(raw).get(version_key, -1) > state[version_key]:
+                    self.command('UNWATCH')
+                    return
+                self.command('MULTI')
+                self.command('SET', key, json.dumps(state), 'EX', self.ttl_seconds)
+                # EXEC replies nil when the key changed after WATCH
+                if self.command('EXEC') is not None:
+                    return
+            self.command('DEL', key)
+        except (OSError, ConnectionError):
+            self.errors += 1
+            self._discard(key)
+
+    def _delete(self, session_id):
+        key = self.prefix + session_id
+        try:
+            self.command('DEL', key)
+        except (OSError, ConnectionError):
+            self.errors += 1
+            self._discard(key)
+
+    def _discard(self, key):
+        """Retry deleting key on a fresh connection after a failed command."""
+        try:
+            self.command('DEL', key)
+        except (OSError, ConnectionError):
+            self.errors += 1
+
+
+class DatabaseOnlyStore(SessionStateStore):
+    """Stores nothing: every lookup misses, so readers always use SessionStats."""
+
+    def __init__(self, **options):
+        # OPTIONS meant for another backend are ignored
+        super().__init__()
+
+    def _get(self, session_id):
+        return None
+
+    def _set(self, session_id, state):
+        pass
+
+    def _set_if_newer(self, session_id, state, version_key):
+        pass
+
+    def _delete(self, session_id):
+        pass
+
+
+class ProtocolError(ConnectionError):
+    pass
+
+
+def read_reply(reader):
+    """Parse one RESP reply from a binary file object."""
+    line = reader.readline()
+    if not line.endswith(b'\r\n'):
+        raise ProtocolError("Connection closed")
+    kind, body = line[:1], line[1:-2]
+    if kind == b'+':
+        return body.decode()
+    if kind == b'-':
+        raise ProtocolError(body.decode())
+    if kind == b':':
+        return int(body)
+    if kind == b'$':
+        length = int(body)
+        if length < 0:
+            return None
+        data = reader.read(length + 2)
+        return data[:-2]
+    if kind == b'*':
+        count = int(body)
+        return None if count < 0 else [read_reply(reader) for _ in range(count)]
+    raise ProtocolError(f"Unexpected reply: {line!r}")
+
+
+BACKENDS = {
+    'local': LocalMemoryStore,
+    'redis': RedisStore,
+    'database': DatabaseOnlyStore,
+}
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_state_store() -> SessionStateStore:
+    """Return the process-wide store configured by settings.ASSESSMENT_STATE_STORE."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                config = getattr(settings, 'ASSESSMENT_STATE_STORE', {'BACKEND': 'local'})
+                _store = BACKENDS[config['BACKEND']](**config.get('OPTIONS', {}))
+    return _store
@@ -0,0 +1,90 @@
+"""
+When an assessment session ends.
+
+Without a stopping policy every session ends after MAX_SESSION_QUESTIONS
+answers. With settings.ASSESSMENT_EARLY_STOPPING enabled, the risk model is
+re-run after each answer on the session's running features
+(ml_utils.risk_features_from_stats, so no response scan). The session ends
+once the same risk class has had a probability of at least THRESHOLD for
+CONSECUTIVE answers in a row, but never before MIN_ITEMS answers and
+always at MAX_ITEMS.
+
+With IRT selection (irt.py) and an SE_THRESHOLD, the session also ends once
+the EAP ability estimate of every domain has a standard error of at most
+SE_THRESHOLD (after MIN_ITEMS answers).
+
+The streak is kept in SessionStats (stop_label, stop_streak). It is
+updated in the transaction that stores the answer and included in the
+session snapshot.
+"""
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+
+from .irt import get_item_bank
+from .ml import risk_features_from_stats, risk_top_class
+
+# Sessions end automatically after this many answers (MAX_ITEMS with early stopping)
+MAX_SESSION_QUESTIONS = 15
+
+DEFAULTS = {
+    'ENABLED': False,
+    'THRESHOLD': 0.8,  # top-class probability that counts towards the streak
+    'CONSECUTIVE': 3,  # answers in a row with the same confident class
+    'MIN_ITEMS': 8,
+    'MAX_ITEMS': MAX_SESSION_QUESTIONS,
+    'SE_THRESHOLD': None,  # per-domain ability standard error that ends the session (IRT only)
+}
+
+
+def stopping_config() -> Dict[str, Any]:
+    return {**DEFAULTS, **getattr(settings, 'ASSESSMENT_EARLY_STOPPING', {})}
+
+
+def update_stopping_state(stats) -> None:
+    """Re-run the risk model for a SessionStats row that has just taken an answer (caller saves the row)."""
+    config = stopping_config()
+    if not config['ENABLED'] or not stats.total:
+        return
+
+    top = risk_top_class(risk_features_from_stats(stats))
+    if top is None or top[1] < config['THRESHOLD']:
+        stats.stop_label, stats.stop_streak = None, 0
+    elif top[0] == stats.stop_label:
+        stats.stop_streak += 1
+    else:
+        stats.stop_label, stats.stop_streak = top[0], 1
+
+
+def stop_reason(snapshot: Dict[str, Any]) -> Optional[str]:
+    """
+    Why the session is over, or None if it should continue.
+
+    Returns:
+        'max_items' - the answer limit was reached
+        'confident' - the risk class has been confident for CONSECUTIVE answers
+        'irt_precision' - every domain's ability is known to within SE_THRESHOLD
+    """
+    config = stopping_config()
+    total = snapshot['total']
+    if not config['ENABLED']:
+        return 'max_items' if total >= MAX_SESSION_QUESTIONS else None
+
+    if total >= config['MAX_ITEMS']:
+        return 'max_items'
+    if total < config['MIN_ITEMS']:
+        return None
+    if snapshot.get('stop_streak', 0) >= config['CONSECUTIVE']:
+        return 'confident'
+    if config['SE_THRESHOLD'] is not None and _abilities_precise(snapshot, config['SE_THRESHOLD']):
+        return 'irt_precision'
+    return None
+
+
+def _abilities_precise(snapshot: Dict[str, Any], se_threshold: float) -> bool:
+    """Whether every domain's EAP ability estimate has a standard error of at most se_threshold."""
+    item_bank = get_item_bank()
+    if item_bank is None:
+        return False
+    abilities = item_bank.abilities(snapshot.get('irt_responses') or {})
+    return all(standard_error <= se_threshold for _, standard_error in abilities.values())
@@ -0,0 +1,1423 @@
+"""
+Tests for the assessment app.
+
+Run with: python manage.py test assessment
+"""
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import warnings
+from collections import Counter
+from contextlib import contextmanager
+from unittest import mock
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import inference_batcher, irt, ml, question_bank, services, state_store, stopping, views
+from .adaptive_logic import get_adaptive_question, pick_unanswered_question
+from .decision_table import (
+    ACCURACY_FEATURE,
+    DISCRETE_FEATURES,
+    SERVING_DISCRETE_ROWS,
+    TIME_FEATURE,
+    DecisionTable,
+    boundary_values,
+    model_fingerprint,
+    session_accuracy_values,
+)
+from .flat_forest import FlatForest, load_forests, save_forests
+from .inference_batcher import InferenceBatcher
+from .management.commands.export_flat_models import QUESTION_FEATURES
+from .ml_utils import (
+    PREDICTION_MODEL_PATH,
+    RISK_FEATURES,
+    RISK_LABELS,
+    PlaceholderPredictionModel,
+    RiskScorer,
+    get_prediction,
+    load_prediction_model,
+    load_question_model,
+    predict_next_question,
+    predict_risk,
+    resolve_question_model_path,
+    risk_features_from_responses,
+    risk_top_class,
+)
+from .model_registry import registry
+from .question_pool import QuestionPool, get_question_pool
+from .models import (
+    FinalPrediction,
+    GeneratedQuestion,
+    Question,
+    Session,
+    SessionFeatureVector,
+    SessionStats,
+    User,
+    UserResponse,
+)
+from .question_catalog import (
+    CATALOG_PATH,
+    StarCountTemplate,
+    generated_question_id,
+    get_catalog,
+    parse_generated_question_id,
+)
+from .question_generator_model import QuestionGeneratorModel
+from .rescoring import rescore_range
+from .services import save_generated_questions
+from .session_features import DEFAULT_MODEL_FEATURES, FEATURE_SCHEMA_VERSION, MODEL_FEATURES, SessionFeatures
+from .session_state import apply_response, get_session_snapshot, rebuild_session_stats
+from .state_server import StateServer
+from .state_store import DatabaseOnlyStore, LocalMemoryStore, RedisStore
+from .stopping import stop_reason, update_stopping_state
+
+
+class StateStoreTests(SimpleTestCase):
+    """Snapshot writes never go back in time, and failed writes don't leave old values behind."""
+
+    def setUp(self):
+        self.server = StateServer(('127.0.0.1', 0)).start()
+        self.addCleanup(self.server.stop)
+
+    def stores(self):
+        host, port = self.server.server_address
+        return [LocalMemoryStore(), RedisStore(host, port)]
+
+    def test_set_if_newer_keeps_the_snapshot_with_more_answers(self):
+        for store in self.stores():
+            with self.subTest(store=type(store).__name__):
+                store.set_if_newer('S_1_01', {'total': 3, 'last_question_id': 'q3'})
+                store.set_if_newer('S_1_01', {'total': 2, 'last_question_id': 'q2'})
+                self.assertEqual(store.get('S_1_01')['last_question_id'], 'q3')
+
+                store.set_if_newer('S_1_01', {'total': 4, 'last_question_id': 'q4'})
+                self.assertEqual(store.get('S_1_01')['last_question_id'], 'q4')
+
+    def test_failed_write_deletes_the_key(self):
+        host, port = self.server.server_address
+        store = RedisStore(host, port)
+        store.set('S_1_01', {'total': 1})
+
+        command = store.command
+
+        def failing_set(*args):
+            if args[0] == 'SET':
+                raise ConnectionError("connection reset")
+            return command(*args)
+
+        store.command = failing_set
+        store.set('S_1_01', {'total': 2})
+        store.command = command
+
+        self.assertIsNone(store.get('S_1_01'))
+        self.assertEqual(store.errors, 1)
+
+    def test_outage_is_logged_once(self):
+        host, port = self.server.server_address
+        store = RedisStore(host, port)
+        store.set('S_1_01', {'total': 1})
+        connection = store._connection
+
+        def refused():
+            raise ConnectionRefusedError("connection refused")
+
+        with self.assertLogs('assessment.state_store', 'WARNING') as logs:
+            store._connection = refused
+            for _ in range(5):
+                self.assertIsNone(store.get('S_1_01'))
+            store._connection = connection
+            self.assertEqual(store.get('S_1_01'), {'total': 1})
+        self.assertEqual(store.errors, 5)
+        self.assertEqual(len(logs.records), 2)
+        self.assertIn('unavailable', logs.output[0])
+        self.assertIn('available again', logs.output[1])
+
+    def test_database_only_store_always_misses(self):
+        store = DatabaseOnlyStore(max_entries=10)
+        store.set_if_newer('S_1_01', {'total': 1})
+        self.assertIsNone(store.get('S_1_01'))
+
+
+class PlaceholderPredictionTests(SimpleTestCase):
+    """The rule-based fallback goes through the same RiskScorer path as the real model."""
+
+    def setUp(self):
+        placeholder = PlaceholderPredictionModel()
+        patcher = mock.patch.dict(registry._models, {'prediction': placeholder,
+                                                     'risk_scorer': RiskScorer(placeholder)})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_predict_risk_with_placeholder(self):
+        weak_reader = {'reading_acc': 0.1, 'math_acc': 0.8, 'focus_acc': 0.8, 'avg_time_ms': 2500,
+                       'rev_rate': 0.5, 'pv_rate': 0.0, 'impulse_rate': 0.0}
+        result = predict_risk(weak_reader)
+        self.assertEqual(result['risk'], 'dyslexia-risk')
+        self.assertEqual(result['confidence_level'], 'moderate')
+
+        typical = dict(weak_reader, reading_acc=0.9, math_acc=0.9, focus_acc=0.9, rev_rate=0.0, avg_time_ms=1500)
+        self.assertEqual(predict_risk(typical)['risk'], 'low-risk')
+
+    def test_placeholder_returns_one_label_per_row(self):
+        rows = np.array([[0.1, 0.8, 0.8, 2500, 0.5, 0.0, 0.0],
+                         [0.9, 0.1, 0.9, 4000, 0.0, 0.2, 0.0],
+                         [0.9, 0.9, 0.9, 6000, 0.0, 0.0, 0.0]], dtype=np.float32)
+        labels = PlaceholderPredictionModel().predict(rows)
+        self.assertEqual(list(labels), ['Dyslexia Risk', 'Dyscalculia Risk', 'Attention Risk'])
+        self.assertIn(labels[0], RISK_LABELS)
+
+    def test_scores_keep_the_original_formulas(self):
+        def original_scores(features):
+            # PlaceholderPredictionModel.predict before it was called through RiskScorer
+            accuracy, avg_response_time, error_rate = features[0][0], features[0][1], features[0][2]
+            reading_accuracy, math_accuracy, letter_reversal_count = features[0][4], features[0][5], features[0][6]
+            dyslexia_risk = min(1.0, (1 - accuracy) * 0.4 + (1 - reading_accuracy) * 0.3 +
+                                (letter_reversal_count / 5) * 0.3)
+            dyscalculia_risk = min(1.0, (1 - accuracy) * 0.3 + (1 - math_accuracy) * 0.4 +
+                                   (avg_response_time / 5000) * 0.3)
+            attention_risk = min(1.0, (avg_response_time / 5000) * 0.5 + (1 - accuracy) * 0.3 +
+                                 (error_rate * 0.2))
+            return [dyslexia_risk, dyscalculia_risk, attention_risk]
+
+        placeholder = PlaceholderPredictionModel()
+        rows = np.random.default_rng(0).uniform([0, 0, 0, 300, 0, 0, 0], [1, 1, 1, 9000, 1, 1, 1], size=(50, 7))
+        mapped = placeholder.model_features(rows)
+        expected = np.array([original_scores(mapped[i:i + 1]) for i in range(len(rows))])
+        np.testing.assert_allclose(placeholder.scores(rows), expected)
+
+        # A session answered the same in every group maps onto its own MODEL_FEATURES row
+        responses = [{'domain': domain, 'correct': i % 4 != 0, 'response_time_ms': 1500 + 100 * i,
+                      'mistake_type': 'letter_reversal' if i == 0 else None}
+                     for i, domain in enumerate(['reading', 'math', 'attention'] * 4)]
+        session = SessionFeatures.from_responses(responses)
+        row = placeholder.model_features(RiskScorer(placeholder).row(session.risk_features()))[0]
+        own = session.model_features()[0]
+        for name in ('accuracy', 'avg_response_time', 'error_rate', 'reading_accuracy', 'math_accuracy'):
+            self.assertAlmostEqual(row[MODEL_FEATURES.index(name)], own[MODEL_FEATURES.index(name)], places=3)
+
+
+def random_responses(seed, n):
+    """n random response dictionaries (get_prediction's input) over every domain and mistake type."""
+    rng = np.random.default_rng(seed)
+    domains = ['reading', 'writing', 'math', 'attention', 'focus', 'other']
+    mistakes = [None, 'letter_reversal', 'number_reversal', 'substitution', 'other_error']
+    responses = []
+    for _ in range(n):
+        correct = bool(rng.random() < 0.6)
+        responses.append({
+            'domain': domains[rng.integers(len(domains))],
+            'correct': correct,
+            'response_time_ms': int(rng.integers(300, 7000)),
+            # Only incorrect answers carry a mistake (as stored by SubmitAnswerView)
+            'mistake_type': None if correct else mistakes[rng.integers(len(mistakes))],
+            'confidence': ['low', 'medium', 'high', None][rng.integers(4)],
+        })
+    return responses
+
+
+class SessionFeaturesTests(SimpleTestCase):
+    """SessionFeatures gives the features the per-call-site list comprehensions computed, from answers or stats."""
+
+    @staticmethod
+    def list_risk_features(responses):
+        """get_prediction's features as computed before SessionFeatures."""
+        total = len(responses)
+        reading = [r for r in responses if r.get('domain') in ['reading', 'writing']]
+        math = [r for r in responses if r.get('domain') == 'math']
+        focus = [r for r in responses if r.get('domain') in ['attention', 'focus']]
+        return {
+            'reading_acc': sum(1 for r in reading if r.get('correct')) / len(reading) if reading else 0.5,
+            'math_acc': sum(1 for r in math if r.get('correct')) / len(math) if math else 0.5,
+            'focus_acc': sum(1 for r in focus if r.get('correct')) / len(focus) if focus else 0.5,
+            'avg_time_ms': sum(r.get('response_time_ms', 2000) for r in responses) / total,
+            'rev_rate': sum(1 for r in responses if r.get('mistake_type') == 'letter_reversal') / total,
+            'pv_rate': sum(1 for r in responses
+                           if r.get('mistake_type') in ['number_reversal', 'substitution']) / total,
+            'impulse_rate': sum(1 for r in responses
+                                if not r.get('correct') and r.get('response_time_ms', 2000) < 1000) / total,
+        }
+
+    @staticmethod
+    def list_model_features(responses):
+        """extract_features as computed before SessionFeatures."""
+        total = len(responses)
+        accuracy = sum(1 for r in responses if r.get('correct', False)) / total
+        times = [r.get('response_time_ms', 2000) for r in responses]
+        reading = [r for r in responses if r.get('domain') == 'reading']
+        math = [r for r in responses if r.get('domain') == 'math']
+        return [
+            accuracy,
+            np.mean(times),
+            1 - accuracy,
+            np.std(times) if len(times) > 1 else 500,
+            sum(1 for r in reading if r.get('correct', False)) / len(reading) if reading else 0.5,
+            sum(1 for r in math if r.get('correct', False)) / len(math) if math else 0.5,
+            sum(1 for r in responses if r.get('mistake_type') == 'letter_reversal'),
+            sum(1 for r in responses if (r.get('confidence') == 'low' and r.get('correct')) or
+                (r.get('confidence') == 'high' and not r.get('correct'))),
+        ]
+
+    def stats(self, responses):
+        stats = SessionStats(domain_stats={}, mistake_counts={}, irt_responses={})
+        for r in responses:
+            apply_response(stats, r['domain'], 'medium', r['correct'], r['response_time_ms'], r['mistake_type'])
+        return stats
+
+    def assertFeaturesEqual(self, first, second):
+        self.assertEqual(first.keys(), second.keys())
+        for name in first:
+            self.assertAlmostEqual(first[name], second[name], msg=name)
+
+    def assertDomainGroupsEqual(self, from_stats, from_responses, responses):
+        """
+        Equal, except that a tie between mistakes from different domains of a
+        group may be broken differently: SessionStats only keeps the order
+        within each domain.
+        """
+        pooled = {'reading': ['reading', 'writing'], 'math': ['math'], 'focus': ['attention', 'focus']}
+        for group, domains in pooled.items():
+            counts = Counter(r['mistake_type'] for r in responses if r['domain'] in domains and r['mistake_type'])
+            stats_group, responses_group = dict(from_stats[group]), dict(from_responses[group])
+            self.assertEqual(counts.get(stats_group.pop('common_mistake')),
+                             counts.get(responses_group.pop('common_mistake')), group)
+            self.assertEqual(stats_group, responses_group, group)
+
+    def test_same_features_as_the_list_comprehensions(self):
+        for seed, n in enumerate((1, 2, 7, 30, 200)):
+            responses = random_responses(seed, n)
+            features = SessionFeatures.from_responses(responses)
+            self.assertFeaturesEqual(features.risk_features(), self.list_risk_features(responses))
+            np.testing.assert_allclose(features.model_features()[0], self.list_model_features(responses))
+
+    def test_same_features_from_stats(self):
+        for seed, n in enumerate((1, 2, 7, 30, 200)):
+            responses = random_responses(seed, n)
+            from_responses = SessionFeatures.from_responses(responses)
+            from_stats = SessionFeatures.from_stats(self.stats(responses))
+            self.assertFeaturesEqual(from_stats.risk_features(), from_responses.risk_features())
+            self.assertDomainGroupsEqual(from_stats.domain_groups(), from_responses.domain_groups(), responses)
+            # SessionStats keeps no confidence, so confidence_mismatch is the one column that differs
+            np.testing.assert_allclose(from_stats.model_features()[0, :-1], from_responses.model_features()[0, :-1])
+
+    def test_without_answers(self):
+        self.assertEqual(SessionFeatures.from_responses([]).model_features().tolist(), [list(DEFAULT_MODEL_FEATURES)])
+
+
+class RiskScoringTests(SimpleTestCase):
+    """get_prediction's float32 row and single predict_proba give the DataFrame path's label and confidence."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        try:
+            import joblib  # noqa: F401
+            import pandas  # noqa: F401
+        except ImportError:
+            raise unittest.SkipTest("joblib / pandas not installed")
+
+    def setUp(self):
+        if not os.path.exists(PREDICTION_MODEL_PATH):
+            self.skipTest(f"{PREDICTION_MODEL_PATH} not available")
+        import joblib
+        with warnings.catch_warnings():
+            # Pickles saved with another scikit-learn version warn on load
+            warnings.simplefilter('ignore')
+            self.model = joblib.load(PREDICTION_MODEL_PATH)
+        self.scorer = RiskScorer(self.model)
+        patcher = mock.patch.dict(registry._models, {'prediction': self.model, 'risk_scorer': self.scorer})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_same_as_the_dataframe_path(self):
+        # Imports pandas
+        from .management.commands.benchmark_risk_scoring import legacy_features, legacy_model_output
+
+        labels = set()
+        for seed in range(40):
+            responses = random_responses(seed, 15)
+            label, probability = legacy_model_output(self.model, legacy_features(responses))
+            labels.add(label)
+
+            self.assertEqual(get_prediction(responses)['risk'], label)
+            top_label, top_probability = risk_top_class(risk_features_from_responses(responses))
+            self.assertEqual(top_label, label)
+            self.assertAlmostEqual(top_probability, probability)
+        self.assertGreater(len(labels), 1)
+
+    def test_one_forest_pass(self):
+        with mock.patch.object(self.scorer.estimator, 'predict') as predict, \
+                mock.patch.object(self.scorer.estimator, 'predict_proba',
+                                  wraps=self.scorer.estimator.predict_proba) as predict_proba:
+            get_prediction(random_responses(0, 15))
+        predict.assert_not_called()
+        self.assertEqual(predict_proba.call_count, 1)
+        self.assertEqual(predict_proba.call_args.args[0].dtype, np.float32)
+
+
+class ApiClientMixin:
+    """Drive sessions through the API with the test client."""
+
+    def use_fresh_state(self):
+        """
+        Give the test its own state store and question bank. Both are
+        process-wide, and TestCase's rollback doesn't reach them.
+        """
+        for target, name, value in ((state_store, '_store', LocalMemoryStore()), (question_bank, '_bank', None)):
+            patcher = mock.patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def post(self, name, data, expected_status=200):
+        # TestCase never commits, so run the on_commit hooks (state store updates) by hand
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse(name), data, content_type='application/json')
+        self.assertEqual(response.status_code, expected_status, response.content[:500])
+        return response.json()
+
+    def start_session(self):
+        """Returns (user_id, session_id) of a new session."""
+        data = self.post('start-session', {'age_group': '9-11'}, 201)
+        return data['user_id'], data['session_id']
+
+    def answer_data(self, user_id, session_id, question, correct=True, response_time_ms=1500, **extra):
+        return dict(extra, user_id=user_id, session_id=session_id, question_id=question['question_id'],
+                    domain=question['domain'], difficulty=question['difficulty'], correct=correct,
+                    response_time_ms=response_time_ms,
+                    mistake_type=None if correct else f"{question['domain']}_error")
+
+    def next_question(self, user_id, session_id, question=None, correct=None, response_time_ms=None, **extra):
+        data = dict(extra, user_id=user_id, session_id=session_id)
+        if question is not None:
+            data.update(last_question_id=question['question_id'], correct=correct,
+                        response_time_ms=response_time_ms)
+        return self.post('get-next-question', data)
+
+    def submit(self, user_id, session_id, question, correct=True, response_time_ms=1500):
+        return self.post('submit-answer', self.answer_data(user_id, session_id, question, correct,
+                                                           response_time_ms), 201)
+
+    def submit_stored(self, user_id, session_id, domain, correct, response_time_ms, mistake_type=None):
+        """Submit an answer to the stored question q_<domain> (created on first use)."""
+        Question.objects.get_or_create(question_id=f'q_{domain}', defaults={
+            'domain': domain, 'difficulty': 'medium', 'question_text': domain, 'options': ['a', 'b'],
+            'correct_option': 'a'})
+        question = {'question_id': f'q_{domain}', 'domain': domain, 'difficulty': 'medium'}
+        return self.post('submit-answer', dict(self.answer_data(user_id, session_id, question, correct,
+                                                                response_time_ms), mistake_type=mistake_type), 201)
+
+    def end_session(self, user_id, session_id):
+        return self.post('end-session', {'user_id': user_id, 'session_id': session_id})
+
+
+class SessionSnapshotQueryTests(ApiClientMixin, TestCase):
+    """The next-question path reads the session's state with one query (SessionStats)."""
+
+    TRANSACTION_CONTROL = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE SAVEPOINT')
+
+    @contextmanager
+    def assertNumStatements(self, expected):
+        """assertNumQueries without transaction control, which differs between TestCase and autocommit."""
+        with CaptureQueriesContext(connection) as queries:
+            yield
+        statements = [query['sql'] for query in queries if not query['sql'].startswith(self.TRANSACTION_CONTROL)]
+        self.assertEqual(len(statements), expected, statements)
+
+    def setUp(self):
+        self.user = User.objects.create(age_group='9-11')
+        session = Session.objects.create(session_id='S_1_01', user=self.user)
+        SessionStats.objects.create(session=session)
+
+    def use_store(self, store):
+        patcher = mock.patch.object(state_store, '_store', store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_snapshot_is_one_query(self):
+        with self.assertNumQueries(1):
+            snapshot = get_session_snapshot('S_1_01')
+        self.assertEqual(snapshot['total'], 0)
+
+        with self.assertNumQueries(1):
+            self.assertIsNone(get_session_snapshot('S_missing'))
+
+    def test_next_question_queries(self):
+        if load_question_model() is None:
+            self.skipTest("question model not available")
+
+        # Without a cache: the snapshot, then the served question's GeneratedQuestion row
+        self.use_store(state_store.DatabaseOnlyStore())
+        for _ in range(3):
+            with self.assertNumStatements(2):
+                question = self.next_question(self.user.user_id, 'S_1_01')
+            self.submit(self.user.user_id, 'S_1_01', question)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(get_session_snapshot('S_1_01')['total'], 3)
+
+    def test_next_question_from_state_store(self):
+        if load_question_model() is None:
+            self.skipTest("question model not available")
+
+        self.use_store(state_store.LocalMemoryStore())
+        self.next_question(self.user.user_id, 'S_1_01')  # miss: read from the database and cached
+
+        # Hit: only the served question's GeneratedQuestion row
+        with self.assertNumStatements(1):
+            self.next_question(self.user.user_id, 'S_1_01')
+
+
+class SessionStatsTests(ApiClientMixin, TestCase):
+    """The SessionStats row kept up to date on submit matches a rebuild from the stored responses."""
+
+    # (domain, correct, response_time_ms, mistake_type)
+    ANSWERS = [
+        ('reading', True, 1500, None),
+        ('reading', False, 800, 'letter_reversal'),
+        ('math', False, 2600, 'number_reversal'),
+        ('attention', True, 4100, None),
+        ('math', True, 1900, None),
+        ('attention', False, 600, 'attention_error'),
+        ('reading', False, 3000, 'letter_reversal'),
+    ]
+    FIELDS = ('total', 'correct', 'impulse_count', 'response_time_sum', 'response_time_sq_sum',
+              'domain_stats', 'mistake_counts', 'last_question_id', 'last_domain', 'last_difficulty')
+
+    def setUp(self):
+        self.use_fresh_state()
+
+    def test_matches_a_rebuild_after_every_answer(self):
+        user_id, session_id = self.start_session()
+        for answer in self.ANSWERS:
+            self.submit_stored(user_id, session_id, *answer)
+
+            stats = SessionStats.objects.get(session_id=session_id)
+            incremental = {field: getattr(stats, field) for field in self.FIELDS}
+            rebuilt = rebuild_session_stats(Session.objects.get(session_id=session_id))
+            self.assertEqual(incremental, {field: getattr(rebuilt, field) for field in self.FIELDS})
+
+        self.assertEqual(state_store.get_state_store().get(session_id)['total'], len(self.ANSWERS))
+        self.assertEqual(get_session_snapshot(session_id)['domain_counts'], {'reading': 3, 'math': 2, 'attention': 2})
+
+
+class AnswerAndNextTests(ApiClientMixin, TestCase):
+    """/answer-and-next/ does what /submit-answer/ followed by /get-next-question/ does."""
+
+    ANSWERS = [(True, 1200), (False, 3500), (True, 2500), (False, 900), (True, 1400), (True, 4200)]
+
+    def setUp(self):
+        if load_question_model() is None:
+            self.skipTest("question model not available")
+        self.use_fresh_state()
+
+    def run_session(self, combined):
+        """
+        For ANSWERS: (domain, difficulty) of every question served, the
+        feature rows the question model was given, and the session's stats.
+        """
+        user_id, session_id = self.start_session()
+        with mock.patch.object(services, 'predict_next_question',
+                               wraps=services.predict_next_question) as predict:
+            question = self.next_question(user_id, session_id)
+            served = [(question['domain'], question['difficulty'])]
+            for correct, response_time_ms in self.ANSWERS:
+                if combined:
+                    data = self.answer_data(user_id, session_id, question, correct, response_time_ms)
+                    question = self.post('answer-and-next', data, 201)['next_question']
+                else:
+                    self.submit(user_id, session_id, question, correct, response_time_ms)
+                    question = self.next_question(user_id, session_id, question, correct, response_time_ms)
+                served.append((question['domain'], question['difficulty']))
+        features = [call.args[1].tolist() for call in predict.call_args_list]
+        stats = SessionStats.objects.get(session_id=session_id)
+        return served, features, (stats.total, stats.correct, stats.domain_stats, stats.mistake_counts)
+
+    def test_same_questions_as_submit_then_next(self):
+        self.assertEqual(self.run_session(combined=True), self.run_session(combined=False))
+
+    def test_error_response_has_no_traceback(self):
+        user_id, session_id = self.start_session()
+        question = self.next_question(user_id, session_id)
+
+        with mock.patch('assessment.views.select_next_question', side_effect=RuntimeError("boom")), \
+                self.assertLogs('assessment.views', 'ERROR') as logs:
+            body = self.post('answer-and-next', self.answer_data(user_id, session_id, question), 500)
+
+        self.assertEqual(body, {'error': 'Question generation failed'})
+        self.assertIn('RuntimeError: boom', logs.output[0])
+        self.assertFalse(UserResponse.objects.filter(session_id=session_id).exists())  # rolled back
+
+
+class PrefetchTests(ApiClientMixin, TestCase):
+    """The prefetched candidate for an outcome is the question served when the answer takes that branch."""
+
+    # Answers take each branch in turn, with that branch's correct / response time
+    BRANCHES = services.PREFETCH_BRANCHES * 3
+
+    def setUp(self):
+        if load_question_model() is None:
+            self.skipTest("question model not available")
+        self.use_fresh_state()
+
+    def run_session(self, prefetch):
+        """(domain, difficulty) of every question served for BRANCHES, and the candidate for each branch taken."""
+        user_id, session_id = self.start_session()
+        question = self.next_question(user_id, session_id, prefetch=prefetch)
+        served, candidates = [(question['domain'], question['difficulty'])], []
+        for branch, correct, response_time_ms in self.BRANCHES:
+            if prefetch:
+                candidates.append(question.pop('prefetch')[branch])
+            self.submit(user_id, session_id, question, correct, response_time_ms)
+            question = self.next_question(user_id, session_id, question, correct, response_time_ms,
+                                          prefetch=prefetch)
+            if prefetch:
+                self.assertTrue(question['prefetch_confirmed'])
+                self.assertEqual(question['question_id'], candidates[-1]['question_id'])
+            served.append((question['domain'], question['difficulty']))
+        return served, candidates
+
+    def test_candidates_are_served(self):
+        served, candidates = self.run_session(prefetch=True)
+        self.assertEqual([(c['domain'], c['difficulty']) for c in candidates], served[1:])
+
+    def test_same_questions_as_without_prefetch(self):
+        self.assertEqual(self.run_session(prefetch=True)[0], self.run_session(prefetch=False)[0])
+
+
+class RescoringTests(ApiClientMixin, TestCase):
+    """rescore_range gives completed sessions the prediction EndSessionView gave them."""
+
+    # (domain, correct, response_time_ms, mistake_type) per session; the last session has no answers
+    SESSIONS = [
+        [('reading', False, 2200, 'letter_reversal'), ('reading', False, 800, 'letter_reversal'),
+         ('math', True, 1700, None), ('attention', True, 1500, None), ('reading', True, 3100, None)],
+        [('math', False, 5200, 'number_reversal'), ('math', False, 6100, 'substitution'),
+         ('reading', True, 1400, None), ('attention', True, 2000, None)],
+        [('attention', False, 500, 'attention_error'), ('attention', False, 700, None),
+         ('math', True, 900, None), ('reading', True, 1100, None), ('attention', True, 950, None)],
+        [('reading', True, 1500, None), ('math', True, 1600, None), ('attention', True, 1700, None)],
+        [],
+    ]
+
+    def setUp(self):
+        self.use_fresh_state()
+
+        self.session_ids = []
+        for answers in self.SESSIONS:
+            user_id, session_id = self.start_session()
+            for answer in answers:
+                self.submit_stored(user_id, session_id, *answer)
+            self.end_session(user_id, session_id)
+            self.session_ids.append(session_id)
+        self.ended = self.predictions()
+        self.vectors = self.feature_vectors()
+
+    def predictions(self):
+        return {prediction['session_id']: prediction for prediction in FinalPrediction.objects.values(
+            'session_id', 'final_label', 'confidence_level', 'key_insights', 'dyslexia_risk_score',
+            'dyscalculia_risk_score', 'attention_risk_score')}
+
+    def feature_vectors(self):
+        return {vector['session_id']: vector for vector in SessionFeatureVector.objects.values(
+            'session_id', 'schema_version', 'total', *RISK_FEATURES)}
+
+    def rescore(self):
+        FinalPrediction.objects.update(final_label='stale', key_insights=[], confidence_level='low')
+        return rescore_range(min(self.session_ids), max(self.session_ids))
+
+    def test_from_stored_feature_vectors(self):
+        counts = self.rescore()
+        self.assertEqual((counts['sessions'], counts['updated'], counts['features_computed']), (5, 5, 0))
+        self.assertEqual(self.predictions(), self.ended)
+
+    def test_from_responses(self):
+        SessionFeatureVector.objects.all().delete()
+        counts = self.rescore()
+        self.assertEqual((counts['updated'], counts['features_computed']), (5, 4))
+        self.assertEqual(self.predictions(), self.ended)
+
+        rebuilt = self.feature_vectors()
+        self.assertEqual(rebuilt.keys(), self.vectors.keys())
+        for session_id, vector in self.vectors.items():
+            for name, value in vector.items():
+                self.assertAlmostEqual(rebuilt[session_id][name], value, places=6, msg=name)
+
+    def test_with_placeholder_model(self):
+        placeholder = PlaceholderPredictionModel()
+        with mock.patch.dict(registry._models, {'prediction': placeholder, 'risk_scorer': RiskScorer(placeholder)}):
+            FinalPrediction.objects.all().delete()
+            for session_id in self.session_ids:
+                user_id = Session.objects.get(session_id=session_id).user_id
+                self.end_session(user_id, session_id)
+            ended = self.predictions()
+            SessionFeatureVector.objects.all().delete()
+            self.rescore()
+            self.assertEqual(self.predictions(), ended)
+
+
+class SessionFeatureVectorTests(ApiClientMixin, TestCase):
+    """EndSessionView stores the session's risk features, and the history returns them."""
+
+    ANSWERS = [('reading', False, 2200, 'letter_reversal'), ('math', False, 600, 'number_reversal'),
+               ('math', True, 1700, None), ('attention', True, 4500, None), ('reading', True, 3100, None)]
+
+    def setUp(self):
+        self.use_fresh_state()
+        self.user_id, self.session_id = self.start_session()
+
+    def history_features(self):
+        return [entry['features'] for entry in self.post('get-user-history', {'user_id': self.user_id})]
+
+    def test_written_at_end_session(self):
+        for answer in self.ANSWERS:
+            self.submit_stored(self.user_id, self.session_id, *answer)
+        self.end_session(self.user_id, self.session_id)
+
+        vector = SessionFeatureVector.objects.get(session_id=self.session_id)
+        self.assertEqual((vector.schema_version, vector.total), (FEATURE_SCHEMA_VERSION, len(self.ANSWERS)))
+        expected = SessionFeatures.from_responses([
+            {'domain': domain, 'correct': correct, 'response_time_ms': response_time_ms, 'mistake_type': mistake_type}
+            for domain, correct, response_time_ms, mistake_type in self.ANSWERS
+        ]).risk_features()
+        for name in RISK_FEATURES:
+            self.assertAlmostEqual(getattr(vector, name), expected[name], msg=name)
+
+        [features] = self.history_features()
+        self.assertEqual(features, {name: getattr(vector, name) for name in RISK_FEATURES})
+
+    def test_no_vector_without_answers(self):
+        self.end_session(self.user_id, self.session_id)
+        self.assertFalse(SessionFeatureVector.objects.exists())
+        self.assertEqual(self.history_features(), [None])
+
+    def test_history_skips_vectors_of_an_older_schema(self):
+        self.submit_stored(self.user_id, self.session_id, *self.ANSWERS[0])
+        self.end_session(self.user_id, self.session_id)
+        SessionFeatureVector.objects.update(schema_version=FEATURE_SCHEMA_VERSION - 1)
+        self.assertEqual(self.history_features(), [None])
+
+
+@override_settings(ASSESSMENT_EARLY_STOPPING={'ENABLED': True, 'THRESHOLD': 0.8, 'CONSECUTIVE': 3,
+                                              'MIN_ITEMS': 8, 'MAX_ITEMS': 15})
+class EarlyStoppingTests(ApiClientMixin, TestCase):
+    """Sessions end once the risk model's top class has been confident for CONSECUTIVE answers."""
+
+    def setUp(self):
+        self.use_fresh_state()
+
+    def test_streak(self):
+        stats = SessionStats(domain_stats={}, mistake_counts={}, irt_responses={})
+        apply_response(stats, 'reading', 'medium', True, 1500)
+        steps = [
+            (('dyslexia-risk', 0.9), 'dyslexia-risk', 1),
+            (('dyslexia-risk', 0.85), 'dyslexia-risk', 2),
+            (('low-risk', 0.95), 'low-risk', 1),  # another class starts over
+            (('low-risk', 0.6), None, 0),  # below THRESHOLD
+            (None, None, 0),  # no predict_proba
+        ]
+        for top, label, streak in steps:
+            with mock.patch('assessment.stopping.risk_top_class', return_value=top):
+                update_stopping_state(stats)
+            self.assertEqual((stats.stop_label, stats.stop_streak), (label, streak))
+
+    def test_stop_reason(self):
+        self.assertIsNone(stop_reason({'total': 7, 'stop_streak': 5}))  # before MIN_ITEMS
+        self.assertIsNone(stop_reason({'total': 8, 'stop_streak': 2}))
+        self.assertEqual(stop_reason({'total': 8, 'stop_streak': 3}), 'confident')
+        self.assertEqual(stop_reason({'total': 15, 'stop_streak': 0}), 'max_items')
+        with override_settings(ASSESSMENT_EARLY_STOPPING={'ENABLED': False}):
+            self.assertIsNone(stop_reason({'total': 14, 'stop_streak': 5}))
+            self.assertEqual(stop_reason({'total': 15, 'stop_streak': 0}), 'max_items')
+
+    def test_confident_session_ends_early(self):
+        if load_question_model() is None or not hasattr(load_prediction_model(), 'predict_proba'):
+            self.skipTest("question model or risk model with predict_proba not available")
+
+        user_id, session_id = self.start_session()
+        for total in range(1, 16):
+            self.submit_stored(user_id, session_id, ['reading', 'math', 'attention'][total % 3], True, 1500)
+            question = self.next_question(user_id, session_id)
+            if question.get('end_session'):
+                break
+
+        self.assertEqual(question['stop_reason'], 'confident')
+        self.assertGreaterEqual(total, 8)
+        self.assertLess(total, 15)
+        stats = SessionStats.objects.get(session_id=session_id)
+        self.assertGreaterEqual(stats.stop_streak, 3)
+        self.assertEqual(stop_reason(get_session_snapshot(session_id)), 'confident')
+
+
+class GeneratedQuestionStorageTests(ApiClientMixin, TestCase):
+    """Generated questions are stored as (template_id, seed) rows once they are served."""
+
+    def setUp(self):
+        if load_question_model() is None:
+            self.skipTest("question model not available")
+        self.use_fresh_state()
+
+    def stored(self):
+        return {generated_question_id(seed) for seed in GeneratedQuestion.objects.values_list('seed', flat=True)}
+
+    def test_prefetch_candidates_are_stored_once_served(self):
+        user_id, session_id = self.start_session()
+        question = self.next_question(user_id, session_id, prefetch=True)
+        candidates = question.pop('prefetch')
+        self.assertEqual(self.stored(), {question['question_id']})
+
+        self.submit(user_id, session_id, question, correct=True, response_time_ms=1500)
+        served = self.next_question(user_id, session_id, question, correct=True, response_time_ms=1500)
+        self.assertTrue(served['prefetch_confirmed'])
+        self.assertEqual(served['question_id'], candidates['correct_fast']['question_id'])
+        self.assertEqual(self.stored(), {question['question_id'], served['question_id']})
+
+        # The stored row rebuilds exactly what was served
+        regenerated = GeneratedQuestion.objects.get(seed=parse_generated_question_id(served['question_id'])).regenerate()
+        self.assertEqual(regenerated, {key: served[key] for key in regenerated})
+
+    def test_seed_collision_keeps_the_stored_row(self):
+        GeneratedQuestion.objects.create(seed=42, template_id='reading.easy.rhyme_cat', catalog_version=1)
+        with self.assertLogs('assessment.services', 'WARNING') as logs:
+            save_generated_questions([{'seed': 42, 'template_id': 'reading.easy.starts_with'},
+                                      {'seed': 43, 'template_id': 'reading.easy.starts_with'}])
+        self.assertIn(generated_question_id(42), logs.output[0])
+        self.assertEqual(GeneratedQuestion.objects.get(seed=42).template_id, 'reading.easy.rhyme_cat')
+        self.assertEqual(GeneratedQuestion.objects.get(seed=43).template_id, 'reading.easy.starts_with')
+
+
+class IrtItemLookupTests(TestCase):
+    """An answer's IRT item is only looked up while ASSESSMENT_IRT is enabled."""
+
+    QUESTION_ID = 'G_000000000000002a'
+
+    def setUp(self):
+        self.user = User.objects.create(age_group='9-11')
+        session = Session.objects.create(session_id='S_1_01', user=self.user)
+        SessionStats.objects.create(session=session)
+        patcher = mock.patch.object(state_store, '_store', DatabaseOnlyStore())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def answer(self):
+        response = self.client.post(reverse('submit-answer'), {
+            'user_id': self.user.user_id, 'session_id': 'S_1_01', 'question_id': self.QUESTION_ID,
+            'domain': 'reading', 'difficulty': 'easy', 'correct': True, 'response_time_ms': 1500,
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        return SessionStats.objects.get(session_id='S_1_01').irt_responses
+
+    @override_settings(ASSESSMENT_IRT={'ENABLED': False})
+    def test_no_lookup_when_irt_is_off(self):
+        with mock.patch('assessment.services.answer_item_id') as lookup:
+            self.assertEqual(self.answer(), {})
+        lookup.assert_not_called()
+
+    @override_settings(ASSESSMENT_IRT={'ENABLED': True})
+    def test_lookup_when_irt_is_on(self):
+        with mock.patch('assessment.services.answer_item_id', return_value='reading_easy_1') as lookup:
+            self.assertEqual(self.answer(), {'reading': [['reading_easy_1', 'easy', True]]})
+        lookup.assert_called_once_with(self.QUESTION_ID)
+
+
+@override_settings(ASSESSMENT_IRT={'ENABLED': True},
+                   ASSESSMENT_EARLY_STOPPING={'ENABLED': True, 'MIN_ITEMS': 8, 'MAX_ITEMS': 30, 'SE_THRESHOLD': 0.7})
+class IrtPrecisionStopTests(TestCase):
+    """With SE_THRESHOLD set, IRT sessions end once every domain's ability is precise enough."""
+
+    def setUp(self):
+        patcher = mock.patch.object(irt, '_bank', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def snapshot(self, answers_per_domain, domains=('attention', 'math', 'reading')):
+        """Snapshot with alternating outcomes on prior-parameter (uncalibrated) items."""
+        irt_responses = {
+            domain: [[f'{domain}_item_{i}', 'medium', i % 2 == 0] for i in range(answers_per_domain)]
+            for domain in domains
+        }
+        return {'total': answers_per_domain * len(domains), 'stop_streak': 0, 'irt_responses': irt_responses}
+
+    def test_stops_once_every_domain_is_precise(self):
+        # Prior items: the standard error is 0.78 after 3 answers and 0.69 after 5
+        self.assertIsNone(stop_reason(self.snapshot(3)))
+        self.assertEqual(stop_reason(self.snapshot(5)), 'irt_precision')
+
+    def test_every_domain_needs_answers(self):
+        self.assertIsNone(stop_reason(self.snapshot(8, domains=('math', 'reading'))))
+
+    def test_min_items_and_max_items_still_apply(self):
+        with override_settings(ASSESSMENT_EARLY_STOPPING={'ENABLED': True, 'MIN_ITEMS': 16, 'MAX_ITEMS': 30,
+                                                         'SE_THRESHOLD': 0.7}):
+            self.assertIsNone(stop_reason(self.snapshot(5)))
+        with override_settings(ASSESSMENT_EARLY_STOPPING={'ENABLED': True, 'MAX_ITEMS': 15, 'SE_THRESHOLD': 0.7}):
+            self.assertEqual(stop_reason(self.snapshot(5)), 'max_items')
+
+    def test_off_without_threshold_or_irt(self):
+        with override_settings(ASSESSMENT_EARLY_STOPPING={'ENABLED': True, 'MAX_ITEMS': 30}):
+            self.assertIsNone(stop_reason(self.snapshot(8)))
+        with override_settings(ASSESSMENT_IRT={'ENABLED': False}):
+            self.assertIsNone(stop_reason(self.snapshot(8)))
+
+
+class RankedQuestionQueryTests(TestCase):
+    """
+    The rule-based question fallback: pick_unanswered_question walks the
+    fallback tiers in order and skips answered questions.
+    """
+
+    def setUp(self):
+        patcher = mock.patch.object(question_bank, '_bank', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create(age_group='9-11')
+        self.session = Session.objects.create(session_id='S_1_01', user=self.user)
+        for question_id, domain, difficulty, age_group in (
+            ('q_age', 'reading', 'easy', '9-11'),
+            ('q_all', 'reading', 'easy', ''),
+            ('q_domain', 'reading', 'hard', ''),
+            ('q_difficulty', 'math', 'easy', ''),
+            ('q_other', 'math', 'hard', ''),
+        ):
+            Question.objects.create(question_id=question_id, domain=domain, difficulty=difficulty,
+                                    age_group=age_group, question_text=question_id, options=['a', 'b'],
+                                    correct_option='a')
+
+    def answer(self, question_id):
+        UserResponse.objects.create(session=self.session, user=self.user, question_id=question_id,
+                                    domain='reading', difficulty='easy', correct=True, response_time_ms=1500)
+
+    def test_tiers_in_order(self):
+        for expected in ('q_age', 'q_all', 'q_domain', 'q_difficulty', 'q_other'):
+            question = pick_unanswered_question('S_1_01', 'reading', 'easy', '9-11')
+            self.assertEqual(question.question_id, expected)
+            self.answer(expected)
+        self.assertIsNone(pick_unanswered_question('S_1_01', 'reading', 'easy', '9-11'))
+
+    def test_without_age_group(self):
+        self.assertEqual(pick_unanswered_question('S_1_01', 'reading', 'easy').question_id, 'q_all')
+
+    def test_values_equal_to_the_stand_ins(self):
+        Question.objects.filter(question_id='q_age').update(domain='<age_group>', age_group='<domain>')
+        question = pick_unanswered_question('S_1_01', '<age_group>', 'easy', '<domain>')
+        self.assertEqual(question.question_id, 'q_age')
+
+    def test_no_model_skips_the_ml_path(self):
+        with mock.patch('assessment.adaptive_logic.load_question_model', return_value=None), \
+                mock.patch('assessment.ml_utils.get_next_question_ml') as get_next_question_ml:
+            question = get_adaptive_question('S_1_01', age_group='9-11')
+        get_next_question_ml.assert_not_called()
+        self.assertEqual(question.question_id, 'q_age')  # first question: reading, easy
+
+
+class QuestionBankTests(ApiClientMixin, TestCase):
+    """The in-memory question bank serves lookups and is rebuilt only when questions change."""
+
+    def setUp(self):
+        patcher = mock.patch.object(question_bank, '_bank', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        Question.objects.create(question_id='R_01', domain='reading', difficulty='easy', question_text='R_01',
+                                options=['a', 'b'], correct_option='a')
+
+    def test_lookup_from_the_bank(self):
+        bank = question_bank.get_question_bank()
+        with self.assertNumQueries(0):
+            self.assertEqual(bank.get('R_01').question_text, 'R_01')
+        self.assertIsNone(bank.get('R_99'))
+
+    def test_question_save_rebuilds_the_bank(self):
+        question_bank.get_question_bank()
+        with self.captureOnCommitCallbacks(execute=True):
+            Question.objects.filter(question_id='R_01').first().save()
+        self.assertIsNone(question_bank._bank)
+
+    def test_unknown_question_keeps_the_bank(self):
+        bank = question_bank.get_question_bank()
+        user_id, session_id = self.start_session()
+        question = {'question_id': 'R_99', 'domain': 'math', 'difficulty': 'hard'}
+
+        with self.assertLogs('assessment.services', 'WARNING'):
+            self.submit(user_id, session_id, question)
+        self.assertIs(question_bank._bank, bank)
+        self.assertEqual(UserResponse.objects.get(session_id=session_id).question.question_text, 'Test question')
+
+        # Answered again: the placeholder is found, nothing is logged or inserted
+        with self.assertNoLogs('assessment.services', 'WARNING'):
+            self.submit(user_id, session_id, question)
+        self.assertEqual(Question.objects.filter(question_id='R_99').count(), 1)
+
+
+class AgeGroupSamplingTests(ApiClientMixin, TestCase):
+    """
+    Questions for the session's age group are served before those for every
+    age, and picks within a (age_group, domain, difficulty) cell are random.
+    """
+
+    def setUp(self):
+        self.use_fresh_state()
+        self.rows = [
+            ('q_age', 'reading', 'easy', '9-11'),
+            ('q_younger', 'reading', 'easy', '6-8'),
+            ('q_all', 'reading', 'easy', ''),
+            ('q_domain', 'reading', 'hard', ''),
+            ('q_difficulty', 'math', 'easy', ''),
+            ('q_other', 'math', 'hard', ''),
+        ]
+
+    def create_questions(self, rows, **fields):
+        for question_id, domain, difficulty, age_group in rows:
+            Question.objects.create(question_id=question_id, domain=domain, difficulty=difficulty,
+                                    age_group=age_group, question_text=question_id, options=['a', 'b'],
+                                    correct_option='a', **fields)
+
+    def bank(self, rows):
+        return question_bank.QuestionBank([row + (row[0], ['a', 'b'], 'a') for row in rows], seed=0)
+
+    def picks(self, bank, age_group):
+        """Question ids picked in turn for (reading, easy) until the bank runs out."""
+        answered, picked = question_bank.AnsweredSet(len(bank)), []
+        while (question := bank.pick(answered, 'reading', 'easy', age_group)) is not None:
+            picked.append(question.question_id)
+            answered.add(bank.positions[question.question_id])
+        return picked
+
+    def test_bank_tiers_in_order(self):
+        bank = self.bank(self.rows)
+        picked = self.picks(bank, '9-11')
+        self.assertEqual(picked[:2], ['q_age', 'q_all'])
+        self.assertEqual(set(picked[2:4]), {'q_younger', 'q_domain'})  # the domain tier covers every age
+        self.assertEqual(picked[4:], ['q_difficulty', 'q_other'])
+        self.assertEqual(self.picks(bank, '')[0], 'q_all')
+
+    def test_bank_picks_at_random_within_a_cell(self):
+        cell = [(f'q_{i}', 'reading', 'easy', '9-11') for i in range(10)]
+        bank = self.bank(cell)
+        with mock.patch.object(question_bank.random, 'randrange', side_effect=range(len(cell))):
+            first = {bank.pick(question_bank.AnsweredSet(len(bank)), 'reading', 'easy', '9-11').question_id
+                     for _ in cell}
+        self.assertEqual(first, {row[0] for row in cell})
+
+    def test_query_seeks_from_a_random_key(self):
+        self.create_questions([('q_1', 'reading', 'easy', '9-11')], random_key=0.1)
+        self.create_questions([('q_5', 'reading', 'easy', '9-11')], random_key=0.5)
+        self.create_questions([('q_9', 'reading', 'easy', '9-11')], random_key=0.9)
+        self.create_questions([('q_all', 'reading', 'easy', '')], random_key=0.95)
+        for start, expected in ((0.0, 'q_1'), (0.4, 'q_5'), (0.6, 'q_9'), (0.95, 'q_1')):
+            with mock.patch('assessment.adaptive_logic.random.random', return_value=start):
+                self.assertEqual(pick_unanswered_question('S_1_01', 'reading', 'easy', '9-11').question_id, expected)
+
+    def test_random_keys_assigned_on_create(self):
+        self.create_questions(self.rows)
+        keys = list(Question.objects.values_list('random_key', flat=True))
+        self.assertTrue(all(0 <= key < 1 for key in keys))
+        self.assertEqual(len(set(keys)), len(keys))
+
+    def test_session_age_group_is_served_first(self):
+        self.create_questions(self.rows)
+        user_id, session_id = self.start_session()
+        self.assertEqual(get_session_snapshot(session_id)['age_group'], '9-11')
+        for enabled in (True, False):
+            with self.subTest(bank=enabled), \
+                    self.settings(ASSESSMENT_QUESTION_BANK={'ENABLED': enabled}), \
+                    mock.patch('assessment.services.load_question_model', return_value=None), \
+                    mock.patch('assessment.adaptive_logic.load_question_model', return_value=None):
+                self.assertEqual(self.next_question(user_id, session_id)['question_id'], 'q_age')
+
+
+class QuestionPoolTests(SimpleTestCase):
+    """Pools hand out pregenerated questions and fall back to generating one when empty."""
+
+    def generate(self, domain, difficulty):
+        self.generated += 1
+        return {'domain': domain, 'difficulty': difficulty, 'n': self.generated}
+
+    def start_pool(self, generate, **options):
+        pool = QuestionPool(generate, **options)
+        self.addCleanup(pool.stop)
+        return pool
+
+    def setUp(self):
+        self.generated = 0
+
+    def test_take_from_a_refilled_pool(self):
+        pool = self.start_pool(self.generate, target_depth=4, low_watermark=1, refill_interval_s=60)
+        pool.refill()
+        question = pool.take('math', 'hard')
+        self.assertEqual((question['domain'], question['difficulty']), ('math', 'hard'))
+        self.assertEqual(pool.stats()['hits'], 1)
+
+        # Not a pooled cell: generated on the spot
+        self.assertEqual(pool.take('writing', 'easy')['domain'], 'writing')
+
+    def test_refill_failure_is_logged(self):
+        def failing(domain, difficulty):
+            raise ValueError("template error")
+
+        with self.assertLogs('assessment.question_pool', 'ERROR') as logs:
+            self.start_pool(failing, refill_interval_s=60)
+            deadline = time.monotonic() + 5
+            while not logs.output and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self.assertIn('refill failed', logs.output[0])
+        self.assertIsNotNone(logs.records[0].exc_info)
+
+    def test_disabled_by_default(self):
+        with self.settings(ASSESSMENT_QUESTION_POOL={}):
+            self.assertIsNone(get_question_pool(self.generate))
+
+
+class DecisionTableTests(SimpleTestCase):
+    """The compiled decision table answers exactly what the question model predicts."""
+
+    ROWS = 20000
+
+    def setUp(self):
+        self.model = load_question_model()
+        self.table = registry.get('question_table')
+        if self.model is None or self.table is None:
+            self.skipTest("question model or decision table not available")
+        self.rng = np.random.default_rng(0)
+
+    def rows(self, discrete_rows, accuracies):
+        """ROWS random feature rows; response times include every split boundary of the table."""
+        times = np.concatenate([boundary_values(self.table.edges[TIME_FEATURE]),
+                                self.rng.uniform(0, 20000, 200), [2000]])
+        picks = self.rng.integers(len(discrete_rows), size=self.ROWS)
+        X = np.empty((self.ROWS, 7))
+        X[:, DISCRETE_FEATURES] = np.asarray(discrete_rows, dtype=float)[picks]
+        X[:, TIME_FEATURE] = self.rng.choice(times, self.ROWS)
+        X[:, ACCURACY_FEATURE] = self.rng.choice(accuracies, self.ROWS)
+        return X
+
+    def test_serving_inputs(self):
+        X = self.rows(SERVING_DISCRETE_ROWS, session_accuracy_values(15))
+        prediction, covered = self.table.lookup(X)
+        self.assertTrue(covered.all())
+        np.testing.assert_array_equal(prediction, self.model.predict(X))
+
+    def test_other_inputs_go_to_the_model(self):
+        discrete_rows = [(correct, *one_hot, domain) for correct in (0, 1)
+                         for one_hot in ((1, 0, 0), (0, 1, 0), (0, 0, 1), (0, 0, 0)) for domain in (0, 1, 2, 3)]
+        X = self.rows(discrete_rows, self.rng.uniform(0, 1, 500))
+        self.assertFalse(self.table.lookup(X)[1].all())
+        np.testing.assert_array_equal(self.table.predict(X, fallback=self.model.predict), self.model.predict(X))
+        with self.assertRaises(ValueError):
+            self.table.predict(X)
+
+    def test_save_and_load_round_trip(self):
+        self.assertEqual(self.table.fingerprint, model_fingerprint(self.model))
+        X = self.rows(SERVING_DISCRETE_ROWS, session_accuracy_values(15))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'question_table.npz')
+            self.table.save(path)
+            loaded = DecisionTable.load(path)
+        self.assertEqual(loaded.fingerprint, self.table.fingerprint)
+        np.testing.assert_array_equal(loaded.predict(X), self.table.predict(X))
+
+
+class InferenceBatcherTests(SimpleTestCase):
+    """Batched calls give every caller what a direct call on its own rows gives."""
+
+    @staticmethod
+    def scale(model, X):
+        return X * model
+
+    def call_concurrently(self, call, requests):
+        """call(model, X) for each request from its own thread, all at once; returns the results in order."""
+        results = [None] * len(requests)
+        barrier = threading.Barrier(len(requests))
+
+        def run(i, model, X):
+            barrier.wait()
+            try:
+                results[i] = call(model, X)
+            except Exception as e:
+                results[i] = e
+
+        threads = [threading.Thread(target=run, args=(i, *request)) for i, request in enumerate(requests)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_requests_share_model_calls(self):
+        batcher = InferenceBatcher('test', self.scale, window_ms=50, timeout_ms=5000)
+        requests = [(2 if i % 3 else 3, np.full((1 + i % 2, 4), float(i))) for i in range(12)]
+        results = self.call_concurrently(batcher.submit, requests)
+
+        for (model, X), result in zip(requests, results):
+            np.testing.assert_array_equal(result, self.scale(model, X))
+        stats = batcher.stats()
+        self.assertEqual(stats['rows'], sum(len(X) for _, X in requests))
+        self.assertLess(stats['model_calls'], len(requests))
+        self.assertEqual(stats['timeouts'], 0)
+
+    def test_errors_reach_every_caller(self):
+        def fail(model, X):
+            raise RuntimeError("model failed")
+
+        batcher = InferenceBatcher('test', fail, window_ms=50, timeout_ms=5000)
+        for result in self.call_concurrently(batcher.submit, [(1, np.ones((1, 2)))] * 4):
+            self.assertIsInstance(result, RuntimeError)
+
+    def test_timeout_runs_the_model_directly(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def slow_in_batcher(model, X):
+            if threading.current_thread().name.startswith('inference-batcher'):
+                release.wait()
+            return self.scale(model, X)
+
+        batcher = InferenceBatcher('test', slow_in_batcher, window_ms=0, timeout_ms=20)
+        np.testing.assert_array_equal(batcher.submit(2, np.ones((1, 2))), np.full((1, 2), 2.0))
+        self.assertEqual(batcher.stats()['timeouts'], 1)
+
+    @override_settings(ASSESSMENT_INFERENCE_BATCHING={'ENABLED': True, 'WINDOW_MS': 20, 'TIMEOUT_MS': 5000})
+    def test_question_model_through_the_batcher(self):
+        model = load_question_model()
+        if model is None:
+            self.skipTest("question model not available")
+        rng = np.random.default_rng(0)
+        X = np.empty((16, 7))
+        X[:, DISCRETE_FEATURES] = np.array(SERVING_DISCRETE_ROWS)[rng.integers(len(SERVING_DISCRETE_ROWS), size=16)]
+        X[:, TIME_FEATURE] = rng.integers(300, 9000, 16)
+        X[:, ACCURACY_FEATURE] = rng.choice(session_accuracy_values(15), 16)
+
+        # Without the decision table every row goes to the model, through the batcher
+        with mock.patch.dict(inference_batcher._batchers, clear=True), \
+                mock.patch.dict(registry._models, {'question_table': None}):
+            results = self.call_concurrently(predict_next_question, [(model, X[i:i + 1]) for i in range(len(X))])
+            stats = inference_batcher.batcher_stats()['question']
+        np.testing.assert_array_equal(np.vstack(results), model.predict(X))
+        self.assertEqual(stats['rows'], len(X))
+
+
+class QuestionCheckMixin:
+    """Check generated questions against their catalog template."""
+
+    OPERATIONS = {
+        'add': lambda a, b: a + b,
+        'subtract': lambda a, b: a - b,
+        'multiply': lambda a, b: a * b,
+        'divide': lambda a, b: a // b,
+        'multiply_add': lambda a, b, c: a * b + c,
+    }
+
+    def assertValidQuestion(self, template, text, options, correct):
+        options = list(options)
+        self.assertEqual(len(set(options)), len(options), options)
+        self.assertTrue(0 <= correct < len(options))
+        answer = options[correct]
+
+        if template.kind == 'fixed':
+            self.assertEqual((text, options, correct), (template.text, list(template.options), template.answer))
+        elif template.kind == 'letter_word':
+            self.assertEqual(sorted(options), sorted(template.words))
+            self.assertEqual(answer, template.words[template.texts.index(text)])
+        else:
+            if template.kind == 'arithmetic':
+                values = [int(value) for value in re.findall(r'\d+', text)]
+                expected = self.OPERATIONS[template.operation](*values)
+                if template.operation == 'divide':
+                    self.assertEqual(values[0] % values[1], 0, text)
+            else:
+                self.assertTrue(text.startswith(template.prefix), text)
+                expected = text[len(template.prefix):].count(StarCountTemplate.STAR)
+            self.assertEqual(answer, str(expected), text)
+            self.assertTrue(all(int(option) > 0 for option in options), options)
+
+
+class BulkQuestionGenerationTests(QuestionCheckMixin, SimpleTestCase):
+    """QuestionGeneratorModel.generate_questions builds valid questions, reproducibly by seed."""
+
+    CELLS = [(domain, difficulty) for domain in ('reading', 'math', 'attention')
+             for difficulty in ('easy', 'medium', 'hard')]
+
+    def setUp(self):
+        self.generator = QuestionGeneratorModel()
+        self.catalog = get_catalog()
+
+    def test_valid_questions_for_every_cell(self):
+        for domain, difficulty in self.CELLS:
+            batch = self.generator.generate_questions(domain, difficulty, 300, seed=1)
+            templates = self.catalog.cell(domain, difficulty)
+            self.assertEqual((batch['domain'], batch['difficulty']), (domain, difficulty))
+            self.assertEqual(set(batch['template_id']), {template.id for template in templates})
+            for i in range(300):
+                with self.subTest(domain=domain, difficulty=difficulty, row=i):
+                    self.assertValidQuestion(self.catalog.get(batch['template_id'][i]), batch['question_text'][i],
+                                             batch['options'][i], batch['correct_index'][i])
+                    self.assertEqual(batch['correct_option'][i], batch['options'][i][batch['correct_index'][i]])
+
+    def test_same_seed_same_batch(self):
+        first, again, other = (self.generator.generate_questions('math', 'hard', 50, seed=seed) for seed in (7, 7, 8))
+        for key in ('template_id', 'question_text', 'options', 'correct_index'):
+            np.testing.assert_array_equal(first[key], again[key])
+        self.assertFalse(np.array_equal(first['question_text'], other['question_text']))
+
+    def test_numeric_domain_and_difficulty(self):
+        batch = self.generator.generate_questions(1, 2, 5, seed=0)
+        self.assertEqual((batch['domain'], batch['difficulty']), ('math', 'hard'))
+
+
+class QuestionCatalogTests(QuestionCheckMixin, SimpleTestCase):
+    """The compiled template catalog: valid questions, addressed by (template_id, seed)."""
+
+    def setUp(self):
+        self.catalog = get_catalog()
+
+    def test_catalog_file(self):
+        with open(CATALOG_PATH, encoding='utf-8') as f:
+            spec = json.load(f)
+        self.assertEqual(self.catalog.version, spec['version'])
+        self.assertEqual(len(self.catalog.templates), len(spec['templates']))  # ids are unique
+        for domain in ('reading', 'math', 'attention'):
+            for difficulty in ('easy', 'medium', 'hard'):
+                self.assertIn((domain, difficulty), self.catalog.cells)
+        self.assertEqual(self.catalog.cell('spelling', 'easy'), self.catalog.cell('reading', 'easy'))
+
+    def test_every_template_by_seed(self):
+        for template_id, template in self.catalog.templates.items():
+            for seed in range(100):
+                with self.subTest(template=template_id, seed=seed):
+                    question = self.catalog.generate(template_id, seed)
+                    self.assertValidQuestion(template, *question)
+                    self.assertEqual(self.catalog.generate(template_id, seed), question)
+
+    def test_generate_question_is_reproducible(self):
+        generator = QuestionGeneratorModel()
+        for domain, difficulty in BulkQuestionGenerationTests.CELLS:
+            question = generator.generate_question(domain, difficulty)
+            text, options, correct = self.catalog.generate(question['template_id'], question['seed'])
+            self.assertEqual((question['domain'], question['difficulty']), (domain, difficulty))
+            self.assertEqual((question['question_text'], question['options'], question['correct_option']),
+                             (text, options, options[correct]))
+
+    def test_generated_question_ids(self):
+        for seed in (0, 42, (1 << 63) - 1):
+            question_id = generated_question_id(seed)
+            self.assertLessEqual(len(question_id), 20)
+            self.assertEqual(parse_generated_question_id(question_id), seed)
+        for question_id in ('Q_S_1_01_1', 'G_2a', 'G_zzzzzzzzzzzzzzzz', 'G_8000000000000000'):
+            self.assertIsNone(parse_generated_question_id(question_id), question_id)
+
+
+class FlatForestParityTests(SimpleTestCase):
+    """FlatForest gives exactly scikit-learn's predict_proba and predict on the training CSVs."""
+
+    ROWS = 1000
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        try:
+            import joblib
+            import pandas as pd
+        except ImportError:
+            raise unittest.SkipTest("joblib / pandas not installed")
+        cls.joblib, cls.pd = joblib, pd
+        # The question model was pickled from inside assessment/, see ml_utils
+        assessment_dir = os.path.dirname(os.path.abspath(__file__))
+        if assessment_dir not in sys.path:
+            sys.path.append(assessment_dir)
+
+    def load(self, path):
+        if not path or not os.path.exists(path):
+            self.skipTest(f"{path or 'model'} not available")
+        with warnings.catch_warnings():
+            # Pickles saved with another scikit-learn version warn on load
+            warnings.simplefilter('ignore')
+            return self.joblib.load(path)
+
+    def read_csv(self, path, columns):
+        if not os.path.exists(path):
+            self.skipTest(f"{path} not available")
+        return self.pd.read_csv(path, nrows=self.ROWS)[list(columns)]
+
+    def assert_parity(self, forest, X):
+        flat = FlatForest.from_sklearn(forest)
+        # scikit-learn gets the DataFrame only if the forest was fitted with feature names
+        X_sklearn = X if hasattr(forest, 'feature_names_in_') else X.values
+        np.testing.assert_array_equal(flat.predict_proba(X.values), forest.predict_proba(X_sklearn))
+        np.testing.assert_array_equal(flat.predict(X.values), forest.predict(X_sklearn))
+        np.testing.assert_array_equal(flat.predict_proba(X.values[:1]), forest.predict_proba(X_sklearn[:1]))
+
+    def test_question_model(self):
+        model = self.load(resolve_question_model_path())
+        X = self.read_csv(os.path.join(settings.BASE_DIR, 'assessment', 'training_data_phase1.csv'),
+                          QUESTION_FEATURES)
+        for name in ('domain_classifier', 'difficulty_classifier'):
+            with self.subTest(forest=name):
+                self.assert_parity(getattr(model, name), X)
+
+    def test_prediction_model(self):
+        model = self.load(PREDICTION_MODEL_PATH)
+        columns = getattr(model, 'feature_names_in_', RISK_FEATURES)
+        X = self.read_csv(os.path.join(settings.BASE_DIR.parent, 'clinical_data.csv'), columns)
+        self.assert_parity(model, X)
+
+    def test_save_and_load_round_trip(self):
+        model = self.load(PREDICTION_MODEL_PATH)
+        columns = getattr(model, 'feature_names_in_', RISK_FEATURES)
+        X = self.read_csv(os.path.join(settings.BASE_DIR.parent, 'clinical_data.csv'), columns)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'prediction_model.npz')
+            save_forests(path, {'risk': FlatForest.from_sklearn(model)}, 'digest')
+            forests, digest = load_forests(path)
+
+        self.assertEqual(digest, 'digest')
+        np.testing.assert_array_equal(forests['risk'].predict(X.values), model.predict(X))
+        self.assertEqual(list(forests['risk'].feature_names_in_), list(columns))
+
+
+class LazyMlImportTests(SimpleTestCase):
+    """The serving modules reach ml_utils through assessment.ml, which imports it on first call."""
+
+    # Run in a fresh interpreter: import what a worker started without the model warm-up imports
+    WORKER_SCRIPT = """
+import json, sys
+import django
+django.setup()
+from django.conf import settings
+from importlib import import_module
+import_module(settings.ROOT_URLCONF)
+from assessment import ml
+def imported():
+    return [name for name in ('assessment.ml_utils', 'joblib', 'sklearn') if name in sys.modules]
+before = imported()
+ml.load_question_model()
+print(json.dumps([before, imported()]))
+"""
+
+    def test_ml_utils_imported_on_first_call(self):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='ld_screening.settings', ASSESSMENT_PRELOAD_MODELS='0')
+        process = subprocess.run([sys.executable, '-c', self.WORKER_SCRIPT], cwd=settings.BASE_DIR, env=env,
+                                 capture_output=True, text=True, encoding='utf-8')
+        self.assertEqual(process.returncode, 0, process.stderr[-2000:])
+        before, after = json.loads(process.stdout.splitlines()[-1])
+        self.assertEqual(before, [])
+        self.assertIn('assessment.ml_utils', after)
+
+    def test_calls_are_delegated(self):
+        with mock.patch('assessment.ml_utils.predict_risk', return_value='High Risk') as predict_risk:
+            self.assertEqual(ml.predict_risk([0.5], age_group='9-11'), 'High Risk')
+        predict_risk.assert_called_once_with([0.5], age_group='9-11')
+        self.assertEqual(ml.predict_risk.__name__, 'predict_risk')
+
+    def test_serving_modules_use_the_facade(self):
+        self.assertIs(services.load_question_model, ml.load_question_model)
+        self.assertIs(views.get_prediction, ml.get_prediction)
+        self.assertIs(stopping.risk_top_class, ml.risk_top_class)
@@ -1,12 +1,14 @@
 """
 API Views for LD Screening Assessment.
 """
+import logging
+
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from django.db import transaction
 
-from .models import User, Session, Question, UserResponse, MistakePattern, FinalPrediction
+from .models import User, Session, SessionStats, SessionFeatureVector, FinalPrediction
 from .serializers import (
     StartSessionRequestSerializer,
     StartSessionResponseSerializer,
@@ -14,13 +16,18 @@ from .serializers import (
     QuestionResponseSerializer,
     SubmitAnswerRequestSerializer,
     SubmitAnswerResponseSerializer,
+    AnswerAndNextRequestSerializer,
     EndSessionRequestSerializer,
     EndSessionResponseSerializer,
     GetDashboardDataRequestSerializer,
     DashboardDataResponseSerializer,
 )
-from .adaptive_logic import get_adaptive_question
-from .ml_utils import get_prediction
+from .ml import get_prediction, predict_risk, risk_features_from_stats, risk_features_from_vector
+from .session_features import FEATURE_SCHEMA_VERSION, SessionFeatures
+from .services import select_next_question, store_answer
+from .session_state import forget_session_snapshot, get_session_stats, load_session_snapshot, snapshot_from_stats
+
+logger = logging.getLogger(__name__)
 
 
 class StartSessionView(APIView):
@@ -57,6 +64,9 @@ class StartSessionView(APIView):
                 session_id=session_id,
                 user=user
             )
+            
+            # Running aggregates, updated on every submitted answer
+            SessionStats.objects.create(session=session)
         
         response_data = {
             'user_id': user.user_id,
@@ -89,6 +99,16 @@ class GetNextQuestionView(APIView):
             "question_text": "Which letter is this?",
             "options": ["b", "d", "p", "q"]
         }
+    
+    With "prefetch": true the response also carries
+    "prefetch": {"correct_fast": {...}, "incorrect_or_slow": {...}} - the
+    question after this one for both outcomes. The next call reports whether
+    the candidate for the branch taken was served ("prefetch_confirmed").
+    
+    Once the session is complete the response is {"message": ...,
+    "end_session": true, "total_questions": n, "stop_reason": ...} with
+    stop_reason "max_items", "confident" or "irt_precision" (early stopping,
+    see stopping.py).
     """
     
     def post(self, request):
@@ -103,10 +123,9 @@ class GetNextQuestionView(APIView):
         correct = data.get('correct')
         response_time_ms = data.get('response_time_ms')
         
-        # Validate session exists
-        try:
-            session = Session.objects.get(session_id=session_id)
-        except Session.DoesNotExist:
+        # Validate session exists and load its progress (shared state store, DB on a miss)
+        snapshot = load_session_snapshot(session_id)
+        if snapshot is None:
             return Response(
                 {'error': 'Session not found'},
                 status=status.HTTP_404_NOT_FOUND
@@ -114,187 +133,14 @@ class GetNextQuestionView(APIView):
         
         # Get next adaptive question using ML model
         try:
-            import joblib
-            import os
-            import numpy as np
-            from django.conf import settings
-            
-            import sys
-            
-            # Ensure the current directory is in sys.path so the unpickler can find 'question_generator_model'
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            if current_dir not in sys.path:
-                sys.path.append(current_dir)
-
-            # Load question generator model (trained by team)
-            # Check multiple locations and names
-            paths_to_check = [
-                os.path.join(current_dir, 'question_model.pkl'),       # Trained script output
-                os.path.join(settings.BASE_DIR, 'question_generator.pkl'), # Old location
-                os.path.join(settings.BASE_DIR, 'question_model.pkl')
-            ]
-            
-            generator_path = None
-            for path in paths_to_check:
-                if os.path.exists(path):
-                    generator_path = path
-                    break
-            
-            if generator_path:
-                generator = joblib.load(generator_path)
-                
-                # Get previous responses to determine current state
-                responses = UserResponse.objects.filter(session=session).order_by('-answered_at')
-                
-                # Calculate session accuracy
-                total_responses = responses.count()
-                correct_count = responses.filter(correct=True).count()
-                session_accuracy = correct_count / total_responses if total_responses > 0 else 1.0
-                
-                # Only 3 domains for assessment: reading, math, attention
-                domain_map = {'reading': 0, 'math': 1, 'attention': 2}
-                
-                if responses.exists():
-                    last_response = responses.first()
-                    
-                    # 1. Last Correct
-                    is_correct = 1 if correct else 0
-                    
-                    # 2. Last Response Time
-                    time_ms = response_time_ms if response_time_ms is not None else 2000
-                    
-                    # 3-5. Difficulty One-Hot
-                    last_diff = last_response.difficulty
-                    d_easy = 1 if last_diff == 'easy' else 0
-                    d_medium = 1 if last_diff == 'medium' else 0
-                    d_hard = 1 if last_diff == 'hard' else 0
-                    
-                    # 6. Session Accuracy (computed above)
-                    
-                    # 7. Current Domain (integer) - map to 0, 1, or 2
-                    cur_domain = domain_map.get(last_response.domain, 0)
-                    
-                else:
-                    # First question defaults
-                    is_correct = 1
-                    time_ms = 0
-                    d_easy = 1
-                    d_medium = 0
-                    d_hard = 0
-                    session_accuracy = 1.0
-                    cur_domain = 0
-                
-                # Prepare features for model: 
-                # [last_correct, last_response_time, diff_easy, diff_medium, diff_hard, session_accuracy, current_domain]
-                features = np.array([[
-                    is_correct, 
-                    time_ms, 
-                    d_easy, 
-                    d_medium, 
-                    d_hard, 
-                    session_accuracy, 
-                    cur_domain
-                ]])
-                
-                # Predict next domain and difficulty
-                prediction = generator.predict(features)
-                
-                # Parse prediction (returns [[domain, difficulty]])
-                if len(prediction.shape) == 2 and prediction.shape[1] == 2:
-                    next_domain_idx = int(prediction[0][0])
-                    next_diff_idx = int(prediction[0][1])
-                else:
-                    # Fallback
-                    next_domain_idx = 0
-                    next_diff_idx = 1
-                
-                # Map indices to names (only 3 domains)
-                domain_names = {0: 'reading', 1: 'math', 2: 'attention'}
-                diff_names = {0: 'easy', 1: 'medium', 2: 'hard'}
-                
-                # Apply domain rotation to ensure variety
-                # Count how many times each domain has appeared
-                domain_counts = {
-                    'reading': responses.filter(domain='reading').count(),
-                    'math': responses.filter(domain='math').count(),
-                    'attention': responses.filter(domain='attention').count()
-                }
-                
-                # Get predicted domain
-                predicted_domain = domain_names.get(next_domain_idx, 'reading')
-                
-                # If predicted domain has appeared 3+ times more than another domain, rotate
-                min_count = min(domain_counts.values()) if domain_counts else 0
-                max_count = max(domain_counts.values()) if domain_counts else 0
-                
-                if domain_counts.get(predicted_domain, 0) >= min_count + 3:
-                    # Force rotation to least-used domain
-                    next_domain = min(domain_counts, key=domain_counts.get)
-                    print(f"🔄 Rotating domain from {predicted_domain} to {next_domain} for balance")
-                else:
-                    next_domain = predicted_domain
-                
-                next_difficulty = diff_names.get(next_diff_idx, 'medium')
-                
-                # Debug logging
-                print(f"🔍 Model prediction - Domain: {next_domain_idx}({predicted_domain}), Difficulty: {next_diff_idx}({next_difficulty})")
-                print(f"📊 Domain counts: {domain_counts}, Final choice: {next_domain}")
-                
-                # Check if session should end (15-20 questions)
-                response_count = UserResponse.objects.filter(session=session).count()
-                
-                if response_count >= 15:
-                    # End session automatically
-                    return Response(
-                        {
-                            'message': 'Assessment complete! Generating your results...',
-                            'end_session': True,
-                            'total_questions': response_count
-                        },
-                        status=status.HTTP_200_OK
-                    )
-                
-                # 🎯 GENERATE QUESTION DYNAMICALLY using the model
-                question_data = generator.generate_question(next_domain, next_difficulty)
-                
-                # Create a unique question ID
-                question_id = f"Q_{session_id}_{response_count + 1}"
-                
-                response_data = {
-                    'question_id': question_id,
-                    'domain': question_data['domain'],
-                    'difficulty': question_data['difficulty'],
-                    'question_text': question_data['question_text'],
-                    'options': question_data['options'],
-                    'correct_option': question_data['correct_option']  # Include for answer validation
-                }
-                
-                return Response(response_data, status=status.HTTP_200_OK)
-                
-            else:
-                # Fallback to database if generator not found
-                question = get_adaptive_question(
-                    session_id=session_id,
-                    last_question_id=last_question_id,
-                    correct=correct,
-                    response_time_ms=response_time_ms
-                )
-                
-                if not question:
-                    return Response(
-                        {'message': 'No more questions available', 'end_session': True},
-                        status=status.HTTP_200_OK
-                    )
-                
-                response_data = {
-                    'question_id': question.question_id,
-                    'domain': question.domain,
-                    'difficulty': question.difficulty,
-                    'question_text': question.question_text,
-                    'options': question.options
-                }
-                
-                return Response(response_data, status=status.HTTP_200_OK)
+            response_data, status_code = select_next_question(
+                snapshot,
+                correct=correct,
+                response_time_ms=response_time_ms,
+                last_question_id=last_question_id,
+                prefetch=data['prefetch']
+            )
+            return Response(response_data, status=status_code)
                 
         except Exception as e:
             import traceback
@@ -345,59 +191,91 @@ class SubmitAnswerView(APIView):
             )
         
         try:
-            session = Session.objects.get(session_id=data['session_id'])
+            session = Session.objects.select_related('user').get(session_id=data['session_id'])
         except Session.DoesNotExist:
             return Response(
                 {'error': 'Session not found'},
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        try:
-            question = Question.objects.get(question_id=data['question_id'])
-        except Question.DoesNotExist:
-            # Create question if it doesn't exist (for testing)
-            question = Question.objects.create(
-                question_id=data['question_id'],
-                domain=data['domain'],
-                difficulty=data['difficulty'],
-                question_text='Test question',
-                options=['a', 'b', 'c', 'd'],
-                correct_option='a'
-            )
-        
         with transaction.atomic():
-            # Create user response
-            user_response = UserResponse.objects.create(
-                session=session,
-                user=user,
-                question=question,
-                domain=data['domain'],
-                difficulty=data['difficulty'],
-                correct=data['correct'],
-                response_time_ms=data['response_time_ms'],
-                confidence=data.get('confidence')
+            user_response, _ = store_answer(session, user, data)
+        
+        return Response(
+            {'status': 'success', 'response_id': user_response.response_id},
+            status=status.HTTP_201_CREATED
+        )
+
+
+class AnswerAndNextView(APIView):
+    """
+    POST /answer-and-next/
+    
+    Store the answer and return the next adaptive question in one request
+    (same as /submit-answer/ followed by /get-next-question/).
+    
+    Request: same as /submit-answer/
+    
+    Response:
+        {
+            "status": "success",
+            "response_id": 1,
+            "next_question": {
+                "question_id": "Q_S_101_01_2",
+                "domain": "math",
+                "difficulty": "easy",
+                "question_text": "What is 3 + 4?",
+                "options": ["6", "7", "8", "9"]
+            }
+        }
+    
+    next_question is {"message": ..., "end_session": true} once the session is complete.
+    """
+    
+    def post(self, request):
+        serializer = AnswerAndNextRequestSerializer(data=request.data)
+        
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        data = serializer.validated_data
+        
+        # One lookup for the session, its user and its stats
+        session = Session.objects.select_related('user', 'stats').filter(
+            session_id=data['session_id'], user_id=data['user_id']
+        ).first()
+        if session is None:
+            return Response(
+                {'error': 'Session not found'},
+                status=status.HTTP_404_NOT_FOUND
             )
-            
-            # Create mistake pattern if provided and answer is incorrect
-            mistake_type = data.get('mistake_type')
-            if mistake_type and not data['correct']:
-                # Determine severity based on mistake type
-                severity = 'medium'
-                if mistake_type in ['letter_reversal', 'number_reversal']:
-                    severity = 'high'
-                elif mistake_type in ['spelling_error', 'calculation_error']:
-                    severity = 'medium'
-                else:
-                    severity = 'low'
+        
+        try:
+            with transaction.atomic():
+                user_response, stats = store_answer(session, session.user, data)
                 
-                MistakePattern.objects.create(
-                    response=user_response,
-                    mistake_type=mistake_type,
-                    severity=severity
+                # Reuse the stats row that was just updated instead of reloading the session
+                snapshot = snapshot_from_stats(session, stats)
+                next_question, _ = select_next_question(
+                    snapshot,
+                    correct=data['correct'],
+                    response_time_ms=data['response_time_ms'],
+                    last_question_id=data['question_id'],
+                    prefetch=data['prefetch']
                 )
+        except Exception:
+            logger.exception("answer-and-next failed for %s", data['session_id'])
+            return Response(
+                {'error': 'Question generation failed'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
         
         return Response(
-            {'status': 'success', 'response_id': user_response.response_id},
+            {
+                'status': 'success',
+                'response_id': user_response.response_id,
+                'next_question': next_question
+            },
             status=status.HTTP_201_CREATED
         )
 
@@ -442,42 +320,23 @@ class EndSessionView(APIView):
             )
         
         try:
-            session = Session.objects.get(session_id=session_id)
+            session = Session.objects.select_related('stats').get(session_id=session_id)
         except Session.DoesNotExist:
             return Response(
                 {'error': 'Session not found'},
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Fetch all responses for this session
-        responses = UserResponse.objects.filter(
-            session=session
-        ).select_related('question')
-        
-        # Convert to list of dictionaries for ML processing
-        response_data = []
-        for response in responses:
-            # Get mistake types for this response
-            mistakes = MistakePattern.objects.filter(response=response)
-            mistake_type = mistakes.first().mistake_type if mistakes.exists() else None
-            
-            response_data.append({
-                'question_id': response.question_id,
-                'domain': response.domain,
-                'difficulty': response.difficulty,
-                'correct': response.correct,
-                'response_time_ms': response.response_time_ms,
-                'confidence': response.confidence,
-                'mistake_type': mistake_type
-            })
-        
-        # Get ML prediction
-        prediction_result = get_prediction(response_data)
+        # Get ML prediction from the session's running aggregates
+        stats = get_session_stats(session)
+        risk_features = risk_features_from_stats(stats) if stats.total else None
+        prediction_result = predict_risk(risk_features) if risk_features else get_prediction([])
         
         with transaction.atomic():
             # Mark session as completed
             session.completed = True
             session.save()
+            forget_session_snapshot(session_id)
             
             # Store prediction
             FinalPrediction.objects.create(
@@ -490,6 +349,14 @@ class EndSessionView(APIView):
                 key_insights=prediction_result['key_insights'],
                 confidence_level=prediction_result['confidence_level']
             )
+            
+            # Keep the feature vector for the dashboard, history, re-scoring and training exports
+            if risk_features:
+                SessionFeatureVector.objects.update_or_create(
+                    session=session,
+                    defaults={'user': user, 'schema_version': FEATURE_SCHEMA_VERSION, 'total': stats.total,
+                              **risk_features}
+                )
         
         # Return response to frontend
         return Response({
@@ -551,7 +418,7 @@ class GetDashboardDataView(APIView):
             )
         
         try:
-            session = Session.objects.get(session_id=session_id)
+            session = Session.objects.select_related('stats').get(session_id=session_id)
         except Session.DoesNotExist:
             return Response(
                 {'error': 'Session not found'},
@@ -566,17 +433,17 @@ class GetDashboardDataView(APIView):
             except FinalPrediction.DoesNotExist:
                 pass
         
-        # Fetch all responses for this session
-        responses = UserResponse.objects.filter(session=session).select_related('question')
+        # Running aggregates for this session
+        stats = get_session_stats(session)
         
-        if not responses.exists():
+        if not stats.total:
             return Response(
                 {'error': 'No responses found for this session'},
                 status=status.HTTP_404_NOT_FOUND
             )
         
         # Calculate domain-specific metrics
-        domain_patterns = self._calculate_domain_patterns(responses)
+        domain_patterns = self._calculate_domain_patterns(stats)
         
         # Map risk type to display name
         risk_labels = {
@@ -606,7 +473,6 @@ class GetDashboardDataView(APIView):
             key_insights = []
         
         # Format assessment date
-        from datetime import datetime
         assessment_date = session.started_at.strftime('%B %d, %Y')
         
         response_data = {
@@ -623,29 +489,13 @@ class GetDashboardDataView(APIView):
         
         return Response(response_data, status=status.HTTP_200_OK)
     
-    def _calculate_domain_patterns(self, responses):
-        """Calculate performance patterns for each domain."""
-        from collections import defaultdict
-        
-        # Group responses by domain
-        domain_data = defaultdict(list)
-        for response in responses:
-            # Map 'writing' and 'attention' to frontend domains
-            domain = response.domain
-            if domain == 'writing':
-                domain = 'reading'  # Combine writing with reading
-            elif domain == 'attention':
-                domain = 'focus'  # Map attention to focus
-            
-            domain_data[domain].append(response)
-        
+    def _calculate_domain_patterns(self, stats):
+        """Calculate performance patterns for each domain from the session's SessionStats."""
         patterns = {}
         
-        # Calculate metrics for each domain
-        for domain in ['reading', 'math', 'focus']:
-            domain_responses = domain_data.get(domain, [])
-            
-            if not domain_responses:
+        # Writing is pooled with reading and attention with focus (SessionFeatures.DOMAIN_GROUPS)
+        for domain, group in SessionFeatures.from_stats(stats).domain_groups().items():
+            if not group['answers']:
                 # Default values if no data
                 patterns[domain] = {
                     'accuracy': 0,
@@ -655,22 +505,9 @@ class GetDashboardDataView(APIView):
                 }
                 continue
             
-            # Calculate accuracy
-            correct_count = sum(1 for r in domain_responses if r.correct)
-            accuracy = (correct_count / len(domain_responses)) * 100 if domain_responses else 0
-            
-            # Calculate average response time
-            avg_time = sum(r.response_time_ms for r in domain_responses) / len(domain_responses)
-            
-            # Find most common mistake
-            mistakes = []
-            for response in domain_responses:
-                if not response.correct:
-                    mistake_patterns = MistakePattern.objects.filter(response=response)
-                    for mistake in mistake_patterns:
-                        mistakes.append(mistake.mistake_type)
-            
-            common_mistake = self._get_common_mistake(mistakes, domain)
+            accuracy = group['accuracy'] * 100
+            avg_time = group['avg_time_ms']
+            common_mistake = self._get_common_mistake(group['common_mistake'])
             recommendation = self._get_recommendation(domain, accuracy, avg_time, common_mistake)
             
             patterns[domain] = {
@@ -682,15 +519,11 @@ class GetDashboardDataView(APIView):
         
         return patterns
     
-    def _get_common_mistake(self, mistakes, domain):
-        """Determine the most common mistake type."""
-        if not mistakes:
+    def _get_common_mistake(self, mistake_type):
+        """Readable name of the most common mistake type (None if there were no mistakes)."""
+        if not mistake_type:
             return "None"
         
-        from collections import Counter
-        mistake_counts = Counter(mistakes)
-        most_common = mistake_counts.most_common(1)[0][0]
-        
         # Map mistake types to readable names
         mistake_names = {
             'letter_reversal': 'Letter Reversal (b/d, p/q)',
@@ -702,7 +535,7 @@ class GetDashboardDataView(APIView):
             'substitution': 'Substitutions'
         }
         
-        return mistake_names.get(most_common, most_common.replace('_', ' ').title())
+        return mistake_names.get(mistake_type, mistake_type.replace('_', ' ').title())
     
     def _get_recommendation(self, domain, accuracy, avg_time, common_mistake):
         """Generate personalized recommendation based on performance."""
@@ -750,7 +583,8 @@ class GetUserHistoryView(APIView):
                 "dyslexia_score": 0.45,
                 "dyscalculia_score": 0.20,
                 "attention_score": 0.30,
-                "risk_label": "moderate"
+                "risk_label": "moderate",
+                "features": {"reading_acc": 0.6, "math_acc": 0.8, ...}
             },
             ...
         ]
@@ -773,19 +607,24 @@ class GetUserHistoryView(APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
             
-        # Get all completed sessions with predictions
+        # Get all completed sessions with predictions (and their stored feature vectors, in the same query)
         predictions = FinalPrediction.objects.filter(
             user=user
-        ).select_related('session').order_by('predicted_at')
+        ).select_related('session__feature_vector').order_by('predicted_at')
         
         history_data = []
         for pred in predictions:
+            # None for sessions without a vector of the current feature schema
+            vector = getattr(pred.session, 'feature_vector', None)
+            if vector is not None and vector.schema_version != FEATURE_SCHEMA_VERSION:
+                vector = None
             history_data.append({
                 'date': pred.predicted_at.strftime('%Y-%m-%d'),
                 'dyslexia_score': pred.dyslexia_risk_score,
                 'dyscalculia_score': pred.dyscalculia_risk_score,
                 'attention_score': pred.attention_risk_score,
-                'risk_label': pred.final_label
+                'risk_label': pred.final_label,
+                'features': risk_features_from_vector(vector) if vector is not None else None
             })
             
         return Response(history_data, status=status.HTTP_200_OK)
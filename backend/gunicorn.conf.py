@@ -0,0 +1,43 @@
+"""
+Gunicorn configuration for the LD Screening backend.
+
+Run with: gunicorn -c gunicorn.conf.py ld_screening.wsgi
+
+With preload_app the Django app (and therefore the ML models, warmed up by
+ld_screening/wsgi.py) is loaded once in the master before it forks.
+gc.freeze() then moves every object allocated so far into the permanent
+generation, so the garbage collector never writes to those pages and the
+workers keep sharing them copy-on-write. Combine with
+ASSESSMENT_MODEL_MMAP_MODE='r' to also share the model arrays through the
+page cache.
+
+Set GUNICORN_PRELOAD=0 to get the old behaviour (one private copy per worker).
+
+GUNICORN_THREADS > 1 switches to threaded workers, which lets
+ASSESSMENT_INFERENCE_BATCHING combine concurrent model calls within a worker.
+
+The default 'local' session-state store is private to each worker, so with
+more than one worker a worker could serve a snapshot that is missing answers
+recorded by another. Several workers therefore default to the 'database'
+backend (ASSESSMENT_STATE_STORE_BACKEND). Configure the 'redis' backend in
+settings.ASSESSMENT_STATE_STORE to share a cache between workers instead.
+"""
+import gc
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '127.0.0.1:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+if workers > 1:
+    # Read by settings.ASSESSMENT_STATE_STORE, in the master (preload) or in each worker
+    os.environ.setdefault('ASSESSMENT_STATE_STORE_BACKEND', 'database')
+
+
+def when_ready(server):
+    if preload_app:
+        gc.collect()
+        gc.freeze()
+        server.log.info("Models preloaded; %d objects frozen before fork", gc.get_freeze_count())
@@ -2,6 +2,7 @@
 Django settings for ld_screening project.
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -147,3 +148,111 @@ CORS_ALLOWED_ORIGINS = [
     "http://127.0.0.1:3000",
     "http://127.0.0.1:5173",
 ]
+
+
+# ML model loading
+# Models are loaded once per process by assessment.model_registry.
+# Server processes (ld_screening/wsgi.py, asgi.py) load them at startup with assessment.apps.warm_up_models;
+# management commands load them on first use. ASSESSMENT_PRELOAD_MODELS=0 skips the warm-up in servers too:
+# ml_utils is then imported and the models loaded on first use (assessment/ml.py), trading first-request
+# latency for cold start.
+ASSESSMENT_PRELOAD_MODELS = os.environ.get('ASSESSMENT_PRELOAD_MODELS', '1') == '1'
+
+# Median worker cold start (ms) allowed by `manage.py profile_startup`, which fails above it.
+# Workers are started on demand, so this bounds the latency of the requests that wait for one.
+ASSESSMENT_STARTUP_BUDGET_MS = float(os.environ.get('ASSESSMENT_STARTUP_BUDGET_MS', '1500'))
+
+# Shared model memory for multi-worker deployments (see gunicorn.conf.py)
+# 'r' loads the copies written by `manage.py export_mmap_models` with their numpy arrays
+# memory-mapped, so every worker maps the same physical pages instead of holding a private copy.
+ASSESSMENT_MODEL_MMAP_MODE = os.environ.get('ASSESSMENT_MODEL_MMAP_MODE') or None
+ASSESSMENT_MMAP_MODEL_DIR = BASE_DIR / 'mmap_models'
+
+# Flattened forests written by `manage.py export_flat_models` (assessment/flat_forest.py).
+# While on, each model is served from its export if that was made from the current pickle,
+# without unpickling the forests or importing scikit-learn.
+ASSESSMENT_FLAT_MODELS = os.environ.get('ASSESSMENT_FLAT_MODELS', '1') == '1'
+ASSESSMENT_FLAT_MODEL_DIR = BASE_DIR / 'flat_models'
+
+# Compiled decision table for the question model (`manage.py export_decision_table`).
+# Used instead of walking the forests whenever it exists and matches the loaded model.
+ASSESSMENT_QUESTION_TABLE_PATH = BASE_DIR / 'question_table.npz'
+
+# Shared session state for the next-question path (assessment.state_store)
+# 'local' keeps an in-process LRU, correct for a single worker process only. 'database' keeps nothing
+# and reads SessionStats on every request; gunicorn.conf.py selects it (through
+# ASSESSMENT_STATE_STORE_BACKEND) when it runs several workers. For several workers or API nodes with
+# a shared cache use the networked backend:
+#   {'BACKEND': 'redis', 'OPTIONS': {'host': '127.0.0.1', 'port': 6379, 'ttl_seconds': 3600}}
+# `manage.py run_state_server` starts a local stand-in for it.
+ASSESSMENT_STATE_STORE = {
+    'BACKEND': os.environ.get('ASSESSMENT_STATE_STORE_BACKEND', 'local'),
+    'OPTIONS': {'max_entries': 10000, 'ttl_seconds': 3600},
+}
+
+# Micro-batching of single-row model calls across concurrent requests (assessment.inference_batcher).
+# Only useful with threaded workers, e.g. GUNICORN_THREADS=8. `manage.py benchmark_inference_batching`
+# reports batch sizes and latency.
+ASSESSMENT_INFERENCE_BATCHING = {
+    'ENABLED': os.environ.get('ASSESSMENT_INFERENCE_BATCHING') == '1',
+    'WINDOW_MS': 2,
+    'MAX_BATCH': 64,
+    'MAX_QUEUE': 256,
+    'TIMEOUT_MS': 100,
+}
+
+# Pregenerated questions per (domain, difficulty), refilled by a background thread (assessment.question_pool).
+# Enable with ASSESSMENT_QUESTION_POOL=1 in server processes; each process that uses it starts the thread.
+ASSESSMENT_QUESTION_POOL = {
+    'ENABLED': os.environ.get('ASSESSMENT_QUESTION_POOL') == '1',
+    'TARGET_DEPTH': 32,
+    'LOW_WATERMARK': 8,
+    'REFILL_INTERVAL_S': 1.0,
+}
+
+# In-process index of the Question table for the rule-based fallback and answer lookups
+# (assessment.question_bank). Reloaded after question saves/deletes and after MAX_AGE_S.
+ASSESSMENT_QUESTION_BANK = {
+    'ENABLED': True,
+    'MAX_AGE_S': 300,
+    'MAX_SESSIONS': 10000,
+}
+
+# Item Response Theory question selection (assessment.irt): picks the most informative catalog template
+# for the session's per-domain ability estimates instead of using the question model. Item parameters
+# come from `manage.py calibrate_irt_items` and are reloaded after MAX_AGE_S.
+ASSESSMENT_IRT = {
+    'ENABLED': os.environ.get('ASSESSMENT_IRT') == '1',
+    'MAX_AGE_S': 300,
+    'GRID_POINTS': 61,
+}
+
+# Early termination (assessment.stopping): after each answer the risk model is re-run on the session's running
+# features, and the session ends once the same class has had probability >= THRESHOLD for CONSECUTIVE answers.
+# Never before MIN_ITEMS answers, always at MAX_ITEMS. The end-of-session response carries "stop_reason".
+# With ASSESSMENT_IRT enabled, SE_THRESHOLD also ends it once every domain's ability standard error is at most
+# that value (e.g. ASSESSMENT_STOP_SE=0.7; unset = off).
+ASSESSMENT_EARLY_STOPPING = {
+    'ENABLED': os.environ.get('ASSESSMENT_EARLY_STOPPING') == '1',
+    'THRESHOLD': 0.8,
+    'CONSECUTIVE': 3,
+    'MIN_ITEMS': 8,
+    'MAX_ITEMS': 15,
+    'SE_THRESHOLD': float(os.environ['ASSESSMENT_STOP_SE']) if os.environ.get('ASSESSMENT_STOP_SE') else None,
+}
+
+# Logging: the assessment app logs model loads at info level and per-request details (question selection,
+# prefetch hits, bank reloads, model warm-up times) at debug level. Set ASSESSMENT_LOG_LEVEL=DEBUG to see them.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'assessment': {
+            'handlers': ['console'],
+            'level': os.environ.get('ASSESSMENT_LOG_LEVEL', 'INFO'),
+        },
+    },
+}
@@ -9,3 +9,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ld_screening.settings')
 
 application = get_wsgi_application()
+
+# Only server processes import this module, so only they preload the ML models
+from assessment.apps import warm_up_models  # noqa: E402
+
+warm_up_models()
@@ -0,0 +1,112 @@
+"""
+Report per-worker memory for gunicorn, before and after model sharing.
+
+Run with: python report_worker_memory.py [--workers 4] [--pid MASTER_PID]
+
+Without --pid, gunicorn is started twice on a free port:
+  * before - one private model copy per worker (GUNICORN_PRELOAD=0)
+  * after  - preload + gc.freeze() + memory-mapped models (ASSESSMENT_MODEL_MMAP_MODE=r)
+and the unique set size (USS, memory that would be freed if the worker
+exited) is printed for each worker. With --pid, an already running master
+is inspected instead.
+
+Linux only (reads /proc/<pid>/smaps_rollup).
+Run `python manage.py export_mmap_models` first so the mmap copies exist.
+"""
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def read_memory(pid):
+    """Return RSS, PSS and USS in KiB for a process."""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(':'):
+                values[parts[0][:-1]] = int(parts[1])
+    return {
+        'rss': values.get('Rss', 0),
+        'pss': values.get('Pss', 0),
+        'uss': values.get('Private_Clean', 0) + values.get('Private_Dirty', 0),
+    }
+
+
+def worker_pids(master_pid):
+    with open(f'/proc/{master_pid}/task/{master_pid}/children') as f:
+        return [int(pid) for pid in f.read().split()]
+
+
+def report(label, master_pid):
+    pids = worker_pids(master_pid)
+    print(f"\n{label} (master {master_pid}, {len(pids)} workers)")
+    print(f"{'pid':>8} {'RSS MiB':>9} {'PSS MiB':>9} {'USS MiB':>9}")
+    total_uss = 0
+    for pid in pids:
+        mem = read_memory(pid)
+        total_uss += mem['uss']
+        print(f"{pid:>8} {mem['rss'] / 1024:>9.1f} {mem['pss'] / 1024:>9.1f} {mem['uss'] / 1024:>9.1f}")
+    if pids:
+        print(f"{'mean':>8} {'':>9} {'':>9} {total_uss / len(pids) / 1024:>9.1f}")
+    return total_uss
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def run_gunicorn(label, workers, env_overrides):
+    port = free_port()
+    env = dict(os.environ, GUNICORN_BIND=f'127.0.0.1:{port}', GUNICORN_WORKERS=str(workers), **env_overrides)
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'ld_screening.wsgi'],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        # Wait until the workers answer, then give the stragglers time to finish booting
+        deadline = time.time() + 120
+        while time.time() < deadline:
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{port}/admin/login/', timeout=2)
+                break
+            except OSError:
+                time.sleep(0.5)
+        while len(worker_pids(proc.pid)) < workers and time.time() < deadline:
+            time.sleep(0.5)
+        time.sleep(5)
+        return report(label, proc.pid)
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--pid', type=int, help='Inspect an already running gunicorn master')
+    args = parser.parse_args()
+
+    if args.pid:
+        report('gunicorn', args.pid)
+        return
+
+    before = run_gunicorn('before: private copy per worker', args.workers,
+                          {'GUNICORN_PRELOAD': '0', 'ASSESSMENT_MODEL_MMAP_MODE': ''})
+    after = run_gunicorn('after: preload + gc.freeze + mmap', args.workers,
+                         {'GUNICORN_PRELOAD': '1', 'ASSESSMENT_MODEL_MMAP_MODE': 'r'})
+
+    print(f"\nTotal worker USS: {before / 1024:.1f} MiB -> {after / 1024:.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
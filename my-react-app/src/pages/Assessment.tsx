@@ -1,6 +1,6 @@
 import React, { useState, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { startSession, getNextQuestion, submitAnswer, endSession } from '../services/api';
+import { startSession, getNextQuestion, answerAndNext, endSession } from '../services/api';
 import type { Question, AssessmentResult } from '../types/types';
 import Mascot from '../components/Mascot';
 import '../styles/assessment.css';
@@ -92,8 +92,8 @@ const Assessment: React.FC = () => {
         }
 
         try {
-            // Submit the answer
-            await submitAnswer({
+            // Submit the answer and get the next question in one round trip
+            const { next_question: nextQuestion } = await answerAndNext({
                 user_id: userId,
                 session_id: sessionId,
                 question_id: currentQuestion.question_id,
@@ -105,13 +105,6 @@ const Assessment: React.FC = () => {
                 mistake_type: mistakeType
             });
 
-            // Get next question
-            const nextQuestion = await getNextQuestion(userId, sessionId, {
-                id: currentQuestion.question_id,
-                correct: isCorrect,
-                responseTime: responseTime
-            });
-
             if (nextQuestion.end_session) {
                 // End session and get results
                 const sessionResults = await endSession(userId, sessionId);
@@ -4,6 +4,7 @@ import type {
   Question, 
   AnswerSubmission, 
   AnswerResponse, 
+  AnswerAndNextResponse,
   AssessmentResult,
   DashboardDataResponse 
 } from '../types/types';
@@ -85,6 +86,25 @@ export async function submitAnswer(
   });
 }
 
+/**
+ * Submit an answer and get the next question in a single request
+ */
+export async function answerAndNext(
+  submission: AnswerSubmission
+): Promise<AnswerAndNextResponse> {
+  return apiRequest<AnswerAndNextResponse>('/answer-and-next/', {
+    user_id: submission.user_id,
+    session_id: submission.session_id,
+    question_id: submission.question_id,
+    domain: submission.domain,
+    difficulty: submission.difficulty,
+    correct: submission.correct,
+    response_time_ms: submission.response_time_ms,
+    confidence: submission.confidence,
+    mistake_type: submission.mistake_type
+  });
+}
+
 /**
  * End the session and get ML prediction results
  */
@@ -35,6 +35,10 @@ export interface AnswerResponse {
   response_id: number;
 }
 
+export interface AnswerAndNextResponse extends AnswerResponse {
+  next_question: Question;
+}
+
 // Session Result Types
 export interface AssessmentResult {
   risk: 'low-risk' | 'dyslexia-risk' | 'dyscalculia-risk' | 'attention-risk';